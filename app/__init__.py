@@ -1,6 +1,7 @@
 from flask import Flask, render_template
 from app.config import config
-from app.extensions import db, login_manager, migrate, csrf, socketio
+from app.extensions import db, login_manager, migrate, csrf, socketio, view_counter, image_pipeline, image_cache
+from app.utils.socketio_queue import socketio_options
 from datetime import datetime
 
 def create_app(config_name='default'):
@@ -13,16 +14,20 @@ def create_app(config_name='default'):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
-    socketio.init_app(app, cors_allowed_origins="*")
+    socketio.init_app(app, **socketio_options(app.config))
+    view_counter.init_app(app)
+    image_pipeline.init_app(app)
+    image_cache.init_app(app)
 
     # 註冊 Blueprints
-    from app.routes import auth, products, transactions, messages, reviews, notifications
+    from app.routes import auth, products, transactions, messages, reviews, notifications, images
     app.register_blueprint(auth.bp)
     app.register_blueprint(products.bp)
     app.register_blueprint(transactions.bp)
     app.register_blueprint(messages.bp)
     app.register_blueprint(reviews.bp)
     app.register_blueprint(notifications.bp)
+    app.register_blueprint(images.bp)
 
     # 為前端模板兼容性添加endpoint別名
     # navbar.html 使用 url_for('index')，但實際路由在 products.index
@@ -44,6 +49,10 @@ def create_app(config_name='default'):
     # 註冊 context processors
     register_context_processors(app)
 
+    # 註冊 CLI 指令
+    from app.commands import register_commands
+    register_commands(app)
+
     # 註冊 SocketIO 事件
     from app.events import messages as message_events
 
@@ -92,6 +101,29 @@ def register_template_filters(app):
         else:
             return f'{int(seconds // 31536000)} 年前'
 
+    @app.template_global('render_product_card')
+    def render_product_card_global(product):
+        """渲染商品卡片（快取已渲染的片段，見 app/utils/fragments.py）"""
+        from app.utils.fragments import render_product_card
+        return render_product_card(product)
+
+    @app.template_filter('srcset')
+    def srcset_filter(renditions, fmt='jpeg'):
+        """由圖片的多尺寸版本產生 srcset（如：a_160.webp 160w, a_400.webp 400w）"""
+        return ', '.join(
+            f"{rendition[fmt]} {rendition['width']}w"
+            for rendition in renditions or [] if rendition.get(fmt)
+        )
+
+    @app.template_global('resized_image_url')
+    def resized_image_url(url, width, height=None):
+        """上傳圖片的動態縮圖 URL（尺寸需在 IMAGE_RESIZE_SIZES 中）"""
+        from flask import url_for
+        from app.utils.file_upload import FileUploadService
+        if not FileUploadService.is_stored_image(url):
+            return url
+        return url_for('images.resized', width=width, height=height or width, path=url[len('/static/'):])
+
     @app.template_filter('number_format')
     def number_format_filter(value):
         """數字格式化（如：25,000）"""
@@ -106,8 +138,6 @@ def register_context_processors(app):
     def inject_global_data():
         """注入全域資料到所有模板"""
         from flask_login import current_user
-        from app.services.notification_service import NotificationService
-        from app.services.message_service import MessageService
         from app.utils.helpers import (
             get_product_condition_label,
             get_product_status_label,
@@ -122,13 +152,11 @@ def register_context_processors(app):
         pending_transactions = 0
 
         if current_user.is_authenticated:
-            from app.models.transaction import Transaction
-            unread_messages = MessageService.get_unread_count(current_user.id)
-            unread_notifications = NotificationService.get_unread_count(current_user.id)
-            pending_transactions = Transaction.query.filter_by(
-                seller_id=current_user.id,
-                status=Transaction.STATUS_PENDING
-            ).count()
+            from app.services.counter_service import CounterService
+            counts = CounterService.get_counts(current_user.id)
+            unread_messages = counts['unread_messages']
+            unread_notifications = counts['unread_notifications']
+            pending_transactions = counts['pending_transactions']
 
         # 提供一個 globals 函數給模板使用（為了兼容前端模板）
         def template_globals():
@@ -0,0 +1,239 @@
+"""
+Flask CLI 指令
+
+使用方法：
+    flask --app run.py rebuild-search-index
+    flask --app run.py flush-view-counts        （僅適用於 VIEW_COUNT_REDIS_URL 共用緩衝）
+    flask --app run.py rebuild-category-paths
+    flask --app run.py update-trending-scores   （建議以 cron 每 5 分鐘執行）
+    flask --app run.py backfill-minhash
+    flask --app run.py process-pending-images
+    flask --app run.py migrate-image-storage
+    flask --app run.py benchmark-image-decoding [圖片檔...]
+    flask --app run.py rebuild-saved-search-index
+    flask --app run.py rebuild-conversations
+    flask --app run.py reconcile-counters       （建議以 cron 每小時執行）
+    flask --app run.py benchmark-sockets -n 2000 --pid <伺服器 PID>
+    flask --app run.py import-products books.csv --seller club@example.edu.tw --images ./photos
+"""
+import click
+
+
+def register_commands(app):
+    """註冊 CLI 指令"""
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """重新建立商品全文檢索索引"""
+        from app.services.product_service import ProductService
+
+        count = ProductService.rebuild_search_index()
+        click.echo(f'✓ 已重新建立 {count} 筆商品的搜尋索引')
+
+    @app.cli.command('flush-view-counts')
+    def flush_view_counts():
+        """將 Redis 中的瀏覽次數緩衝寫回資料庫
+
+        記憶體緩衝位於各個 web worker 中，CLI 程序無法存取（由 worker 定期寫回及結束時寫回），
+        因此只在設定 VIEW_COUNT_REDIS_URL 時可用。
+        """
+        from app.extensions import view_counter
+
+        stats = view_counter.stats()
+        if stats['backend'] != 'redis':
+            raise click.ClickException(
+                '瀏覽次數緩衝位於各個 web worker 的記憶體中，此指令無法寫回；'
+                '請設定 VIEW_COUNT_REDIS_URL 使用共用緩衝'
+            )
+        count = view_counter.flush()
+        click.echo(f'✓ 已寫回 {count} 次瀏覽（{stats["pending_products"]} 項商品）')
+
+    @app.cli.command('rebuild-category-paths')
+    def rebuild_category_paths():
+        """重新計算分類的物化路徑"""
+        from app.services.category_service import CategoryService
+
+        count = CategoryService.rebuild_paths()
+        click.echo(f'✓ 已更新 {count} 個分類的路徑')
+
+    @app.cli.command('rebuild-saved-search-index')
+    def rebuild_saved_search_index():
+        """重新計算儲存搜尋的反向索引鍵"""
+        from app.services.saved_search_service import SavedSearchService
+
+        count = SavedSearchService.rebuild_index_terms()
+        click.echo(f'✓ 已更新 {count} 個儲存搜尋的索引鍵')
+
+    @app.cli.command('import-products')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--seller', required=True, help='賣家 ID 或電子郵件')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='檔案格式（預設依副檔名判斷）')
+    @click.option('--images', 'image_root', type=click.Path(exists=True, file_okay=False), help='圖片目錄')
+    @click.option('--archive', type=click.Path(exists=True, dir_okay=False), help='圖片 ZIP 壓縮檔')
+    @click.option('--chunk-size', type=int, help='每批匯入列數')
+    @click.option('--workers', type=int, help='圖片處理執行緒數')
+    def import_products(path, seller, fmt, image_root, archive, chunk_size, workers):
+        """批次匯入商品（CSV / JSONL）"""
+        from app.models.user import User
+        from app.services.import_service import ProductImportService
+
+        user = User.query.get(int(seller)) if seller.isdigit() else User.query.filter_by(email=seller).first()
+        if not user:
+            raise click.ClickException(f'找不到使用者：{seller}')
+
+        with open(path, 'rb') as stream:
+            success, result = ProductImportService.import_products(
+                user.id, stream,
+                fmt=fmt or ProductImportService.detect_format(path),
+                image_root=image_root,
+                archive=archive,
+                chunk_size=chunk_size,
+                workers=workers
+            )
+        if not success:
+            raise click.ClickException(result)
+
+        for error in result['errors']:
+            row = f'第 {error["row"]} 列' if error['row'] is not None else '檔案'
+            click.echo(f'✗ {row}：{error["error"]}', err=True)
+        click.echo(f'✓ 已匯入 {result["created"]} / {result["total"]} 項商品（失敗 {result["failed"]} 列）')
+
+    @app.cli.command('update-trending-scores')
+    def update_trending_scores():
+        """累加新事件到商品熱門度分數"""
+        from app.services.trending_service import TrendingService
+
+        count = TrendingService.update_trending_scores()
+        click.echo(f'✓ 已更新 {count} 項商品的熱門度')
+
+    @app.cli.command('backfill-minhash')
+    @click.option('--batch-size', default=500, help='每批處理的商品數')
+    def backfill_minhash(batch_size):
+        """為既有商品計算近似重複簽章並標記重複刊登"""
+        from app.services.duplicate_service import DuplicateService
+
+        processed, duplicates = DuplicateService.backfill(batch_size=batch_size)
+        click.echo(f'✓ 已處理 {processed} 項商品，標記 {duplicates} 項近似重複')
+
+    @app.cli.command('process-pending-images')
+    def process_pending_images():
+        """重新處理停留在「處理中」的商品圖片（例如 worker 重啟後）"""
+        from app.extensions import image_pipeline
+        from app.services.product_service import ProductService
+
+        count = ProductService.requeue_pending_images()
+        image_pipeline.shutdown(wait=True)
+        stats = image_pipeline.stats()
+        click.echo(f'✓ 已處理 {count} 張圖片（失敗 {stats["failed"]} 張）')
+
+    @app.cli.command('migrate-image-storage')
+    @click.option('--batch-size', default=200, help='每批處理的圖片數')
+    def migrate_image_storage(batch_size):
+        """將舊的商品圖片搬到內容定址儲存（可重複執行）"""
+        from app.services.product_service import ProductService
+
+        stats = ProductService.migrate_image_storage(batch_size=batch_size)
+        click.echo(
+            f'✓ 已更新 {stats["images"]} 張圖片，搬移 {stats["moved"]} 個檔案'
+            f'（找不到 {stats["missing"]} 個），共 {stats["stored"]} 個檔案'
+        )
+
+    @app.cli.command('benchmark-image-decoding')
+    @click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+    def benchmark_image_decoding(paths):
+        """比較舊版與限制記憶體的圖片處理方式的峰值 RSS（未指定圖片時自動產生）"""
+        import tempfile
+        from flask import current_app
+        from app.utils.file_upload import image_limits
+        from app.utils.image_benchmark import make_sample_images, run_benchmark
+
+        with tempfile.TemporaryDirectory() as directory:
+            samples = list(paths) or make_sample_images(directory)
+            results = run_benchmark(
+                samples,
+                current_app.config['PRODUCT_IMAGE_WIDTHS'],
+                image_limits(current_app.config)
+            )
+
+        click.echo(f'{"檔案":<16}{"大小":>10}{"舊版 RSS":>12}{"目前 RSS":>12}')
+        for row in results:
+            click.echo(
+                f'{row["file"]:<16}{row["size"] / 1024:>8.0f} KB'
+                f'{row["legacy_kb"] / 1024:>9.1f} MB{row["bounded_kb"] / 1024:>9.1f} MB'
+            )
+            if row['error']:
+                click.echo(f'  └ 已拒絕：{row["error"]}')
+
+    @app.cli.command('rebuild-conversations')
+    def rebuild_conversations():
+        """由訊息重新計算對話摘要（最後一則訊息與未讀數）"""
+        from app.services.message_service import MessageService
+
+        count = MessageService.rebuild_conversations()
+        click.echo(f'✓ 已重新計算 {count} 個對話')
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters():
+        """修正使用者的未讀訊息、未讀通知與待處理交易計數"""
+        from app.services.counter_service import CounterService
+
+        stats = CounterService.reconcile()
+        click.echo(f'✓ 已檢查 {stats["checked"]} 位使用者，修正 {stats["repaired"]} 位')
+
+    @app.cli.command('benchmark-sockets')
+    @click.option('--url', 'urls', multiple=True, default=['http://127.0.0.1:5000'], show_default=True,
+                  help='節點網址（可重複指定，連線輪流分配到各節點）')
+    @click.option('--connections', '-n', default=1000, show_default=True, help='總連線數')
+    @click.option('--concurrency', '-c', default=50, show_default=True, help='同時握手的執行緒數')
+    @click.option('--hold', default=10, show_default=True, help='連線建立後保持的秒數')
+    @click.option('--pid', type=int, help='伺服器程序 ID（量測每條連線的記憶體）')
+    @click.option('--cookie', help='連線時附加的 Cookie（以登入使用者連線）')
+    @click.option('--broadcast/--no-broadcast', default=False,
+                  help='經由 SOCKETIO_MESSAGE_QUEUE 廣播一則事件，確認所有節點的連線都收到')
+    def benchmark_sockets(urls, connections, concurrency, hold, pid, cookie, broadcast):
+        """對執行中的節點建立大量 Socket.IO 連線，量測每個節點可維持的同時連線數"""
+        from flask import current_app
+        from app.utils.socket_benchmark import run_benchmark
+        from app.utils.socketio_queue import MEMORY_QUEUE_PREFIX
+
+        message_queue = current_app.config['SOCKETIO_MESSAGE_QUEUE'] if broadcast else None
+        if broadcast and not message_queue:
+            raise click.UsageError('--broadcast 需要設定 SOCKETIO_MESSAGE_QUEUE')
+        if message_queue and message_queue.startswith(MEMORY_QUEUE_PREFIX):
+            # 程序內佇列只在同一個程序中有效，從 CLI 廣播到不了伺服器程序
+            raise click.UsageError('--broadcast 不支援 memory:// 佇列，請使用伺服器共用的 Redis 等訊息佇列')
+
+        def progress(connected, failed):
+            if connected % 500 == 0:
+                click.echo(f'  已建立 {connected} 條連線（失敗 {failed}）')
+
+        result = run_benchmark(
+            list(urls), connections,
+            concurrency=concurrency,
+            hold=hold,
+            pid=pid,
+            headers={'Cookie': cookie} if cookie else None,
+            message_queue=message_queue,
+            channel=current_app.config['SOCKETIO_CHANNEL'],
+            progress=progress
+        )
+
+        click.echo(
+            f'✓ 建立 {result["connected"]} / {connections} 條連線'
+            f'（{result["elapsed"]:.1f} 秒，{result["rate"]:.0f} 條/秒），'
+            f'保持 {hold} 秒後仍連線 {result["alive"]} 條'
+        )
+        click.echo(f'  連線延遲 p50 {result["connect_p50_ms"]:.1f} ms，p99 {result["connect_p99_ms"]:.1f} ms')
+        if result['failed']:
+            click.echo(f'  失敗 {result["failed"]} 條：{"；".join(result["errors"])}')
+        if result['rss_per_socket_kb'] is not None:
+            click.echo(
+                f'  伺服器 RSS {result["rss_before_kb"] / 1024:.1f} MB → {result["rss_after_kb"] / 1024:.1f} MB'
+                f'（每條連線約 {result["rss_per_socket_kb"]:.1f} KB）'
+            )
+        if result['broadcast'] is not None:
+            stats = result['broadcast']
+            click.echo(f'  廣播送達 {stats["received"]} / {result["alive"]} 條連線', nl=False)
+            if stats['received']:
+                click.echo(f'（p50 {stats["p50_ms"]:.1f} ms，p99 {stats["p99_ms"]:.1f} ms）', nl=False)
+            click.echo()
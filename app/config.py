@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -29,6 +30,91 @@ class Config:
     TRANSACTIONS_PER_PAGE = 10
     MESSAGES_PER_PAGE = 50
 
+    # 篩選面向：價格區間（max 為 None 表示無上限）與數量快取秒數
+    PRODUCT_PRICE_BUCKETS = [(0, 100), (100, 500), (500, 1000), (1000, 5000), (5000, None)]
+    FACET_CACHE_TTL = 60
+
+    # 首頁商品列表共用快取：存活秒數與多取筆數（用於在記憶體中排除使用者自己的商品）
+    LISTING_CACHE_TTL = 30
+    LISTING_CACHE_OVERFETCH = 12
+
+    # 分類樹快取存活秒數（本程序內的分類寫入會立即清除；此值用於同步其他 worker）
+    CATEGORY_CACHE_TTL = 300
+
+    # 熱門排序：事件權重、半衰期（小時）與第一次計分時回溯的天數
+    TRENDING_WEIGHTS = {'listing': 1, 'view': 1, 'message': 5, 'transaction': 10}
+    TRENDING_HALF_LIFE_HOURS = 24
+    TRENDING_BACKFILL_DAYS = 30
+
+    # 近似重複刊登：MinHash 估計的相似度門檻，
+    # ACTION 為 'flag'（標記 duplicate_of_id，搜尋相關度乘上 RANK_FACTOR 排在後面）、
+    # 'block'（拒絕刊登，同一商品有多件時無法分開刊登）或 None（不檢查）
+    DUPLICATE_LISTING_THRESHOLD = 0.8
+    DUPLICATE_LISTING_ACTION = 'flag'
+    DUPLICATE_LISTING_RANK_FACTOR = 0.5
+
+    # 每位使用者可儲存的搜尋數量
+    SAVED_SEARCH_LIMIT = 20
+
+    # 商品批次匯入：每批列數、圖片處理執行緒數、網頁匯入的列數上限（CLI 不限制）
+    IMPORT_CHUNK_SIZE = 500
+    IMPORT_IMAGE_WORKERS = 4
+    IMPORT_MAX_ROWS = 1000
+
+    # 商品圖片輸出尺寸（長邊像素，每個尺寸各輸出 JPEG 與 WebP，供 srcset 使用）
+    PRODUCT_IMAGE_WIDTHS = (160, 400, 800)
+
+    # 圖片解碼限制：像素數上限（只讀檔頭即拒絕）與解碼記憶體上限（位元組）
+    # JPEG 於解碼時縮小，幾乎不受記憶體上限影響；PNG 等格式需完整解碼
+    IMAGE_MAX_PIXELS = 50_000_000
+    IMAGE_DECODE_MEMORY_BUDGET = 128 * 1024 * 1024
+
+    # 動態縮圖（/img/<w>x<h>/<path>）：允許的尺寸、磁碟快取位置與大小上限、瀏覽器快取秒數
+    # 商品原圖處理後即刪除，縮圖由最大尺寸的版本產生，超過 max(PRODUCT_IMAGE_WIDTHS) 的尺寸一律拒絕
+    IMAGE_RESIZE_SIZES = [(96, 96), (160, 160), (200, 200), (400, 400), (800, 800)]
+    IMAGE_CACHE_FOLDER = os.environ.get('IMAGE_CACHE_FOLDER') or \
+        os.path.join(tempfile.gettempdir(), 'studenttrade-image-cache')
+    IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600
+
+    # 商品圖片背景處理：'process'（子程序池）、'thread'（執行緒池）或 'sync'（同步）
+    IMAGE_PIPELINE_MODE = 'process'
+    IMAGE_PIPELINE_WORKERS = 2
+
+    # 商品卡片 HTML 片段快取（每個 worker 最多保留的卡片數，0 表示不快取）
+    PRODUCT_CARD_CACHE_SIZE = 2048
+    DEFAULT_LOCALE = 'zh_TW'
+
+    # 相似商品索引、自動完成前綴索引於第一次使用時在背景建立
+    # 索引位於各個 worker 的記憶體中，每隔 MAX_AGE 秒重建以反映其他 worker 的變更
+    SIMILARITY_INDEX_BACKGROUND_BUILD = True
+    SIMILARITY_INDEX_MAX_AGE = 300
+    # 自動完成不逐次查詢資料庫確認商品狀態，其他 worker 售出的商品最多 SUGGEST_INDEX_MAX_AGE 秒後消失
+    SUGGEST_INDEX_BACKGROUND_BUILD = True
+    SUGGEST_INDEX_MAX_AGE = 60
+
+    # 瀏覽次數寫回緩衝：累積到 FLUSH_THRESHOLD 次或每 FLUSH_INTERVAL 秒批次寫回
+    # 設定 VIEW_COUNT_REDIS_URL 可讓多個 worker 共用緩衝
+    VIEW_COUNT_BUFFER_ENABLED = True
+    VIEW_COUNT_FLUSH_INTERVAL = 10
+    VIEW_COUNT_FLUSH_THRESHOLD = 500
+    VIEW_COUNT_REDIS_URL = os.environ.get('VIEW_COUNT_REDIS_URL')
+
+    # 監控端點（如 /products/api/view-counts）只接受這些來源位址的請求
+    METRICS_ALLOWED_ADDRS = ('127.0.0.1', '::1')
+
+    # Socket.IO 非同步模式：'threading'、'eventlet' 或 'gevent'（None 為依已安裝的套件自動選擇；
+    # eventlet/gevent 需以 run.py 或 gunicorn -k eventlet/gevent 啟動）
+    # 多個 worker / 節點時設定訊息佇列（如 redis://localhost:6379/0），房間廣播才會送到其他程序的連線
+    # （見 app/utils/socketio_queue.py 與部署指南）
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = 'studenttrade-socketio'
+    SOCKETIO_CORS_ALLOWED_ORIGINS = os.environ.get('SOCKETIO_CORS_ALLOWED_ORIGINS') or '*'
+
+    # 商品列表分頁模式：'keyset'（游標分頁，成本與頁數無關）或 'offset'（頁碼分頁）
+    PRODUCTS_PAGINATION = os.environ.get('PRODUCTS_PAGINATION') or 'keyset'
+
 class DevelopmentConfig(Config):
     """開發環境配置"""
     DEBUG = True
@@ -43,6 +129,13 @@ class TestingConfig(Config):
     """測試環境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SIMILARITY_INDEX_BACKGROUND_BUILD = False
+    SUGGEST_INDEX_BACKGROUND_BUILD = False
+    IMAGE_PIPELINE_MODE = 'sync'
+    VIEW_COUNT_FLUSH_INTERVAL = 0  # 測試時不啟動背景執行緒，需手動 flush
+    SOCKETIO_ASYNC_MODE = 'threading'
+    # socketio.test_client() 不支援訊息佇列；測試多節點廣播時改設為 'memory://'（程序內佇列）
+    SOCKETIO_MESSAGE_QUEUE = None
 
 config = {
     'development': DevelopmentConfig,
@@ -105,13 +105,8 @@ def handle_send_message(data):
     # 發送訊息到房間（包括發送者和接收者）
     emit('new_message', message_data, room=room)
 
-    # 計算接收者與發送者之間的未讀訊息數量
-    from app.models.message import Message
-    conversation_unread = Message.query.filter_by(
-        sender_id=current_user.id,
-        receiver_id=int(receiver_id),
-        is_read=False
-    ).count()
+    # 接收者與發送者之間的未讀訊息數量（對話摘要表）
+    conversation_unread = MessageService.get_conversation_unread_count(int(receiver_id), current_user.id)
 
     # 發送通知給接收者的個人房間（用於全站通知）
     receiver_room = f"user_{receiver_id}"
@@ -139,12 +134,10 @@ def handle_mark_as_read(data):
     if not other_user_id:
         return
     
-    # 標記與該用戶的所有訊息為已讀
-    MessageService.mark_conversation_as_read(current_user.id, int(other_user_id))
-    
-    # 更新未讀計數
-    unread_count = MessageService.get_unread_count(current_user.id)
-    emit('update_unread_count', {'count': unread_count})
+    # 標記與該用戶的所有訊息為已讀（有更新時由 MessageService 推送新的未讀計數到使用者房間）
+    success, count = MessageService.mark_conversation_as_read(current_user.id, int(other_user_id))
+    if not success or not count:
+        return
     
     # 通知發送者訊息已被讀取
     user_ids = sorted([current_user.id, int(other_user_id)])
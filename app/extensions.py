@@ -3,12 +3,18 @@ from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from flask_socketio import SocketIO
+from app.utils.view_counter import ViewCountBuffer
+from app.utils.image_pipeline import ImagePipeline
+from app.utils.image_cache import ResizedImageCache
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 migrate = Migrate()
 csrf = CSRFProtect()
 socketio = SocketIO()
+view_counter = ViewCountBuffer()
+image_pipeline = ImagePipeline()
+image_cache = ResizedImageCache()
 
 # Flask-Login 配置
 login_manager.login_view = 'auth.login'
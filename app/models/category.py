@@ -1,5 +1,7 @@
 from app.extensions import db
 from datetime import datetime
+from sqlalchemy import bindparam, event, func, inspect, literal, select, update
+from sqlalchemy.orm.attributes import set_committed_value
 
 class Category(db.Model):
     __tablename__ = 'categories'
@@ -8,6 +10,9 @@ class Category(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.Text)
     parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    # 物化路徑：由根到自己的 ID，例如 '/2/7/'（由下方事件自動維護）
+    # 「分類與所有子分類」即 path LIKE '/2/%'，可使用索引前綴比對
+    path = db.Column(db.String(255))
     sort_order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -15,5 +20,100 @@ class Category(db.Model):
     products = db.relationship('Product', backref='category', lazy='dynamic')
     children = db.relationship('Category', backref=db.backref('parent', remote_side=[id]), lazy='dynamic')
 
+    @staticmethod
+    def path_ids(path):
+        """將物化路徑解析為 ID 列表（由根到自己）"""
+        return [int(part) for part in (path or '').split('/') if part]
+
     def __repr__(self):
         return f'<Category {self.name}>'
+
+
+# PostgreSQL 在非 C 定序下需要 varchar_pattern_ops 才能以索引處理 LIKE 'prefix%'
+db.Index('idx_categories_path', Category.path, postgresql_ops={'path': 'varchar_pattern_ops'})
+
+
+def _build_path(connection, category_id, parent_id):
+    """計算分類的物化路徑（父分類路徑 + 自己的 ID）"""
+    table = Category.__table__
+    parent_path = None
+    if parent_id is not None:
+        parent_path = connection.execute(
+            select(table.c.path).where(table.c.id == parent_id)
+        ).scalar()
+    return f'{parent_path or "/"}{category_id}/'
+
+
+@event.listens_for(Category, 'after_insert')
+def set_category_path(mapper, connection, target):
+    """新增分類後寫入物化路徑（需要自動產生的 ID）"""
+    path = _build_path(connection, target.id, target.parent_id)
+    connection.execute(
+        update(Category.__table__).where(Category.__table__.c.id == target.id).values(path=path)
+    )
+    set_committed_value(target, 'path', path)
+
+
+@event.listens_for(Category, 'after_update')
+def move_category_subtree(mapper, connection, target):
+    """父分類變更時，以一筆 UPDATE 改寫整棵子樹的路徑前綴"""
+    history = inspect(target).attrs.parent_id.history
+    if not history.has_changes():
+        return
+
+    table = Category.__table__
+    old_path = connection.execute(
+        select(table.c.path).where(table.c.id == target.id)
+    ).scalar() or f'/{target.id}/'
+    new_path = _build_path(connection, target.id, target.parent_id)
+
+    if new_path.startswith(old_path) and new_path != old_path:
+        raise ValueError('不能將分類移到自己的子分類之下')
+
+    connection.execute(
+        update(table)
+        .where(table.c.path.like(f'{old_path}%'))
+        .values(path=literal(new_path) + func.substr(table.c.path, len(old_path) + 1))
+    )
+    set_committed_value(target, 'path', new_path)
+
+
+def rebuild_category_paths(connection):
+    """由 parent_id 重新計算所有分類的物化路徑（用於回填或資料庫層級的修改之後）
+
+    Returns:
+        int: 更新的分類數
+    """
+    table = Category.__table__
+    rows = connection.execute(select(table.c.id, table.c.parent_id, table.c.path)).all()
+    parents = {row.id: row.parent_id for row in rows}
+    current = {row.id: row.path for row in rows}
+
+    paths = {}
+
+    def resolve(category_id):
+        chain = []
+        node = category_id
+        while node is not None and node not in paths and node not in chain:
+            chain.append(node)
+            node = parents.get(node)
+        # 遇到循環時將循環起點視為根分類
+        prefix = paths.get(node, '/') if node is not None and node not in chain else '/'
+        for item in reversed(chain):
+            prefix = f'{prefix}{item}/'
+            paths[item] = prefix
+        return paths[category_id]
+
+    changed = [
+        {'category_id': category_id, 'new_path': resolve(category_id)}
+        for category_id in parents
+        if resolve(category_id) != current[category_id]
+    ]
+    if changed:
+        connection.execute(
+            update(table)
+            .where(table.c.id == bindparam('category_id'))
+            .values(path=bindparam('new_path')),
+            changed
+        )
+    return len(changed)
@@ -0,0 +1,41 @@
+from app.extensions import db
+from datetime import datetime
+
+class Conversation(db.Model):
+    """兩位使用者之間對話的摘要（反正規化自 messages，見 MessageService）
+
+    以排序後的使用者配對 (user_low_id < user_high_id) 為主鍵，記錄最後一則訊息與雙方各自的未讀數，
+    對話列表只需一次查詢；由 MessageService 在發送、標記已讀與刪除訊息的同一個交易中維護。
+    """
+    __tablename__ = 'conversations'
+
+    user_low_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id', ondelete='SET NULL'))
+    last_message_at = db.Column(db.DateTime)
+    low_unread_count = db.Column(db.Integer, nullable=False, default=0)   # user_low_id 的未讀數
+    high_unread_count = db.Column(db.Integer, nullable=False, default=0)  # user_high_id 的未讀數
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    last_message = db.relationship('Message', foreign_keys=[last_message_id])
+
+    @staticmethod
+    def key(user_id, other_user_id):
+        """排序後的使用者配對 (user_low_id, user_high_id)"""
+        return (user_id, other_user_id) if user_id < other_user_id else (other_user_id, user_id)
+
+    @classmethod
+    def unread_column(cls, user_id, other_user_id):
+        """user_id 在此對話中的未讀數欄位"""
+        return cls.low_unread_count if user_id < other_user_id else cls.high_unread_count
+
+    def unread_count_for(self, user_id):
+        return self.low_unread_count if user_id == self.user_low_id else self.high_unread_count
+
+    def __repr__(self):
+        return f'<Conversation {self.user_low_id}-{self.user_high_id}>'
+
+
+# 對話列表：WHERE user_low_id = ? OR user_high_id = ? ORDER BY last_message_at DESC
+db.Index('idx_conversations_low_last', Conversation.user_low_id, Conversation.last_message_at)
+db.Index('idx_conversations_high_last', Conversation.user_high_id, Conversation.last_message_at)
@@ -14,3 +14,10 @@ class Message(db.Model):
 
     def __repr__(self):
         return f'<Message from {self.sender_id} to {self.receiver_id}>'
+
+
+# 熱門度排程依建立時間範圍讀取新事件（見 TrendingService）
+db.Index('idx_messages_created_at', Message.created_at)
+
+# 聊天記錄的游標分頁：兩個方向各自以 (sender_id, receiver_id) 前綴倒序掃描 (created_at, id)
+db.Index('idx_messages_pair_created', Message.sender_id, Message.receiver_id, Message.created_at, Message.id)
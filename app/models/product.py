@@ -1,5 +1,9 @@
 from app.extensions import db
+from app.utils.search import build_search_document
 from datetime import datetime
+from sqlalchemy import DDL, FetchedValue, event, inspect
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -16,9 +20,29 @@ class Product(db.Model):
     location = db.Column(db.String(200))
     transaction_method = db.Column(db.String(200))
     view_count = db.Column(db.Integer, default=0)
+    # 主圖網址（反正規化，由 ProductService 於新增/刪除圖片時同步，避免列表頁 N+1 查詢）
+    primary_image_url = db.Column(db.String(255))
+    primary_image_renditions = db.Column(db.JSON)  # 主圖的多尺寸版本（同 ProductImage.renditions）
+    # 熱門度：對數尺度的時間衰減分數（刊登時以刊登事件初始化，由 TrendingService 定期累加，見 app/services/trending_service.py）
+    trending_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    trending_view_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    trending_updated_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 近似重複偵測：標題與描述的 MinHash 簽章，與疑似重複的原商品（見 DuplicateService）
+    minhash_signature = deferred(db.Column(db.LargeBinary))
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='SET NULL'))
+
+    # 全文檢索：search_tokens 為斷詞後的標題與描述（CJK 二元組），
+    # PostgreSQL 由觸發器同步到 search_vector（GIN 索引），SQLite 則同步到 FTS5 虛擬表
+    search_tokens = deferred(db.Column(db.Text))
+    search_vector = deferred(db.Column(
+        TSVECTOR().with_variant(db.Text(), 'sqlite'),
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue()
+    ))
+
     # 關聯
     images = db.relationship('ProductImage', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     transactions = db.relationship('Transaction', backref='product', lazy='dynamic')
@@ -27,8 +51,7 @@ class Product(db.Model):
     @property
     def primary_image(self):
         """取得主要圖片"""
-        img = self.images.filter_by(is_primary=True).first()
-        return img.image_url if img else '/static/images/placeholders/product-placeholder.png'
+        return self.primary_image_url or '/static/images/placeholders/product-placeholder.png'
 
     def increment_view_count(self):
         """增加瀏覽次數"""
@@ -37,3 +60,59 @@ class Product(db.Model):
 
     def __repr__(self):
         return f'<Product {self.title}>'
+
+
+# 游標分頁用的複合索引：WHERE status = ? AND (sort_key, id) < (?, ?) ORDER BY sort_key, id
+db.Index('idx_products_status_created', Product.status, Product.created_at, Product.id)
+db.Index('idx_products_status_price', Product.status, Product.price, Product.id)
+db.Index('idx_products_status_views', Product.status, Product.view_count, Product.id)
+db.Index('idx_products_status_trending', Product.status, Product.trending_score, Product.id)
+db.Index('idx_products_trending_updated', Product.trending_updated_at)
+db.Index('idx_products_user_created', Product.user_id, Product.created_at, Product.id)
+
+db.Index(
+    'idx_products_search_vector',
+    Product.search_vector,
+    postgresql_using='gin'
+).ddl_if(dialect='postgresql')
+
+# PostgreSQL：新增或更新 search_tokens 時重新計算 search_vector
+event.listen(Product.__table__, 'after_create', DDL("""
+    CREATE TRIGGER trg_products_search_vector
+    BEFORE INSERT OR UPDATE OF search_tokens ON products
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', search_tokens)
+""").execute_if(dialect='postgresql'))
+
+# SQLite（測試環境）：以 FTS5 外部內容表搭配觸發器同步
+for statement in (
+    "CREATE VIRTUAL TABLE products_fts USING fts5("
+    "search_tokens, content='products', content_rowid='id')",
+    "CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, search_tokens) VALUES (new.id, new.search_tokens); END",
+    "CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, search_tokens) "
+    "VALUES ('delete', old.id, old.search_tokens); END",
+    "CREATE TRIGGER products_fts_au AFTER UPDATE OF search_tokens ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, search_tokens) "
+    "VALUES ('delete', old.id, old.search_tokens); "
+    "INSERT INTO products_fts(rowid, search_tokens) VALUES (new.id, new.search_tokens); END",
+):
+    event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+event.listen(Product.__table__, 'before_drop', DDL(
+    'DROP TABLE IF EXISTS products_fts'
+).execute_if(dialect='sqlite'))
+
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def update_search_tokens(mapper, connection, target):
+    """標題或描述變更時重新斷詞"""
+    state = inspect(target)
+    if state.persistent and not (
+        state.attrs.title.history.has_changes() or
+        state.attrs.description.history.has_changes()
+    ):
+        return
+    target.search_tokens = build_search_document(target.title, target.description)
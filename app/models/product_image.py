@@ -4,12 +4,45 @@ from datetime import datetime
 class ProductImage(db.Model):
     __tablename__ = 'product_images'
 
+    # 圖片處理狀態常數（見 app/utils/image_pipeline.py）
+    STATUS_PROCESSING = 'processing'    # 原始檔已上傳，等待縮放與編碼
+    STATUS_READY = 'ready'              # 處理完成，image_url 可使用
+    STATUS_FAILED = 'failed'            # 處理失敗
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
     is_primary = db.Column(db.Boolean, default=False)
     sort_order = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_READY, server_default=STATUS_READY)
+    source_url = db.Column(db.String(255))  # 處理中的原始檔（處理完成後刪除並清空）
+    # 多尺寸版本：[{'width': 160, 'jpeg': url, 'webp': url}, ...]（由小到大，最大的 JPEG 即 image_url）
+    renditions = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @property
+    def is_ready(self):
+        return self.status == self.STATUS_READY
+
+    @property
+    def display_url(self):
+        """顯示用的圖片 URL（尚未處理完成時使用預設圖片）"""
+        if self.is_ready:
+            return self.image_url
+        return '/static/images/placeholders/product-placeholder.png'
+
+    def file_urls(self):
+        """此圖片的所有檔案（刪除圖片時使用）"""
+        urls = {self.image_url}
+        for rendition in self.renditions or []:
+            urls.update(value for key, value in rendition.items() if key != 'width')
+        if self.source_url:
+            urls.add(self.source_url)
+        return sorted(urls)
+
     def __repr__(self):
         return f'<ProductImage {self.image_url}>'
+
+
+# 重新排入處理佇列時查詢處理中的圖片
+db.Index('idx_product_images_status', ProductImage.status)
@@ -0,0 +1,17 @@
+from app.extensions import db
+
+class ProductLshBucket(db.Model):
+    """商品 MinHash 簽章的 LSH 桶（每項商品每個 band 一列，見 DuplicateService）"""
+    __tablename__ = 'product_lsh_buckets'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f'<ProductLshBucket product={self.product_id} band={self.band}>'
+
+
+# 同一賣家的近似重複查詢：WHERE user_id = ? AND bucket IN (...)
+db.Index('idx_product_lsh_buckets_lookup', ProductLshBucket.user_id, ProductLshBucket.bucket)
@@ -0,0 +1,30 @@
+from app.extensions import db
+from datetime import datetime
+
+class SavedSearch(db.Model):
+    __tablename__ = 'saved_searches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    keyword = db.Column(db.String(200))
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'))
+    condition = db.Column(db.String(20))
+    min_price = db.Column(db.Numeric(10, 2))
+    max_price = db.Column(db.Numeric(10, 2))
+    # 反向索引鍵：關鍵字中最具辨識度的詞元，沒有關鍵字時為 'category:<id>'、
+    # 'price:<level>:<k>'（價格區段）或 'condition:<狀況>'
+    # 新商品只需比對索引鍵出現在商品詞元中的儲存搜尋（見 SavedSearchService）
+    index_term = db.Column(db.String(100), nullable=False)
+    last_notified_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 關聯
+    user = db.relationship('User', backref=db.backref('saved_searches', lazy='dynamic'))
+    category = db.relationship('Category')
+
+    def __repr__(self):
+        return f'<SavedSearch {self.keyword} for user {self.user_id}>'
+
+
+db.Index('idx_saved_searches_user', SavedSearch.user_id)
+db.Index('idx_saved_searches_index_term', SavedSearch.index_term)
@@ -0,0 +1,45 @@
+import os
+from app.extensions import db
+from datetime import datetime
+from sqlalchemy import event, select
+
+class StoredFile(db.Model):
+    """內容定址儲存的檔案與參考計數（見 FileUploadService.store_file / delete_file）
+
+    檔名為處理後內容的 SHA-256，相同的圖片只儲存一份；
+    每個引用此檔案的 ProductImage 各計一次，計數歸零時才刪除實體檔案。
+    """
+    __tablename__ = 'stored_files'
+
+    url = db.Column(db.String(255), primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.url} refs={self.ref_count}>'
+
+
+@event.listens_for(db.session, 'after_commit')
+def _unlink_released_files(session):
+    """提交後刪除參考計數歸零的檔案（回滾時不刪除，計數也會一併還原）
+
+    刪除前再確認一次：其他交易可能在本交易提交後又引用了相同內容的檔案。
+    """
+    released = session.info.pop('released_files', None)
+    if not released:
+        return
+
+    with db.engine.connect() as connection:
+        referenced = set(connection.scalars(
+            select(StoredFile.url).where(StoredFile.url.in_([url for url, _ in released]))
+        ))
+
+    for url, path in released:
+        if url not in referenced and os.path.exists(path):
+            os.remove(path)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_released_files(session, previous_transaction):
+    session.info.pop('released_files', None)
@@ -70,3 +70,7 @@ class Transaction(db.Model):
 
     def __repr__(self):
         return f'<Transaction {self.id} - {self.status}>'
+
+
+# 熱門度排程依建立時間範圍讀取新事件（見 TrendingService）
+db.Index('idx_transactions_created_at', Transaction.created_at)
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, inspect
+from app.extensions import db
+from app.models.message import Message
+from app.models.notification import Notification
+from app.models.product import Product
+from app.models.transaction import Transaction
+
+class UserCounter(db.Model):
+    """使用者的未讀 / 待處理 / 上架商品計數（每位使用者一列，見 CounterService）
+
+    頁面與 Socket.IO 推送只需以主鍵讀取一列，不必每次 COUNT(*)；
+    計數由下方的 after_flush 事件依變更量在同一個交易中更新，
+    漂移（例如直接以 SQL 修改資料）由 reconcile-counters 修正。
+    """
+    __tablename__ = 'user_counters'
+
+    FIELDS = ('unread_messages', 'unread_notifications', 'pending_transactions', 'active_listings')
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    unread_messages = db.Column(db.Integer, nullable=False, default=0)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0)
+    pending_transactions = db.Column(db.Integer, nullable=False, default=0)  # 賣家待回應的交易請求
+    active_listings = db.Column(db.Integer, nullable=False, default=0)  # 販售中的商品（賣家頁面的總數）
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserCounter {self.user_id}>'
+
+
+# 計數規則：(模型, 計數對象欄位, 狀態欄位, 是否計入, 計數欄位)
+COUNTED_MODELS = (
+    (Message, 'receiver_id', 'is_read', lambda is_read: not is_read, 'unread_messages'),
+    (Notification, 'user_id', 'is_read', lambda is_read: not is_read, 'unread_notifications'),
+    (Transaction, 'seller_id', 'status', lambda status: status == Transaction.STATUS_PENDING, 'pending_transactions'),
+    (Product, 'user_id', 'status', lambda status: status == 'active', 'active_listings'),
+)
+
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    """僅用於啟用 active_history（不修改設定的值）"""
+
+
+# 計數依據的欄位啟用 active_history：物件過期後直接賦值時也會先載入舊值，
+# after_flush 才能由 history 得知變更前的狀態
+for _model, _owner_attr, _state_attr, _, _ in COUNTED_MODELS:
+    for _attr in (_owner_attr, _state_attr):
+        event.listen(getattr(_model, _attr), 'set', _load_previous, active_history=True)
+
+
+def apply_counter_deltas(connection, deltas):
+    """以變更量更新計數（不存在的列直接新增）
+
+    所有使用者以一個多列 INSERT ... ON CONFLICT 更新，並依 user_id 排序：
+    並行的交易（如通知群發與傳送訊息）涉及重疊的使用者時，以相同順序取得列鎖，不會互相死結。
+
+    Args:
+        connection: 目前交易的連線（db.session.connection()）
+        deltas: {user_id: {計數欄位: 變更量}}
+
+    Returns:
+        dict: 更新後的計數 {user_id: {計數欄位: int}}（RETURNING 取得，不必再查詢）
+    """
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = UserCounter.__table__
+    now = datetime.utcnow()
+    rows = [
+        {'user_id': user_id, 'updated_at': now, **{field: changes.get(field, 0) for field in UserCounter.FIELDS}}
+        for user_id, changes in sorted(deltas.items(), key=lambda item: item[0] or 0)
+        if user_id is not None and any(changes.values())
+    ]
+    if not rows:
+        return {}
+
+    stmt = insert(table).values(rows)
+    result = connection.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            'updated_at': stmt.excluded.updated_at,
+            **{field: table.c[field] + stmt.excluded[field] for field in UserCounter.FIELDS}
+        }
+    ).returning(table.c.user_id, *[table.c[field] for field in UserCounter.FIELDS]))
+    return {row[0]: dict(zip(UserCounter.FIELDS, row[1:])) for row in result}
+
+
+def _previous(state, attr):
+    """flush 前的欄位值（未變更時為目前的值）"""
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[attr].value
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_counters(session, flush_context):
+    """依本次 flush 新增、修改與刪除的訊息、通知、交易與商品更新計數
+
+    只涵蓋 ORM 物件的變更；以 UPDATE 陳述式批次修改時需自行呼叫 apply_counter_deltas。
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for model, owner_attr, state_attr, counted, field in COUNTED_MODELS:
+        for obj in session.new:
+            if isinstance(obj, model) and counted(getattr(obj, state_attr)):
+                deltas[getattr(obj, owner_attr)][field] += 1
+
+        for obj in session.deleted:
+            if isinstance(obj, model):
+                state = inspect(obj)
+                if counted(_previous(state, state_attr)):
+                    deltas[_previous(state, owner_attr)][field] -= 1
+
+        for obj in session.dirty:
+            if not isinstance(obj, model):
+                continue
+            state = inspect(obj)
+            before_owner, before = _previous(state, owner_attr), counted(_previous(state, state_attr))
+            after_owner, after = getattr(obj, owner_attr), counted(getattr(obj, state_attr))
+            if (before_owner, before) != (after_owner, after):
+                if before:
+                    deltas[before_owner][field] -= 1
+                if after:
+                    deltas[after_owner][field] += 1
+
+    if deltas:
+        apply_counter_deltas(session.connection(), deltas)
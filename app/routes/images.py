@@ -0,0 +1,45 @@
+import os
+from flask import Blueprint, abort, current_app, send_file
+from app.extensions import image_cache
+from app.utils.file_upload import FileUploadService
+
+bp = Blueprint('images', __name__)
+
+
+@bp.route('/img/<int:width>x<int:height>/<path:path>')
+def resized(width, height, path):
+    """動態縮圖：由處理完成的圖片產生指定尺寸（見 IMAGE_RESIZE_SIZES）
+
+    例如 /img/200x200/uploads/products/ab/cd/abcd....jpg
+    商品原圖處理後即刪除，來源為最大尺寸的版本，寬高不得超過 max(PRODUCT_IMAGE_WIDTHS)
+    """
+    if not image_cache.is_allowed_size(width, height):
+        abort(404)
+
+    # 只允許儲存的圖片（不含尚未處理、仍含 EXIF 的原始上傳與處理中的暫存檔）
+    if not FileUploadService.is_stored_image(f'/static/{path}'):
+        abort(404)
+
+    # 只允許上傳目錄內的檔案
+    root = os.path.realpath(current_app.config['UPLOAD_FOLDER'])
+    source = os.path.realpath(FileUploadService.url_to_path(f'/static/{path}'))
+    if os.path.commonpath([root, source]) != root or not os.path.isfile(source):
+        abort(404)
+
+    try:
+        cached_path, etag = image_cache.get(source, width, height)
+    except (KeyError, ValueError, OSError):
+        abort(404)
+
+    # 內容定址的檔案不會改變，可讓瀏覽器永久快取；其他檔案以 ETag 重新驗證
+    immutable = FileUploadService.is_content_addressed(f'/static/{path}')
+    response = send_file(
+        cached_path,
+        etag=etag,
+        max_age=current_app.config['IMAGE_CACHE_MAX_AGE'] if immutable else 86400,
+        conditional=True
+    )
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app
 from flask_login import current_user
 from app.services.message_service import MessageService
 from app.utils.decorators import login_required
@@ -32,12 +32,12 @@ def chat(user_id):
         flash('無法與自己對話', 'error')
         return redirect(url_for('messages.index'))
 
-    # 取得對話記錄
-    page = request.args.get('page', 1, type=int)
+    # 取得對話記錄（最新的一頁；cursor 為「載入更早的訊息」的游標）
     pagination = MessageService.get_conversation(
         user_id=current_user.id,
         other_user_id=user_id,
-        page=page
+        per_page=current_app.config['MESSAGES_PER_PAGE'],
+        cursor=request.args.get('cursor')
     )
 
     # 標記所有訊息為已讀
@@ -49,11 +49,37 @@ def chat(user_id):
     return render_template(
         'messages/chat.html',
         other_user=other_user,
-        messages=pagination.items,
+        messages=list(reversed(pagination.items)),
         pagination=pagination,
         conversations=conversations
     )
 
+@bp.route('/<int:user_id>/history')
+@login_required
+def history(user_id):
+    """載入更早的訊息（聊天室往上捲動時使用）"""
+    pagination = MessageService.get_conversation(
+        user_id=current_user.id,
+        other_user_id=user_id,
+        per_page=current_app.config['MESSAGES_PER_PAGE'],
+        cursor=request.args.get('cursor')
+    )
+
+    return jsonify({
+        'success': True,
+        'messages': [
+            {
+                'id': m.id,
+                'sender_id': m.sender_id,
+                'content': m.content,
+                'is_read': bool(m.is_read),
+                'created_at': m.created_at.strftime('%H:%M')
+            }
+            for m in reversed(pagination.items)
+        ],
+        'next_cursor': pagination.next_cursor
+    })
+
 @bp.route('/send', methods=['POST'])
 @login_required
 def send():
@@ -1,27 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, jsonify
 from flask_login import current_user
 from app.services.product_service import ProductService
 from app.services.notification_service import ReviewService
-from app.models.category import Category
-from app.extensions import db
+from app.services.category_service import CategoryService
+from app.services.import_service import ProductImportService
+from app.services.saved_search_service import SavedSearchService
+from app.services.counter_service import CounterService
+from app.extensions import db, view_counter
 from app.utils.decorators import login_required
 
 bp = Blueprint('products', __name__)
 
-DEFAULT_CATEGORY_NAMES = ['書籍', '文具', '電子產品', '生活用品', '運動', '其他']
 
+def use_keyset_pagination():
+    """商品列表是否使用游標分頁"""
+    return current_app.config.get('PRODUCTS_PAGINATION') == 'keyset'
 
-def get_or_seed_categories():
-    """取得分類列表，如為空則建立預設分類"""
-    categories = Category.query.order_by(Category.sort_order, Category.id).all()
-    if categories:
-        return categories
-
-    # 建立預設分類
-    for idx, name in enumerate(DEFAULT_CATEGORY_NAMES):
-        db.session.add(Category(name=name, sort_order=idx))
-    db.session.commit()
-    return Category.query.order_by(Category.sort_order, Category.id).all()
 
 @bp.route('/')
 @bp.route('/products')
@@ -49,24 +43,57 @@ def index():
         page=page,
         search=search,
         category_id=category_id,
+        include_descendants=True,
         condition=condition,
         min_price=min_price,
         max_price=max_price,
         sort_by=sort_by,
         order=order,
+        exclude_user_id=exclude_user_id,
+        keyset=use_keyset_pagination(),
+        cursor=request.args.get('cursor'),
+        use_cache=True
+    )
+
+    # 取得各篩選面向的商品數量
+    facets = ProductService.get_facets(
+        search=search,
+        category_id=category_id,
+        include_descendants=True,
+        condition=condition,
+        min_price=min_price,
+        max_price=max_price,
         exclude_user_id=exclude_user_id
     )
 
     # 取得分類列表
-    categories = Category.query.filter_by(parent_id=None).all()
+    categories = CategoryService.get_root_categories()
 
     return render_template(
         'products/index.html',
         products=pagination.items,
         pagination=pagination,
-        categories=categories
+        categories=categories,
+        facets=facets
     )
 
+@bp.route('/products/api/suggest')
+def suggest():
+    """搜尋框自動完成建議"""
+    query = request.args.get('q', '')[:100]
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+    return jsonify({'suggestions': ProductService.suggest(query, limit)})
+
+@bp.route('/products/api/view-counts')
+def view_count_stats():
+    """處理此請求的 worker 的瀏覽次數緩衝狀態（尚未寫回的次數、寫回統計）
+
+    記憶體緩衝位於各個 worker 中，只能由 worker 本身回報；僅接受 METRICS_ALLOWED_ADDRS 的請求。
+    """
+    if request.remote_addr not in current_app.config.get('METRICS_ALLOWED_ADDRS', ()):
+        abort(404)
+    return jsonify(view_counter.stats())
+
 @bp.route('/products/<int:id>')
 def detail(id):
     """商品詳情"""
@@ -81,12 +108,8 @@ def detail(id):
     if not product:
         abort(404)
 
-    # 取得相似商品（同分類，排除當前商品）
-    similar_products = ProductService.get_products(
-        category_id=product.category_id,
-        per_page=4
-    ).items
-    similar_products = [p for p in similar_products if p.id != id]
+    # 取得相似商品
+    similar_products = ProductService.get_similar_products(product, limit=4)
 
     seller_stats = ReviewService.get_user_stats(product.user_id)
 
@@ -97,6 +120,14 @@ def detail(id):
         seller_stats=seller_stats
     )
 
+@bp.route('/products/<int:id>/images/status')
+def image_status(id):
+    """商品圖片的背景處理進度（商品頁輪詢用）"""
+    status = ProductService.get_image_status(id)
+    if status is None:
+        abort(404)
+    return jsonify(status)
+
 @bp.route('/products/new', methods=['GET', 'POST'])
 @login_required
 def create():
@@ -126,12 +157,12 @@ def create():
         # 驗證必填欄位
         if not all([title, category_id, condition]):
             flash('請填寫所有必填欄位', 'error')
-            categories = get_or_seed_categories()
+            categories = CategoryService.get_or_seed_categories()
             return render_template('products/form.html', categories=categories, product=None)
 
         if not transaction_method:
             flash('請至少選擇一種交易方式', 'error')
-            categories = get_or_seed_categories()
+            categories = CategoryService.get_or_seed_categories()
             return render_template('products/form.html', categories=categories, product=None)
 
         # 建立商品
@@ -154,9 +185,34 @@ def create():
             flash(result, 'error')
 
     # GET 請求：顯示表單
-    categories = get_or_seed_categories()
+    categories = CategoryService.get_or_seed_categories()
     return render_template('products/form.html', categories=categories, product=None)
 
+@bp.route('/products/import', methods=['POST'])
+@login_required
+def bulk_import():
+    """批次匯入商品（上傳 CSV / JSONL，圖片可另附 ZIP 壓縮檔）"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': '請選擇匯入檔案'}), 400
+
+    archive = request.files.get('images')
+    fmt = request.form.get('format') or ProductImportService.detect_format(upload.filename)
+
+    success, result = ProductImportService.import_products(
+        current_user.id,
+        upload.stream,
+        fmt=fmt,
+        archive=archive.stream if archive and archive.filename else None,
+        max_rows=current_app.config.get('IMPORT_MAX_ROWS'),
+        # 圖片交給背景的圖片處理流程，請求不必等待整個壓縮檔的縮放與編碼
+        background_images=True
+    )
+    if not success:
+        return jsonify({'success': False, 'error': result}), 400
+
+    return jsonify({'success': True, **result})
+
 @bp.route('/products/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit(id):
@@ -183,12 +239,12 @@ def edit(id):
         # 驗證必填欄位
         if not all([title, category_id, condition]):
             flash('請填寫所有必填欄位', 'error')
-            categories = Category.query.all()
+            categories = CategoryService.get_or_seed_categories()
             return render_template('products/form.html', categories=categories, product=product)
 
         if not transaction_method:
             flash('請至少選擇一種交易方式', 'error')
-            categories = Category.query.all()
+            categories = CategoryService.get_or_seed_categories()
             return render_template('products/form.html', categories=categories, product=product)
 
         # 更新商品
@@ -211,7 +267,7 @@ def edit(id):
             flash(result, 'error')
 
     # GET 請求：顯示表單
-    categories = get_or_seed_categories()
+    categories = CategoryService.get_or_seed_categories()
     return render_template('products/form.html', categories=categories, product=product)
 
 @bp.route('/products/<int:id>/delete', methods=['POST'])
@@ -230,6 +286,7 @@ def delete(id):
     # 軟刪除
     product.status = 'deleted'
     db.session.commit()
+    ProductService.product_changed(product)
     
     flash('商品已刪除', 'success')
     return redirect(url_for('products.my_products'))
@@ -257,6 +314,7 @@ def toggle_status(id):
     
     product.status = new_status
     db.session.commit()
+    ProductService.product_changed(product)
     
     if new_status == 'inactive':
         flash('商品已下架', 'success')
@@ -272,26 +330,22 @@ def my_products():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', 'all')  # all, active, inactive, deleted
     
-    # 構建查詢
-    from app.models.product import Product
-    query = Product.query.filter_by(user_id=current_user.id)
-    
     # 狀態篩選
-    if status_filter == 'active':
-        query = query.filter_by(status='active')
-    elif status_filter == 'inactive':
-        query = query.filter_by(status='inactive')
-    elif status_filter == 'deleted':
-        query = query.filter_by(status='deleted')
+    if status_filter in ('active', 'inactive', 'deleted'):
+        status = status_filter
     # 'all' 顯示除了deleted之外的所有商品
     elif status_filter == 'all':
-        query = query.filter(Product.status.in_(['active', 'inactive']))
-    
-    # 按建立時間倒序
-    query = query.order_by(Product.created_at.desc())
-    
-    # 分頁
-    pagination = query.paginate(page=page, per_page=12, error_out=False)
+        status = ['active', 'inactive']
+    else:
+        status = None
+
+    pagination = ProductService.get_user_products(
+        user_id=current_user.id,
+        status=status,
+        page=page,
+        keyset=use_keyset_pagination(),
+        cursor=request.args.get('cursor')
+    )
 
     return render_template(
         'products/my_products.html',
@@ -300,6 +354,50 @@ def my_products():
         status_filter=status_filter
     )
 
+@bp.route('/saved-searches')
+@login_required
+def saved_searches():
+    """我的儲存搜尋"""
+    searches = SavedSearchService.get_user_saved_searches(current_user.id)
+    return render_template('products/saved_searches.html', saved_searches=searches)
+
+@bp.route('/saved-searches', methods=['POST'])
+@login_required
+def save_search():
+    """儲存目前的搜尋條件（有新商品符合時通知）"""
+    keyword = request.form.get('search', '').strip()
+    category_id = request.form.get('category', None, type=int)
+    condition = request.form.get('condition') or None
+    min_price = request.form.get('min_price', None, type=float)
+    max_price = request.form.get('max_price', None, type=float)
+
+    success, result = SavedSearchService.create_saved_search(
+        user_id=current_user.id,
+        keyword=keyword,
+        category_id=category_id,
+        condition=condition,
+        min_price=min_price,
+        max_price=max_price
+    )
+
+    if success:
+        flash('已儲存搜尋，有新商品符合時會通知您', 'success')
+    else:
+        flash(result, 'error')
+
+    return redirect(url_for(
+        'products.index', search=keyword or None, category=category_id,
+        condition=condition, min_price=min_price, max_price=max_price
+    ))
+
+@bp.route('/saved-searches/<int:id>/delete', methods=['POST'])
+@login_required
+def delete_saved_search(id):
+    """刪除儲存搜尋"""
+    success, message = SavedSearchService.delete_saved_search(id, current_user.id)
+    flash(message, 'success' if success else 'error')
+    return redirect(url_for('products.saved_searches'))
+
 @bp.route('/my')
 @login_required
 def my():
@@ -315,10 +413,14 @@ def seller(user_id):
     page = request.args.get('page', 1, type=int)
     
     # 獲取該賣家的所有上架商品（僅顯示 active 狀態）
+    # 總數取自 user_counters，不必每頁執行 COUNT(*)
     pagination = ProductService.get_user_products(
         user_id=user_id,
         status='active',
-        page=page
+        page=page,
+        keyset=use_keyset_pagination(),
+        cursor=request.args.get('cursor'),
+        total=CounterService.get(user_id, 'active_listings')
     )
     
     seller_stats = ReviewService.get_user_stats(user_id)
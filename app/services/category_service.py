@@ -0,0 +1,224 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app.extensions import db
+from app.models.category import Category, rebuild_category_paths
+
+DEFAULT_CATEGORY_NAMES = ['書籍', '文具', '電子產品', '生活用品', '運動', '其他']
+
+
+class CategoryNode:
+    """分類快取節點（與資料庫 session 無關，可跨請求共用）"""
+
+    __slots__ = ('id', 'name', 'description', 'parent_id', 'path', 'sort_order', 'children_ids')
+
+    def __init__(self, id, name, description, parent_id, path, sort_order):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.parent_id = parent_id
+        self.path = path
+        self.sort_order = sort_order
+        self.children_ids = []
+
+    def __repr__(self):
+        return f'<CategoryNode {self.name}>'
+
+
+class CategorySnapshot:
+    """某次載入的分類樹（載入後不再修改，descendants 為子樹的計算快取）"""
+
+    __slots__ = ('nodes', 'ordered', 'roots', 'descendants', 'loaded_at')
+
+    def __init__(self, nodes, ordered, roots, loaded_at):
+        self.nodes = nodes
+        self.ordered = ordered
+        self.roots = roots
+        self.descendants = {}
+        self.loaded_at = loaded_at
+
+
+class CategoryRegistry:
+    """分類樹快取
+
+    一次載入整個 categories 表（含父子階層），之後的查詢都由記憶體回應。
+    本程序內的分類寫入會在提交後清除快取；其他 worker 則在 ttl 秒後重新載入。
+    每次查詢只使用 _ensure_loaded() 回傳的快照，其他執行緒同時清除快取也不受影響。
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _ensure_loaded(self):
+        """取得目前的分類樹快照（不存在或過期時重新載入）"""
+        snapshot = self._snapshot
+        ttl = current_app.config.get('CATEGORY_CACHE_TTL', self.ttl)
+        if snapshot is not None and (not ttl or time.monotonic() - snapshot.loaded_at < ttl):
+            return snapshot
+
+        loaded_at = time.monotonic()
+        rows = db.session.query(
+            Category.id, Category.name, Category.description,
+            Category.parent_id, Category.path, Category.sort_order
+        ).order_by(Category.sort_order, Category.id).all()
+
+        nodes = {}
+        ordered = []
+        for row in rows:
+            node = CategoryNode(
+                row.id, row.name, row.description, row.parent_id, row.path, row.sort_order
+            )
+            nodes[node.id] = node
+            ordered.append(node)
+
+        roots = []
+        for node in ordered:
+            parent = nodes.get(node.parent_id)
+            if parent is not None:
+                parent.children_ids.append(node.id)
+            else:
+                roots.append(node)
+
+        snapshot = CategorySnapshot(nodes, ordered, roots, loaded_at)
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        """清除快取（下次存取時重新載入）"""
+        with self._lock:
+            self._snapshot = None
+
+    def all(self):
+        """所有分類（依 sort_order, id 排序）"""
+        return list(self._ensure_loaded().ordered)
+
+    def roots(self):
+        """最上層分類"""
+        return list(self._ensure_loaded().roots)
+
+    def get(self, category_id):
+        """取得分類（不存在時回傳 None）"""
+        return self._ensure_loaded().nodes.get(category_id)
+
+    def exists(self, category_id):
+        """分類是否存在"""
+        return self.get(category_id) is not None
+
+    def children(self, category_id):
+        """直接子分類"""
+        nodes = self._ensure_loaded().nodes
+        node = nodes.get(category_id)
+        if node is None:
+            return []
+        return [nodes[child_id] for child_id in node.children_ids]
+
+    def ancestor_ids(self, category_id):
+        """分類本身與所有祖先分類的 ID（由物化路徑解析，由根到自己）"""
+        node = self.get(category_id)
+        if node is None:
+            return []
+        return Category.path_ids(node.path) or [category_id]
+
+    def descendant_ids(self, category_id):
+        """分類本身與所有子孫分類的 ID（frozenset）"""
+        snapshot = self._ensure_loaded()
+        cached = snapshot.descendants.get(category_id)
+        if cached is not None:
+            return cached
+
+        nodes = snapshot.nodes
+        if category_id not in nodes:
+            return frozenset()
+
+        result = set()
+        stack = [category_id]
+        while stack:
+            current = stack.pop()
+            if current in result:
+                continue
+            result.add(current)
+            stack.extend(nodes[current].children_ids)
+
+        result = frozenset(result)
+        snapshot.descendants[category_id] = result
+        return result
+
+
+category_registry = CategoryRegistry()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _mark_categories_changed(mapper, connection, target):
+    """分類寫入時標記 session，於提交或回滾後清除快取"""
+    category_registry.invalidate()
+    session = object_session(target)
+    if session is not None:
+        session.info['categories_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_soft_rollback')
+def _invalidate_categories(session, *args):
+    if session.info.pop('categories_changed', False):
+        category_registry.invalidate()
+
+
+class CategoryService:
+    """分類服務類別"""
+
+    @staticmethod
+    def get_all_categories():
+        """取得所有分類（依 sort_order 排序）"""
+        return category_registry.all()
+
+    @staticmethod
+    def get_root_categories():
+        """取得最上層分類"""
+        return category_registry.roots()
+
+    @staticmethod
+    def get_category(category_id):
+        """取得單一分類（CategoryNode 或 None）"""
+        return category_registry.get(category_id)
+
+    @staticmethod
+    def category_exists(category_id):
+        """分類是否存在"""
+        return category_registry.exists(category_id)
+
+    @staticmethod
+    def get_descendant_ids(category_id):
+        """取得分類本身與所有子孫分類的 ID"""
+        return category_registry.descendant_ids(category_id)
+
+    @staticmethod
+    def rebuild_paths():
+        """由 parent_id 重新計算所有分類的物化路徑
+
+        Returns:
+            int: 更新的分類數
+        """
+        count = rebuild_category_paths(db.session.connection())
+        db.session.commit()
+        category_registry.invalidate()
+        return count
+
+    @staticmethod
+    def get_or_seed_categories():
+        """取得分類列表，如為空則建立預設分類"""
+        categories = category_registry.all()
+        if categories:
+            return categories
+
+        # 建立預設分類
+        for idx, name in enumerate(DEFAULT_CATEGORY_NAMES):
+            db.session.add(Category(name=name, sort_order=idx))
+        db.session.commit()
+        return category_registry.all()
@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, select, update
+from app.extensions import db
+from app.models.message import Message
+from app.models.notification import Notification
+from app.models.product import Product
+from app.models.transaction import Transaction
+from app.models.user_counter import UserCounter, apply_counter_deltas
+
+
+class CounterService:
+    """使用者計數服務（未讀訊息、未讀通知、待處理交易、上架商品）
+
+    計數存於 user_counters，寫入時由 after_flush 事件以變更量更新（見 app/models/user_counter.py），
+    讀取只需一次主鍵查詢。
+    """
+
+    @staticmethod
+    def get_counts(user_id):
+        """取得使用者的所有計數
+
+        Returns:
+            dict: {'unread_messages': int, 'unread_notifications': int, 'pending_transactions': int,
+                   'active_listings': int}
+        """
+        counter = db.session.get(UserCounter, user_id)
+        # 漂移造成的負值不顯示（由 reconcile-counters 修正）
+        return {
+            field: max(getattr(counter, field) or 0, 0) if counter else 0
+            for field in UserCounter.FIELDS
+        }
+
+    @staticmethod
+    def get(user_id, field):
+        """取得使用者的單一計數"""
+        return CounterService.get_counts(user_id)[field]
+
+    @staticmethod
+    def add(deltas):
+        """以變更量更新計數（批次 UPDATE 不會觸發 after_flush 事件時使用，不提交）
+
+        Args:
+            deltas: {user_id: {計數欄位: 變更量}}
+
+        Returns:
+            dict: 更新後的計數 {user_id: {計數欄位: int}}
+        """
+        return apply_counter_deltas(db.session.connection(), deltas)
+
+    @staticmethod
+    def actual_counts():
+        """由原始資料重新計算所有使用者的計數
+
+        Returns:
+            dict: {user_id: {計數欄位: int}}
+        """
+        queries = (
+            ('unread_messages', select(Message.receiver_id, func.count())
+                .where(Message.is_read == db.false()).group_by(Message.receiver_id)),
+            ('unread_notifications', select(Notification.user_id, func.count())
+                .where(Notification.is_read == db.false()).group_by(Notification.user_id)),
+            ('pending_transactions', select(Transaction.seller_id, func.count())
+                .where(Transaction.status == Transaction.STATUS_PENDING).group_by(Transaction.seller_id)),
+            ('active_listings', select(Product.user_id, func.count())
+                .where(Product.status == 'active').group_by(Product.user_id)),
+        )
+
+        counts = defaultdict(lambda: dict.fromkeys(UserCounter.FIELDS, 0))
+        for field, query in queries:
+            for user_id, count in db.session.execute(query):
+                counts[user_id][field] = count
+        return counts
+
+    @staticmethod
+    def reconcile():
+        """修正與原始資料不一致的計數（建議以 cron 定期執行）
+
+        只寫入不一致的列，正常情況下不會更新任何列；與寫入並行時造成的誤差於下次執行修正。
+
+        Returns:
+            dict: {'checked': 使用者數, 'repaired': 修正的使用者數}
+        """
+        try:
+            actual = CounterService.actual_counts()
+            stored = {counter.user_id: counter for counter in UserCounter.query.all()}
+
+            repaired = 0
+            now = datetime.utcnow()
+            for user_id in sorted(set(actual) | set(stored)):
+                expected = actual.get(user_id, dict.fromkeys(UserCounter.FIELDS, 0))
+                counter = stored.get(user_id)
+                if counter is None:
+                    if any(expected.values()):
+                        db.session.add(UserCounter(user_id=user_id, updated_at=now, **expected))
+                        repaired += 1
+                    continue
+                if any(getattr(counter, field) != expected[field] for field in UserCounter.FIELDS):
+                    db.session.execute(
+                        update(UserCounter)
+                        .where(UserCounter.user_id == user_id)
+                        .values(updated_at=now, **expected)
+                        .execution_options(synchronize_session=False)
+                    )
+                    repaired += 1
+
+            db.session.commit()
+            return {'checked': len(set(actual) | set(stored)), 'repaired': repaired}
+
+        except Exception:
+            db.session.rollback()
+            raise
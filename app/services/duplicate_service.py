@@ -0,0 +1,117 @@
+from flask import current_app
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import undefer
+from app.extensions import db
+from app.models.product import Product
+from app.models.product_lsh_bucket import ProductLshBucket
+from app.utils.minhash import MinHasher
+from app.utils.search import tokenize
+
+minhasher = MinHasher()
+
+
+class DuplicateService:
+    """近似重複商品偵測服務
+
+    以標題與描述的詞元計算 MinHash 簽章，並將簽章的 LSH 分段存入 product_lsh_buckets。
+    刊登時只需查詢同一賣家、同一桶的商品（bands 次索引查詢），再以簽章估計相似度，
+    成本與賣家的商品總數無關。
+    """
+
+    @staticmethod
+    def compute_signature(title, description):
+        """計算商品的 MinHash 簽章（沒有可用詞元時回傳 None）"""
+        tokens = set(tokenize(title)) | set(tokenize(description))
+        return minhasher.signature(tokens)
+
+    @staticmethod
+    def find_duplicate(user_id, signature, exclude_product_id=None):
+        """找出同一賣家販售中、與簽章近似的商品
+
+        Returns:
+            (product_id, similarity) 或 None
+        """
+        if signature is None:
+            return None
+
+        threshold = current_app.config.get('DUPLICATE_LISTING_THRESHOLD', 0.8)
+        query = db.session.query(Product.id, Product.minhash_signature).join(
+            ProductLshBucket, ProductLshBucket.product_id == Product.id
+        ).filter(
+            ProductLshBucket.user_id == user_id,
+            ProductLshBucket.bucket.in_(minhasher.band_hashes(signature)),
+            Product.status == 'active'
+        )
+        if exclude_product_id is not None:
+            query = query.filter(Product.id != exclude_product_id)
+
+        best = None
+        for product_id, packed in query.distinct():
+            similarity = minhasher.similarity(signature, minhasher.unpack(packed))
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (product_id, similarity)
+        return best
+
+    @staticmethod
+    def register(product, signature):
+        """儲存商品簽章並更新 LSH 桶（需已有 product.id，由呼叫端提交）"""
+        db.session.execute(
+            delete(ProductLshBucket).where(ProductLshBucket.product_id == product.id)
+        )
+        if signature is None:
+            product.minhash_signature = None
+            return
+
+        product.minhash_signature = minhasher.pack(signature)
+        db.session.execute(insert(ProductLshBucket), [
+            {'product_id': product.id, 'band': band, 'user_id': product.user_id, 'bucket': bucket}
+            for band, bucket in enumerate(minhasher.band_hashes(signature))
+        ])
+
+    @staticmethod
+    def check_listing(user_id, title, description, exclude_product_id=None):
+        """刊登或編輯前檢查是否為近似重複
+
+        Returns:
+            (signature, duplicate): duplicate 為 (product_id, similarity) 或 None；
+            DUPLICATE_LISTING_ACTION 為 None 時不檢查
+        """
+        signature = DuplicateService.compute_signature(title, description)
+        if not current_app.config.get('DUPLICATE_LISTING_ACTION'):
+            return signature, None
+        return signature, DuplicateService.find_duplicate(user_id, signature, exclude_product_id)
+
+    @staticmethod
+    def backfill(batch_size=500):
+        """為尚未計算簽章的商品補上簽章與 LSH 桶，並標記近似重複（依 id 由舊到新處理）
+
+        Returns:
+            (processed: int, duplicates: int)
+        """
+        processed = 0
+        duplicates = 0
+        last_id = 0
+        while True:
+            products = Product.query.options(undefer(Product.minhash_signature)).filter(
+                Product.minhash_signature.is_(None),
+                Product.id > last_id
+            ).order_by(Product.id).limit(batch_size).all()
+            if not products:
+                break
+
+            for product in products:
+                signature = DuplicateService.compute_signature(product.title, product.description)
+                if product.status == 'active' and product.duplicate_of_id is None:
+                    duplicate = DuplicateService.find_duplicate(product.user_id, signature, product.id)
+                    if duplicate:
+                        product.duplicate_of_id = duplicate[0]
+                        duplicates += 1
+                DuplicateService.register(product, signature)
+                # 讓同一批較新的商品也能比對到本商品
+                db.session.flush()
+
+            last_id = products[-1].id
+            processed += len(products)
+            db.session.commit()
+
+        return processed, duplicates
@@ -0,0 +1,518 @@
+import csv
+import io
+import json
+import os
+import shutil
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.datastructures import FileStorage
+from app.extensions import db
+from app.models.product import Product
+from app.models.product_image import ProductImage
+from app.models.product_lsh_bucket import ProductLshBucket
+from app.models.user import User
+from app.services.category_service import category_registry
+from app.services.counter_service import CounterService
+from app.services.duplicate_service import DuplicateService, minhasher
+from app.services.product_service import ProductService
+from app.services.trending_service import TrendingService
+from app.utils.file_upload import FileUploadService, image_limits, process_product_image
+from app.utils.helpers import allowed_file
+from app.utils.search import build_search_document
+
+# 商品狀況代碼與中文標籤（匯入時兩者皆可使用）
+PRODUCT_CONDITIONS = {
+    'new': '全新',
+    'like_new': '近全新',
+    'good': '良好',
+    'fair': '普通',
+    'poor': '需修理'
+}
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+
+class ProductImportService:
+    """商品批次匯入服務
+
+    以串流方式逐列讀取 CSV / JSONL，每 chunk_size 列為一批：
+    先驗證欄位，再以執行緒池平行處理圖片，最後以一筆多列 INSERT 寫入商品與圖片並提交。
+    background_images=True（網頁匯入）時只檢查並儲存原始圖片，縮放與編碼於提交後
+    交給背景的圖片處理流程，與一般刊登相同。
+    單列錯誤只會記錄在報告中，不會中斷整批匯入。
+
+    欄位：title, description, price, category（分類 ID 或名稱）, condition,
+    location, transaction_method, exchange_preference, images
+    （images 在 CSV 中以 | 分隔，在 JSONL 中可為列表；路徑相對於圖片目錄或 ZIP 壓縮檔）
+    """
+
+    @staticmethod
+    def detect_format(filename, default='csv'):
+        """由副檔名判斷匯入格式"""
+        ext = os.path.splitext(filename or '')[1].lower()
+        if ext in ('.jsonl', '.ndjson'):
+            return 'jsonl'
+        if ext == '.csv':
+            return 'csv'
+        return default
+
+    @staticmethod
+    def iter_rows(stream, fmt='csv'):
+        """逐列讀取匯入檔案
+
+        Args:
+            stream: 文字或二進位檔案物件
+            fmt: 'csv' 或 'jsonl'
+
+        Yields:
+            (row_number, data: dict or None, error: str or None)
+        """
+        if not isinstance(stream, io.TextIOBase):
+            stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for data in reader:
+                if not any((value or '').strip() for value in data.values() if isinstance(value, str)):
+                    continue
+                yield reader.line_num, data, None
+            return
+
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f'JSON 格式錯誤：{e}'
+                continue
+            if not isinstance(data, dict):
+                yield line_number, None, '每一列必須是 JSON 物件'
+                continue
+            yield line_number, data, None
+
+    @staticmethod
+    def validate_row(data):
+        """驗證並正規化單列資料
+
+        Returns:
+            (success: bool, values: dict or error_message: str)
+        """
+        def text(name):
+            value = data.get(name)
+            return '' if value is None else str(value).strip()
+
+        title = text('title')
+        if not title:
+            return False, '缺少商品名稱'
+        if len(title) > 200:
+            return False, '商品名稱不能超過 200 字'
+
+        try:
+            price = Decimal(text('price').replace(',', ''))
+        except InvalidOperation:
+            return False, '價格格式錯誤'
+        if not price.is_finite() or price < 0:
+            return False, '價格不能為負數'
+
+        category = text('category') or text('category_id')
+        node = None
+        if category.isdigit():
+            node = category_registry.get(int(category))
+        if node is None:
+            node = next((c for c in category_registry.all() if c.name == category), None)
+        if node is None:
+            return False, f'分類不存在：{category}'
+
+        condition = text('condition')
+        if condition not in PRODUCT_CONDITIONS:
+            condition = next(
+                (code for code, label in PRODUCT_CONDITIONS.items() if label == condition), None
+            )
+            if condition is None:
+                return False, f'商品狀況錯誤：{text("condition")}'
+
+        images = data.get('images') or []
+        if isinstance(images, str):
+            images = [name.strip() for name in images.split('|') if name.strip()]
+        images = [str(name) for name in images][:5]  # 最多 5 張
+        for name in images:
+            if not allowed_file(name):
+                return False, f'不支援的圖片格式：{name}'
+
+        return True, {
+            'title': title,
+            'description': text('description'),
+            'price': price,
+            'category_id': node.id,
+            'condition': condition,
+            'location': text('location') or None,
+            'transaction_method': text('transaction_method') or None,
+            'exchange_preference': text('exchange_preference') or None,
+            'images': images
+        }
+
+    @staticmethod
+    def import_products(seller_id, stream, fmt='csv', image_root=None, archive=None,
+                        chunk_size=None, workers=None, max_rows=None, background_images=False):
+        """批次匯入商品
+
+        Args:
+            seller_id: 賣家 ID
+            stream: 匯入檔案（文字或二進位檔案物件）
+            fmt: 'csv' 或 'jsonl'
+            image_root: 圖片所在目錄（僅允許此目錄內的檔案）
+            archive: 包含圖片的 ZIP 檔案物件或路徑
+            chunk_size: 每批列數（預設 IMPORT_CHUNK_SIZE）
+            workers: 圖片處理執行緒數（預設 IMPORT_IMAGE_WORKERS）
+            max_rows: 最多匯入列數（超過的列記為錯誤）
+            background_images: 圖片交給背景的圖片處理流程（不在呼叫端等待縮放與編碼）
+
+        Returns:
+            (success: bool, report: dict or error_message: str)
+            report = {'total', 'created', 'failed', 'product_ids', 'images_queued',
+                      'errors': [{'row', 'error'}]}
+        """
+        if fmt not in IMPORT_FORMATS:
+            return False, '不支援的匯入格式（僅支援 CSV、JSONL）'
+
+        seller = db.session.get(User, seller_id)
+        if not seller or seller.is_deleted:
+            return False, '使用者不存在'
+
+        config = current_app.config
+        chunk_size = chunk_size or config.get('IMPORT_CHUNK_SIZE', 500)
+        workers = workers or config.get('IMPORT_IMAGE_WORKERS', 4)
+        # 同時讀入記憶體（排隊或處理中）的圖片數上限
+        max_in_flight = workers * 2
+
+        try:
+            zip_file = zipfile.ZipFile(archive) if archive is not None else None
+        except zipfile.BadZipFile:
+            return False, '圖片壓縮檔格式錯誤'
+
+        report = {
+            'total': 0, 'created': 0, 'failed': 0, 'product_ids': [], 'images_queued': 0, 'errors': []
+        }
+        rows = ProductImportService.iter_rows(stream, fmt)
+
+        try:
+            # 背景處理圖片時不需要執行緒池（executor 為 None）
+            pool = nullcontext() if background_images else ThreadPoolExecutor(max_workers=workers)
+            with pool as executor:
+                while True:
+                    chunk = list(islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    ProductImportService._import_chunk(
+                        seller_id, chunk, report, executor, image_root, zip_file, max_rows,
+                        max_in_flight
+                    )
+        except (UnicodeDecodeError, csv.Error) as e:
+            report['errors'].append({'row': None, 'error': f'檔案讀取失敗：{e}'})
+        finally:
+            if zip_file is not None:
+                zip_file.close()
+
+        report['failed'] = len([e for e in report['errors'] if e['row'] is not None])
+        return True, report
+
+    @staticmethod
+    def _import_chunk(seller_id, chunk, report, executor, image_root, zip_file, max_rows,
+                      max_in_flight=8):
+        """驗證、處理圖片並寫入一批資料列（executor 為 None 時圖片交給背景處理流程）"""
+        def fail(row_number, error):
+            report['errors'].append({'row': row_number, 'error': error})
+
+        block_duplicates = current_app.config.get('DUPLICATE_LISTING_ACTION') == 'block'
+        threshold = current_app.config.get('DUPLICATE_LISTING_THRESHOLD', 0.8)
+        chunk_buckets = {}  # 同一批內的 LSH 桶 -> 簽章（尚未寫入資料庫的列）
+
+        valid = []
+        for row_number, data, error in chunk:
+            report['total'] += 1
+            if error:
+                fail(row_number, error)
+                continue
+            if max_rows and report['total'] > max_rows:
+                fail(row_number, f'超過單次匯入上限（{max_rows} 列）')
+                continue
+            success, result = ProductImportService.validate_row(data)
+            if not success:
+                fail(row_number, result)
+                continue
+
+            # 近似重複：與賣家既有商品及同一批先前的列比對
+            signature, duplicate = DuplicateService.check_listing(
+                seller_id, result['title'], result['description']
+            )
+            buckets = minhasher.band_hashes(signature) if signature else []
+            if block_duplicates:
+                if duplicate:
+                    fail(row_number, f'與已刊登的商品 #{duplicate[0]} 近似重複')
+                    continue
+                if any(
+                    minhasher.similarity(signature, other) >= threshold
+                    for bucket in buckets for other in chunk_buckets.get(bucket, ())
+                ):
+                    fail(row_number, '與匯入檔案中先前的列近似重複')
+                    continue
+            for bucket in buckets:
+                chunk_buckets.setdefault(bucket, []).append(signature)
+
+            result['signature'] = signature
+            result['duplicate_of_id'] = duplicate[0] if duplicate else None
+            valid.append((row_number, result))
+
+        if executor is None:
+            outcomes = ProductImportService._store_sources(valid, image_root, zip_file)
+        else:
+            outcomes = ProductImportService._process_images(
+                valid, executor, image_root, zip_file, max_in_flight
+            )
+
+        ready = []
+        for row_number, values in valid:
+            images, error = outcomes[row_number]['images'], outcomes[row_number]['error']
+            if error:
+                ProductImportService._discard_images(images)
+                fail(row_number, error)
+                continue
+            ready.append((row_number, values, images))
+
+        # 先提交圖片的檔案參考（含失敗列已釋放的參考），商品寫入失敗時再逐一釋放
+        db.session.commit()
+        if not ready:
+            return
+
+        now = datetime.utcnow()
+        product_rows = [
+            {
+                'user_id': seller_id,
+                'category_id': values['category_id'],
+                'title': values['title'],
+                'description': values['description'],
+                'price': values['price'],
+                'condition': values['condition'],
+                'status': 'active',
+                'exchange_preference': values['exchange_preference'],
+                'location': values['location'],
+                'transaction_method': values['transaction_method'],
+                'view_count': 0,
+                # 背景處理的圖片（renditions 為 None）於處理完成後才設定主圖
+                'primary_image_url': images[0][0] if images and images[0][1] is not None else None,
+                'primary_image_renditions': images[0][1] if images else None,
+                'search_tokens': build_search_document(values['title'], values['description']),
+                'minhash_signature': minhasher.pack(values['signature']) if values['signature'] else None,
+                'duplicate_of_id': values['duplicate_of_id'],
+                'trending_score': TrendingService.initial_score(now),
+                'created_at': now,
+                'updated_at': now
+            }
+            for _, values, images in ready
+        ]
+
+        try:
+            # 多列 INSERT ... RETURNING（批次插入，不會逐列往返資料庫）
+            product_ids = db.session.scalars(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                product_rows
+            ).all()
+
+            image_rows = [
+                {
+                    'product_id': product_id,
+                    'image_url': image_url,
+                    'renditions': renditions,
+                    # 尚未處理的原始圖片（image_url 即原始檔，見 create_product）
+                    'status': ProductImage.STATUS_PROCESSING if renditions is None else ProductImage.STATUS_READY,
+                    'source_url': image_url if renditions is None else None,
+                    'is_primary': idx == 0,
+                    'sort_order': idx,
+                    'created_at': now
+                }
+                for product_id, (_, _, images) in zip(product_ids, ready)
+                for idx, (image_url, renditions) in enumerate(images)
+            ]
+            if image_rows:
+                db.session.execute(insert(ProductImage), image_rows)
+
+            bucket_rows = [
+                {'product_id': product_id, 'band': band, 'user_id': seller_id, 'bucket': bucket}
+                for product_id, (_, values, _) in zip(product_ids, ready) if values['signature']
+                for band, bucket in enumerate(minhasher.band_hashes(values['signature']))
+            ]
+            if bucket_rows:
+                db.session.execute(insert(ProductLshBucket), bucket_rows)
+
+            # 批次 INSERT 不會觸發 after_flush 的計數更新
+            CounterService.add({seller_id: {'active_listings': len(product_ids)}})
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for row_number, _, images in ready:
+                ProductImportService._discard_images(images)
+                fail(row_number, f'寫入失敗：{e}')
+            db.session.commit()
+            return
+
+        report['created'] += len(product_ids)
+        report['product_ids'].extend(product_ids)
+
+        if executor is None:
+            pending_images = ProductImage.query.filter(
+                ProductImage.product_id.in_(product_ids),
+                ProductImage.status == ProductImage.STATUS_PROCESSING
+            ).order_by(ProductImage.id).all()
+            ProductService.queue_image_processing(pending_images)
+            report['images_queued'] += len(pending_images)
+
+        for product in Product.query.filter(Product.id.in_(product_ids)).all():
+            ProductService.product_created(product)
+
+    @staticmethod
+    def _process_images(valid, executor, image_root, zip_file, max_in_flight):
+        """於執行緒池中處理一批資料列的圖片並依內容儲存
+
+        Returns:
+            dict: {row_number: {'images': [(image_url, renditions)], 'error': str or None}}
+        """
+        # 平行處理圖片（解碼與縮放為 CPU 密集工作，Pillow 執行時會釋放 GIL）
+        # 圖片依序讀取並送入執行緒池，同時最多 max_in_flight 張，依送出順序取回結果
+        app = current_app._get_current_object()
+        max_bytes = current_app.config.get('MAX_CONTENT_LENGTH')
+        outcomes = {row_number: {'images': [], 'error': None} for row_number, _ in valid}
+        pending = deque()
+
+        def collect():
+            row_number, name, future = pending.popleft()
+            outcome = outcomes[row_number]
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                output_dir, renditions = future.result()
+            except Exception as e:
+                outcome['error'] = outcome['error'] or f'圖片處理失敗（{name}）：{e}'
+                return
+            try:
+                # 檔案參考計數於主執行緒的 session 中記錄
+                if not outcome['error']:
+                    outcome['images'].append(FileUploadService.store_renditions(output_dir, renditions))
+            except Exception as e:
+                outcome['error'] = f'圖片儲存失敗（{name}）：{e}'
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+        for row_number, values in valid:
+            for name in values['images']:
+                while len(pending) >= max_in_flight:
+                    collect()
+                try:
+                    source = ProductImportService._open_image_source(
+                        name, image_root, zip_file, max_bytes
+                    )
+                except ValueError as e:
+                    pending.append((row_number, name, e))
+                    continue
+                pending.append((row_number, name, executor.submit(
+                    ProductImportService._process_image, app, source
+                )))
+        while pending:
+            collect()
+        return outcomes
+
+    @staticmethod
+    def _store_sources(valid, image_root, zip_file):
+        """檢查並儲存一批資料列的原始圖片（縮放與編碼於提交後交給背景的圖片處理流程）
+
+        Returns:
+            dict: {row_number: {'images': [(source_url, None)], 'error': str or None}}
+        """
+        max_bytes = current_app.config.get('MAX_CONTENT_LENGTH')
+        outcomes = {}
+        for row_number, values in valid:
+            outcome = outcomes[row_number] = {'images': [], 'error': None}
+            for name in values['images']:
+                try:
+                    source = ProductImportService._open_image_source(
+                        name, image_root, zip_file, max_bytes
+                    )
+                except ValueError as e:
+                    outcome['error'] = str(e)
+                    break
+                stream = open(source, 'rb') if isinstance(source, str) else source
+                try:
+                    success, result = FileUploadService.store_raw_product_image(
+                        FileStorage(stream=stream, filename=os.path.basename(name))
+                    )
+                finally:
+                    stream.close()
+                if not success:
+                    outcome['error'] = f'圖片處理失敗（{name}）：{result}'
+                    break
+                outcome['images'].append((result, None))
+        return outcomes
+
+    @staticmethod
+    def _discard_images(images):
+        """刪除未寫入的商品的圖片（已處理的各尺寸檔案或尚未處理的原始檔）"""
+        for image_url, renditions in images:
+            if renditions is not None:
+                FileUploadService.delete_product_image(image_url, renditions)
+            else:
+                FileUploadService.delete_file(image_url)
+
+    @staticmethod
+    def _open_image_source(name, image_root, zip_file, max_bytes=None):
+        """取得圖片來源（ZIP 內的檔案先讀入記憶體；目錄內的檔案回傳路徑）
+
+        ZIP 內的檔案先以目錄中記錄的解壓縮大小檢查 max_bytes，讀取時也最多只讀 max_bytes + 1 位元組，
+        避免壓縮比極高的檔案耗盡記憶體。
+        """
+        if zip_file is not None:
+            try:
+                info = zip_file.getinfo(name)
+            except KeyError:
+                raise ValueError(f'壓縮檔中找不到圖片：{name}')
+            if max_bytes and info.file_size > max_bytes:
+                raise ValueError(f'圖片檔案過大：{name}')
+            with zip_file.open(info) as f:
+                data = f.read(max_bytes + 1) if max_bytes else f.read()
+            if max_bytes and len(data) > max_bytes:
+                raise ValueError(f'圖片檔案過大：{name}')
+            return io.BytesIO(data)
+
+        if image_root is None:
+            raise ValueError(f'未提供圖片來源：{name}')
+
+        root = os.path.realpath(image_root)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f'圖片路徑不合法：{name}')
+        if not os.path.isfile(path):
+            raise ValueError(f'找不到圖片：{name}')
+        return path
+
+    @staticmethod
+    def _process_image(app, source):
+        """於執行緒池中縮放並編碼圖片（不存取資料庫），回傳 (output_dir, renditions)"""
+        with app.app_context():
+            output_dir = FileUploadService.make_processing_dir()
+            try:
+                renditions = process_product_image(
+                    source, output_dir, current_app.config['PRODUCT_IMAGE_WIDTHS'],
+                    **image_limits(current_app.config)
+                )
+            except Exception:
+                shutil.rmtree(output_dir, ignore_errors=True)
+                raise
+            return output_dir, renditions
@@ -1,8 +1,11 @@
-from app.extensions import db
+from app.extensions import db, socketio
+from app.models.conversation import Conversation
 from app.models.message import Message
 from app.models.notification import Notification
 from app.models.user import User
-from sqlalchemy import or_, and_
+from app.services.counter_service import CounterService
+from app.utils.pagination import KeysetPagination, decode_cursor
+from sqlalchemy import or_, and_, case, delete, func, insert, select, tuple_, union_all, update
 from datetime import datetime
 
 class MessageService:
@@ -44,6 +47,8 @@ class MessageService:
             )
 
             db.session.add(message)
+            db.session.flush()
+            MessageService._record_message(message)
             db.session.commit()
 
             # 建立通知給接收者
@@ -61,79 +66,93 @@ class MessageService:
             return False, f'發送訊息失敗：{str(e)}'
 
     @staticmethod
-    def get_conversation(user_id, other_user_id, page=1, per_page=50):
-        """取得兩個使用者之間的對話
+    def get_conversation(user_id, other_user_id, per_page=50, cursor=None):
+        """取得兩個使用者之間的對話（由最新的訊息開始，以游標往前載入）
+
+        兩個方向各以 (sender_id, receiver_id, created_at, id) 索引倒序掃描並取 per_page + 1 筆，
+        再合併排序，不需 OFFSET 與 COUNT。
 
         Args:
             user_id: 當前使用者 ID
             other_user_id: 對話對象 ID
-            page: 頁數
             per_page: 每頁數量
+            cursor: 較早訊息的游標（KeysetPagination.next_cursor，None 表示最新一頁）
 
         Returns:
-            Pagination 物件
+            KeysetPagination：items 由新到舊，next_cursor 為更早一頁的游標
         """
-        query = Message.query.filter(
-            or_(
-                and_(Message.sender_id == user_id, Message.receiver_id == other_user_id),
-                and_(Message.sender_id == other_user_id, Message.receiver_id == user_id)
+        decoded = decode_cursor(cursor, 'created_at')
+        if decoded and decoded[2] != 'next':
+            decoded, cursor = None, None
+
+        def direction(sender_id, receiver_id):
+            query = select(Message.id, Message.created_at).where(
+                Message.sender_id == sender_id,
+                Message.receiver_id == receiver_id
             )
-        ).order_by(Message.created_at.asc())
-
-        return query.paginate(page=page, per_page=per_page, error_out=False)
+            if decoded:
+                query = query.where(
+                    tuple_(Message.created_at, Message.id) < tuple_(decoded[0], decoded[1])
+                )
+            return query.order_by(
+                Message.created_at.desc(), Message.id.desc()
+            ).limit(per_page + 1).subquery()
+
+        newest = union_all(
+            select(direction(user_id, other_user_id)),
+            select(direction(other_user_id, user_id))
+        ).subquery()
+        ids = select(newest.c.id).order_by(
+            newest.c.created_at.desc(), newest.c.id.desc()
+        ).limit(per_page + 1)
+
+        rows = Message.query.filter(Message.id.in_(ids)).order_by(
+            Message.created_at.desc(), Message.id.desc()
+        ).all()
+
+        return KeysetPagination.from_rows(
+            [(message, message.created_at) for message in rows[:per_page]],
+            'created_at', per_page, cursor, has_more=len(rows) > per_page
+        )
 
     @staticmethod
     def get_conversations_list(user_id):
         """取得使用者的對話列表（每個對話顯示最後一則訊息）
 
+        由 conversations 摘要表一次查出對話、對象與最後一則訊息。
+
         Args:
             user_id: 使用者 ID
 
         Returns:
             list: 對話列表（包含對象資訊和最後一則訊息）
         """
-        # 找出所有與該使用者有對話的其他使用者
-        sent_to = db.session.query(Message.receiver_id).filter_by(sender_id=user_id).distinct()
-        received_from = db.session.query(Message.sender_id).filter_by(receiver_id=user_id).distinct()
-
-        # 合併並去重
-        other_user_ids = set()
-        for row in sent_to:
-            other_user_ids.add(row[0])
-        for row in received_from:
-            other_user_ids.add(row[0])
-
-        # 建立對話列表
-        conversations = []
-        for other_user_id in other_user_ids:
-            # 取得與該使用者的最後一則訊息
-            last_message = Message.query.filter(
-                or_(
-                    and_(Message.sender_id == user_id, Message.receiver_id == other_user_id),
-                    and_(Message.sender_id == other_user_id, Message.receiver_id == user_id)
-                )
-            ).order_by(Message.created_at.desc()).first()
-
-            # 取得未讀訊息數量
-            unread_count = Message.query.filter_by(
-                sender_id=other_user_id,
-                receiver_id=user_id,
-                is_read=False
-            ).count()
-
-            # 取得對話對象資訊
-            other_user = User.query.get(other_user_id)
-
-            conversations.append({
+        other_user_id = case(
+            (Conversation.user_low_id == user_id, Conversation.user_high_id),
+            else_=Conversation.user_low_id
+        )
+        rows = db.session.query(Conversation, User, Message).join(
+            User, User.id == other_user_id
+        ).join(
+            Message, Message.id == Conversation.last_message_id
+        ).filter(
+            or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+        ).order_by(Conversation.last_message_at.desc()).all()
+
+        return [
+            {
                 'user': other_user,
                 'last_message': last_message,
-                'unread_count': unread_count
-            })
+                'unread_count': conversation.unread_count_for(user_id)
+            }
+            for conversation, other_user, last_message in rows
+        ]
 
-        # 按最後訊息時間排序
-        conversations.sort(key=lambda x: x['last_message'].created_at, reverse=True)
-
-        return conversations
+    @staticmethod
+    def get_conversation_unread_count(user_id, other_user_id):
+        """取得 user_id 在與 other_user_id 的對話中的未讀數量"""
+        conversation = db.session.get(Conversation, Conversation.key(user_id, other_user_id))
+        return conversation.unread_count_for(user_id) if conversation else 0
 
     @staticmethod
     def mark_as_read(message_id, user_id):
@@ -157,7 +176,13 @@ class MessageService:
                 return False, '您沒有權限操作此訊息'
 
             # 標記為已讀
-            message.is_read = True
+            if not message.is_read:
+                message.is_read = True
+                column = Conversation.unread_column(message.receiver_id, message.sender_id)
+                MessageService._update_conversation(
+                    message.receiver_id, message.sender_id,
+                    {column: case((column > 0, column - 1), else_=0)}
+                )
             db.session.commit()
 
             return True, '已標記為已讀'
@@ -170,6 +195,8 @@ class MessageService:
     def mark_conversation_as_read(user_id, other_user_id):
         """標記與某個使用者的所有訊息為已讀
 
+        以一個 UPDATE 陳述式標記，不載入訊息；更新筆數同時用於更新未讀計數與推送。
+
         Args:
             user_id: 當前使用者 ID
             other_user_id: 對話對象 ID
@@ -178,27 +205,44 @@ class MessageService:
             (success: bool, count: int or error_message: str)
         """
         try:
-            # 找出所有未讀的訊息
-            messages = Message.query.filter_by(
-                sender_id=other_user_id,
-                receiver_id=user_id,
-                is_read=False
-            ).all()
-
-            # 標記為已讀
-            count = 0
-            for message in messages:
-                message.is_read = True
-                count += 1
-
+            # 已載入 session 的訊息以 evaluate 同步 is_read，不必重新查詢
+            count = db.session.execute(
+                update(Message)
+                .where(
+                    Message.sender_id == other_user_id,
+                    Message.receiver_id == user_id,
+                    Message.is_read == db.false()
+                )
+                .values(is_read=True)
+                .execution_options(synchronize_session='evaluate')
+            ).rowcount
+
+            remaining = None
+            if count:
+                MessageService._update_conversation(
+                    user_id, other_user_id,
+                    {Conversation.unread_column(user_id, other_user_id): 0}
+                )
+                remaining = CounterService.add({user_id: {'unread_messages': -count}})[user_id]
             db.session.commit()
 
+            if remaining is not None:
+                MessageService._emit_unread_count(user_id, remaining['unread_messages'])
+
             return True, count
 
         except Exception as e:
             db.session.rollback()
             return False, f'標記失敗：{str(e)}'
 
+    @staticmethod
+    def _emit_unread_count(user_id, count):
+        """透過 Socket.IO 推送未讀訊息總數給使用者的所有分頁"""
+        try:
+            socketio.emit('update_unread_count', {'count': max(count, 0)}, room=f'user_{user_id}')
+        except Exception:
+            pass
+
     @staticmethod
     def get_unread_count(user_id):
         """取得未讀訊息總數
@@ -209,10 +253,7 @@ class MessageService:
         Returns:
             int: 未讀訊息數量
         """
-        return Message.query.filter_by(
-            receiver_id=user_id,
-            is_read=False
-        ).count()
+        return CounterService.get(user_id, 'unread_messages')
 
     @staticmethod
     def delete_message(message_id, user_id):
@@ -235,6 +276,7 @@ class MessageService:
             if message.sender_id != user_id:
                 return False, '您沒有權限刪除此訊息'
 
+            MessageService._remove_message(message)
             db.session.delete(message)
             db.session.commit()
 
@@ -244,6 +286,112 @@ class MessageService:
             db.session.rollback()
             return False, f'刪除失敗：{str(e)}'
 
+    @staticmethod
+    def _record_message(message):
+        """新訊息寫入對話摘要：更新最後一則訊息並增加接收者的未讀數（不提交）"""
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+
+        low_id, high_id = Conversation.key(message.sender_id, message.receiver_id)
+        unread = Conversation.unread_column(message.receiver_id, message.sender_id)
+        stmt = upsert(Conversation).values(
+            user_low_id=low_id,
+            user_high_id=high_id,
+            last_message_id=message.id,
+            last_message_at=message.created_at,
+            low_unread_count=int(message.receiver_id == low_id),
+            high_unread_count=int(message.receiver_id == high_id),
+            created_at=datetime.utcnow()
+        )
+        # 並行發送時以建立時間較新的訊息為準
+        is_newer = or_(
+            Conversation.last_message_at.is_(None),
+            stmt.excluded.last_message_at >= Conversation.last_message_at
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[Conversation.user_low_id, Conversation.user_high_id],
+            set_={
+                'last_message_id': case((is_newer, stmt.excluded.last_message_id), else_=Conversation.last_message_id),
+                'last_message_at': case((is_newer, stmt.excluded.last_message_at), else_=Conversation.last_message_at),
+                unread.key: unread + 1
+            }
+        ))
+
+    @staticmethod
+    def _remove_message(message):
+        """刪除訊息前更新對話摘要：扣除未讀數，刪除的是最後一則時改指向前一則（不提交）"""
+        values = {}
+        if not message.is_read:
+            column = Conversation.unread_column(message.receiver_id, message.sender_id)
+            values[column] = case((column > 0, column - 1), else_=0)
+
+        conversation = db.session.get(Conversation, Conversation.key(message.sender_id, message.receiver_id))
+        if conversation is not None and conversation.last_message_id == message.id:
+            previous = Message.query.filter(
+                or_(
+                    and_(Message.sender_id == message.sender_id, Message.receiver_id == message.receiver_id),
+                    and_(Message.sender_id == message.receiver_id, Message.receiver_id == message.sender_id)
+                ),
+                Message.id != message.id
+            ).order_by(Message.created_at.desc(), Message.id.desc()).first()
+            values[Conversation.last_message_id] = previous.id if previous else None
+            values[Conversation.last_message_at] = previous.created_at if previous else None
+
+        if values:
+            MessageService._update_conversation(message.sender_id, message.receiver_id, values)
+
+    @staticmethod
+    def _update_conversation(user_id, other_user_id, values):
+        low_id, high_id = Conversation.key(user_id, other_user_id)
+        db.session.execute(
+            update(Conversation)
+            .where(Conversation.user_low_id == low_id, Conversation.user_high_id == high_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def rebuild_conversations():
+        """由 messages 重新計算所有對話摘要（首次部署或資料修復時使用）
+
+        Returns:
+            int: 對話數
+        """
+        low_id = case((Message.sender_id < Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+        high_id = case((Message.sender_id < Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+        unread = Message.is_read == db.false()
+
+        summary = select(
+            low_id.label('user_low_id'),
+            high_id.label('user_high_id'),
+            func.max(Message.id).label('last_message_id'),
+            func.sum(case((and_(unread, Message.receiver_id == low_id), 1), else_=0)).label('low_unread_count'),
+            func.sum(case((and_(unread, Message.receiver_id == high_id), 1), else_=0)).label('high_unread_count')
+        ).group_by(low_id, high_id).subquery()
+
+        try:
+            db.session.execute(delete(Conversation))
+            result = db.session.execute(insert(Conversation).from_select(
+                ['user_low_id', 'user_high_id', 'last_message_id', 'last_message_at',
+                 'low_unread_count', 'high_unread_count', 'created_at'],
+                select(
+                    summary.c.user_low_id,
+                    summary.c.user_high_id,
+                    summary.c.last_message_id,
+                    Message.created_at,
+                    summary.c.low_unread_count,
+                    summary.c.high_unread_count,
+                    func.now()
+                ).join(Message, Message.id == summary.c.last_message_id)
+            ))
+            db.session.commit()
+            return result.rowcount
+        except Exception:
+            db.session.rollback()
+            raise
+
     @staticmethod
     def _create_notification(user_id, type, content, link):
         """建立通知（內部方法）
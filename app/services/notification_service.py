@@ -3,7 +3,9 @@ from app.models.notification import Notification
 from app.models.review import Review
 from app.models.transaction import Transaction
 from app.models.user import User
+from app.services.counter_service import CounterService
 from datetime import timedelta
+from sqlalchemy import update
 
 class NotificationService:
     """通知服務類別"""
@@ -32,30 +34,7 @@ class NotificationService:
             db.session.add(notification)
             db.session.commit()
 
-            try:
-                unread_count = NotificationService.get_unread_count(user_id)
-                # Convert UTC to Taiwan time (UTC+8)
-                taiwan_time = notification.created_at + timedelta(hours=8)
-
-                socketio.emit(
-                    'update_notification_count',
-                    {'count': unread_count},
-                    room=f'user_{user_id}'
-                )
-                socketio.emit(
-                    'new_notification',
-                    {
-                        'id': notification.id,
-                        'type': type,
-                        'content': content,
-                        'link': link,
-                        'is_read': False,
-                        'created_at': taiwan_time.strftime('%Y-%m-%d %H:%M:%S')
-                    },
-                    room=f'user_{user_id}'
-                )
-            except Exception:
-                pass
+            NotificationService._emit_notification(notification)
 
             return True, notification
 
@@ -63,6 +42,63 @@ class NotificationService:
             db.session.rollback()
             return False, f'建立通知失敗：{str(e)}'
 
+    @staticmethod
+    def create_notifications(user_ids, type, content, link=None):
+        """為多位使用者建立相同的通知（單一交易提交）
+
+        Args:
+            user_ids: 使用者 ID 列表
+            其他參數同 create_notification
+
+        Returns:
+            (success: bool, notifications: list or error_message: str)
+        """
+        try:
+            notifications = [
+                Notification(user_id=user_id, type=type, content=content, link=link)
+                for user_id in user_ids
+            ]
+            db.session.add_all(notifications)
+            db.session.commit()
+
+            for notification in notifications:
+                NotificationService._emit_notification(notification)
+
+            return True, notifications
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f'建立通知失敗：{str(e)}'
+
+    @staticmethod
+    def _emit_notification(notification):
+        """透過 Socket.IO 推送新通知與未讀數量"""
+        user_id = notification.user_id
+        try:
+            unread_count = NotificationService.get_unread_count(user_id)
+            # Convert UTC to Taiwan time (UTC+8)
+            taiwan_time = notification.created_at + timedelta(hours=8)
+
+            socketio.emit(
+                'update_notification_count',
+                {'count': unread_count},
+                room=f'user_{user_id}'
+            )
+            socketio.emit(
+                'new_notification',
+                {
+                    'id': notification.id,
+                    'type': notification.type,
+                    'content': notification.content,
+                    'link': notification.link,
+                    'is_read': False,
+                    'created_at': taiwan_time.strftime('%Y-%m-%d %H:%M:%S')
+                },
+                room=f'user_{user_id}'
+            )
+        except Exception:
+            pass
+
     @staticmethod
     def get_user_notifications(user_id, unread_only=False, page=1, per_page=20):
         """取得使用者的通知列表
@@ -119,6 +155,8 @@ class NotificationService:
     def mark_all_as_read(user_id):
         """標記所有通知為已讀
 
+        以一個 UPDATE 陳述式標記，不載入通知；更新筆數同時用於更新未讀計數與推送。
+
         Args:
             user_id: 使用者 ID
 
@@ -126,18 +164,28 @@ class NotificationService:
             (success: bool, count: int or error_message: str)
         """
         try:
-            notifications = Notification.query.filter_by(
-                user_id=user_id,
-                is_read=False
-            ).all()
-
-            count = 0
-            for notification in notifications:
-                notification.is_read = True
-                count += 1
-
+            count = db.session.execute(
+                update(Notification)
+                .where(Notification.user_id == user_id, Notification.is_read == db.false())
+                .values(is_read=True)
+                .execution_options(synchronize_session='evaluate')
+            ).rowcount
+
+            remaining = None
+            if count:
+                remaining = CounterService.add({user_id: {'unread_notifications': -count}})[user_id]
             db.session.commit()
 
+            if remaining is not None:
+                try:
+                    socketio.emit(
+                        'update_notification_count',
+                        {'count': max(remaining['unread_notifications'], 0)},
+                        room=f'user_{user_id}'
+                    )
+                except Exception:
+                    pass
+
             return True, count
 
         except Exception as e:
@@ -154,10 +202,7 @@ class NotificationService:
         Returns:
             int: 未讀通知數量
         """
-        return Notification.query.filter_by(
-            user_id=user_id,
-            is_read=False
-        ).count()
+        return CounterService.get(user_id, 'unread_notifications')
 
     @staticmethod
     def get_recent_notifications(user_id, limit=10):
@@ -1,18 +1,62 @@
-from app.extensions import db
+from app.extensions import db, view_counter, image_pipeline
 from app.models.product import Product
 from app.models.product_image import ProductImage
 from app.models.category import Category
+from app.models.stored_file import StoredFile
+from app.services.category_service import category_registry
+from app.services.duplicate_service import DuplicateService
+from app.services.trending_service import TrendingService
 from app.utils.file_upload import FileUploadService
-from sqlalchemy import or_, and_
+from app.utils.cache import TTLCache
+from app.utils.pagination import KeysetPagination, apply_keyset
+from app.utils.search import build_query_tokens, build_search_document
+from app.utils.similarity import SimilarityIndex
+from app.utils.suggest import PrefixIndex, normalize
+from flask import current_app
+from sqlalchemy import or_, and_, func, literal_column, table, column, case, select, cast, Float
+from sqlalchemy.orm import joinedload, undefer
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
+import os
+import shutil
+
+# SQLite FTS5 外部內容表（見 app/models/product.py）
+products_fts = table('products_fts', column('rowid'), column('search_tokens'))
+
+# 篩選面向數量快取（key 為正規化後的篩選條件）
+facet_cache = TTLCache(maxsize=512)
+
+# 登入使用者自己的商品的面向數量（key 為篩選條件加上 user_id，從共用結果扣除用），
+# 與共用快取分開存放，使用者數量多時不會擠掉共用的結果
+seller_facet_cache = TTLCache(maxsize=2048)
+
+# 商品列表快取：只以公開的篩選/排序/游標為 key，內容為 (id, user_id, 排序值)，
+# 排除使用者自己的商品在記憶體中處理，因此登入與未登入的使用者共用同一份快取
+listing_cache = TTLCache(maxsize=1024)
+
+# 相似商品索引（上架中的商品）
+similarity_index = SimilarityIndex()
+
+# 搜尋框自動完成用的商品標題前綴索引（見 app/utils/suggest.py）
+suggest_index = PrefixIndex()
 
 class ProductService:
     """商品服務類別"""
 
+    # 游標分頁可用的排序欄位
+    KEYSET_SORT_COLUMNS = {
+        'created_at': Product.created_at,
+        'price': Product.price,
+        'view_count': Product.view_count,
+        'trending': Product.trending_score
+    }
+
     @staticmethod
     def get_products(page=1, per_page=12, search=None, category_id=None,
                     condition=None, min_price=None, max_price=None,
-                    sort_by='created_at', order='desc', status='active', exclude_user_id=None):
+                    sort_by='created_at', order='desc', status='active', exclude_user_id=None,
+                    keyset=False, cursor=None, total_mode=None, use_cache=False,
+                    include_descendants=False):
         """取得商品列表（分頁）
 
         Args:
@@ -23,41 +67,57 @@ class ProductService:
             condition: 商品狀況
             min_price: 最低價格
             max_price: 最高價格
-            sort_by: 排序欄位（created_at, price, view_count）
+            sort_by: 排序欄位（created_at, price, view_count, trending, relevance）
             order: 排序方向（asc, desc）
             status: 商品狀態
             exclude_user_id: 排除特定使用者的商品
+            keyset: 是否使用游標分頁（不使用 OFFSET 與 COUNT）
+            cursor: 游標分頁的游標字串（None 表示第一頁）
+            total_mode: 游標分頁的總數模式（None, 'estimate', 'exact'）
+            use_cache: 是否使用共用列表快取（僅適用於游標分頁且不計算總數時）
+            include_descendants: 分類篩選是否包含所有子分類
 
         Returns:
-            Pagination 物件
+            Pagination 物件（keyset=True 時為 KeysetPagination 物件）
         """
-        query = Product.query
+        # 熱門度只有由高到低有意義
+        if sort_by == 'trending':
+            order = 'desc'
+
+        cache_key = None
+        if use_cache and keyset and not total_mode:
+            search_key = (search or '').strip()
+            cache_key = (
+                ' '.join(build_query_tokens(search_key)) or search_key.lower(),
+                category_id or None, bool(include_descendants), condition or None,
+                min_price, max_price, sort_by, order, status, per_page
+            )
+
+        # 商品卡片會顯示賣家名稱，一併載入避免 N+1 查詢
+        query = Product.query.options(joinedload(Product.seller))
 
         # 篩選狀態
         if status:
             query = query.filter_by(status=status)
 
-        # 排除特定使用者的商品
-        if exclude_user_id:
+        # 排除特定使用者的商品（使用快取時改在記憶體中排除）
+        if exclude_user_id and cache_key is None:
             query = query.filter(Product.user_id != exclude_user_id)
 
         # 搜尋關鍵字
+        rank_expr = None
         if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                or_(
-                    Product.title.ilike(search_term),
-                    Product.description.ilike(search_term)
-                )
-            )
+            query, rank_expr = ProductService._apply_search(query, search)
 
         # 分類篩選
         if category_id:
-            query = query.filter_by(category_id=category_id)
+            query = query.filter(
+                ProductService._category_condition(category_id, include_descendants)
+            )
 
         # 狀況篩選
         if condition:
-            query = query.filter_by(condition=condition)
+            query = query.filter(Product.condition == condition)
 
         # 價格篩選
         if min_price is not None:
@@ -65,8 +125,42 @@ class ProductService:
         if max_price is not None:
             query = query.filter(Product.price <= max_price)
 
-        # 排序
-        order_column = getattr(Product, sort_by, Product.created_at)
+        # 排序（relevance 僅在有搜尋關鍵字時有效，否則退回 created_at）
+        if sort_by == 'relevance':
+            if rank_expr is None:
+                sort_by = 'created_at'
+            elif not keyset:
+                return query.order_by(rank_expr.asc(), Product.id.desc()).paginate(
+                    page=page, per_page=per_page, error_out=False
+                )
+
+        if keyset:
+            if sort_by == 'relevance':
+                sort_expr, order = rank_expr, 'asc'
+            else:
+                if sort_by not in ProductService.KEYSET_SORT_COLUMNS:
+                    sort_by = 'created_at'
+                sort_expr = ProductService.KEYSET_SORT_COLUMNS[sort_by]
+
+            if cache_key is not None:
+                result = ProductService._get_cached_keyset_page(
+                    query, sort_expr, sort_by, order, per_page, cursor,
+                    exclude_user_id, status, cache_key
+                )
+                if result is not None:
+                    return result
+                # 排除後數量不足以湊滿一頁，改以資料庫查詢
+                if exclude_user_id:
+                    query = query.filter(Product.user_id != exclude_user_id)
+
+            return KeysetPagination(
+                query, sort_expr, Product.id, sort_by,
+                order=order, per_page=per_page, cursor=cursor, total_mode=total_mode
+            )
+
+        order_column = ProductService.KEYSET_SORT_COLUMNS.get(sort_by)
+        if order_column is None:
+            order_column = getattr(Product, sort_by, Product.created_at)
         if order == 'desc':
             query = query.order_by(order_column.desc())
         else:
@@ -76,29 +170,420 @@ class ProductService:
         return query.paginate(page=page, per_page=per_page, error_out=False)
 
     @staticmethod
-    def get_user_products(user_id, status=None, page=1, per_page=12):
-        """取得特定使用者的商品
-        
+    def _get_cached_keyset_page(query, sort_expr, sort_by, order, per_page, cursor,
+                                exclude_user_id, status, cache_key):
+        """從共用列表快取取得一頁商品（見 get_products 的 use_cache）
+
+        快取內容多取 LISTING_CACHE_OVERFETCH 筆，排除使用者自己的商品後仍能湊滿一頁。
+
+        Returns:
+            KeysetPagination 或 None（排除後不足一頁且可能還有更多資料）
+        """
+        limit = per_page + 1 + current_app.config.get('LISTING_CACHE_OVERFETCH', 12)
+        key = cache_key + (cursor,)
+
+        raw = listing_cache.get(key)
+        if raw is None:
+            ordered, _, _ = apply_keyset(query, sort_expr, Product.id, sort_by, order, cursor)
+            raw = [
+                tuple(row) for row in
+                ordered.with_entities(Product.id, Product.user_id, sort_expr).limit(limit)
+            ]
+            listing_cache.set(key, raw, ttl=current_app.config.get('LISTING_CACHE_TTL', 30))
+
+        rows = [row for row in raw if not exclude_user_id or row[1] != exclude_user_id]
+        if len(rows) <= per_page and len(raw) == limit:
+            return None
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        # 以主鍵載入商品（內容為最新；快取期間經由交易改變狀態的商品不顯示）
+        products = {
+            product.id: product for product in
+            Product.query.options(joinedload(Product.seller)).filter(
+                Product.id.in_([row[0] for row in rows])
+            )
+        } if rows else {}
+
+        return KeysetPagination.from_rows(
+            [
+                (products[row[0]], row[2]) for row in rows
+                if row[0] in products and (not status or products[row[0]].status == status)
+            ],
+            sort_by, per_page, cursor, has_more
+        )
+
+    @staticmethod
+    def invalidate_listing_cache():
+        """商品新增、更新或狀態變更後清除列表與面向數量快取"""
+        listing_cache.clear()
+        facet_cache.clear()
+        seller_facet_cache.clear()
+
+    @staticmethod
+    def product_changed(product):
+        """商品新增、更新或狀態變更（已提交）後同步記憶體中的快取與索引"""
+        ProductService.invalidate_listing_cache()
+
+        if product.status == 'active':
+            similarity_index.upsert(product.id, product.title, product.description, product.category_id)
+            suggest_index.upsert(product.id, product.title, product.view_count)
+        else:
+            similarity_index.remove(product.id)
+            suggest_index.remove(product.id)
+
+    @staticmethod
+    def product_created(product):
+        """新商品（已提交）刊登後：同步快取與索引，並通知符合儲存搜尋的使用者"""
+        from app.services.saved_search_service import SavedSearchService
+
+        ProductService.product_changed(product)
+        try:
+            SavedSearchService.notify_matches(product)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'儲存搜尋通知失敗：{str(e)}')
+
+    @staticmethod
+    def get_similar_products(product, limit=4):
+        """取得相似商品
+
+        使用記憶體中的 TF-IDF 相似商品索引；索引尚未建立（或商品不在索引中）時
+        先回傳同分類的最新商品，並於背景建立索引。索引每 SIMILARITY_INDEX_MAX_AGE 秒
+        於背景重建，反映其他 worker 刊登或變更的商品。
+
         Args:
-            user_id: 使用者 ID
-            status: 商品狀態篩選（選填）
-            page: 頁碼
-            per_page: 每頁數量
-            
+            product: 商品
+            limit: 數量
+
+        Returns:
+            list: 商品列表
+        """
+        similar_ids = similarity_index.similar(product.id, limit)
+
+        similarity_index.max_age = current_app.config.get('SIMILARITY_INDEX_MAX_AGE')
+        if similar_ids is None or similarity_index.stale:
+            app = current_app._get_current_object()
+            similarity_index.ensure_built(
+                app,
+                lambda: db.session.query(
+                    Product.id, Product.title, Product.description, Product.category_id
+                ).filter_by(status='active').yield_per(1000),
+                background=app.config.get('SIMILARITY_INDEX_BACKGROUND_BUILD', True)
+            )
+
+        if similar_ids is None:
+            return Product.query.filter(
+                Product.category_id == product.category_id,
+                Product.status == 'active',
+                Product.id != product.id
+            ).order_by(Product.created_at.desc()).limit(limit).all()
+
+        if not similar_ids:
+            return []
+
+        products = {
+            p.id: p for p in Product.query.filter(
+                Product.id.in_(similar_ids), Product.status == 'active'
+            )
+        }
+        return [products[pid] for pid in similar_ids if pid in products]
+
+    @staticmethod
+    def suggest(prefix, limit=8):
+        """搜尋框自動完成建議（分類名稱與販售中的商品標題）
+
+        索引尚未建立時於背景建立，建立完成前只回傳分類建議；之後每 SUGGEST_INDEX_MAX_AGE 秒
+        於背景重建，反映其他 worker 的變更。索引只包含販售中的商品，本程序的狀態變更
+        由 product_changed 即時同步，因此每次按鍵都不需要查詢資料庫。
+
+        Returns:
+            list: [{'type': 'category' | 'product', 'id': id, 'text': 名稱}, ...]
+        """
+        normalized = normalize(prefix)
+        if not normalized:
+            return []
+
+        suggestions = [
+            {'type': 'category', 'id': category.id, 'text': category.name}
+            for category in category_registry.all()
+            if normalize(category.name).startswith(normalized)
+        ][:limit]
+
+        suggest_index.max_age = current_app.config.get('SUGGEST_INDEX_MAX_AGE')
+        if not suggest_index.ready or suggest_index.stale:
+            app = current_app._get_current_object()
+            suggest_index.ensure_built(
+                app,
+                lambda: db.session.query(
+                    Product.id, Product.title, Product.view_count
+                ).filter_by(status='active').yield_per(1000),
+                background=app.config.get('SUGGEST_INDEX_BACKGROUND_BUILD', True)
+            )
+
+        suggestions.extend(
+            {'type': 'product', 'id': product_id, 'text': title}
+            for product_id, title in suggest_index.search(normalized, limit - len(suggestions))
+        )
+        return suggestions
+
+    @staticmethod
+    def _category_condition(category_id, include_descendants=False):
+        """分類篩選條件
+
+        包含子分類時以物化路徑前綴取得整棵子樹：
+        category_id IN (SELECT id FROM categories WHERE path LIKE '/2/%')，
+        沒有子分類時退回單純的等值比對。
+        """
+        node = category_registry.get(category_id) if include_descendants else None
+        if node is None or not node.path or not node.children_ids:
+            return Product.category_id == category_id
+
+        subtree = select(Category.id).where(Category.path.like(f'{node.path}%'))
+        return Product.category_id.in_(subtree)
+
+    @staticmethod
+    def get_facets(search=None, category_id=None, condition=None, min_price=None,
+                   max_price=None, status='active', exclude_user_id=None, price_buckets=None,
+                   include_descendants=False):
+        """取得篩選面向的商品數量（分類、商品狀況、價格區間）
+
+        以單一 GROUP BY 查詢取得 (分類, 狀況, 價格區間) 的聯合分布，再於記憶體中彙總，
+        每個面向的數量會套用「其他」面向的篩選條件但不套用自己的，
+        例如已選擇分類時仍能看到其他分類各有幾件商品。
+        結果依正規化後的篩選條件快取 FACET_CACHE_TTL 秒，所有使用者共用；
+        exclude_user_id 的商品另以賣家索引查出後從共用結果扣除（數量可直接相減），
+        該賣家的數量同樣快取 FACET_CACHE_TTL 秒。
+
+        Args:
+            其他參數同 get_products
+            price_buckets: 價格區間列表 [(min, max), ...]，max 為 None 表示無上限
+                           （預設使用 PRODUCT_PRICE_BUCKETS 設定）
+            include_descendants: 分類篩選包含子分類，且分類數量累計到所有祖先分類
+
         Returns:
-            Pagination 物件
+            dict: {
+                'category': {category_id: count},
+                'condition': {condition: count},
+                'price': [{'min': min, 'max': max, 'count': count}, ...]
+            }
         """
-        query = Product.query.filter_by(user_id=user_id)
-        
-        # 狀態篩選
+        if price_buckets is None:
+            price_buckets = current_app.config.get('PRODUCT_PRICE_BUCKETS', [])
+        price_buckets = tuple((lo, hi) for lo, hi in price_buckets)
+
+        search = (search or '').strip()
+        cache_key = (
+            ' '.join(build_query_tokens(search)) or search.lower(),
+            category_id or None,
+            bool(include_descendants),
+            condition or None,
+            min_price,
+            max_price,
+            status,
+            price_buckets
+        )
+
+        ttl = current_app.config.get('FACET_CACHE_TTL', 60)
+        facets = facet_cache.get_or_set(
+            cache_key,
+            lambda: ProductService._compute_facets(
+                search, category_id, condition, min_price, max_price,
+                status, price_buckets, include_descendants
+            ),
+            ttl=ttl
+        )
+
+        if exclude_user_id:
+            own = seller_facet_cache.get_or_set(
+                cache_key + (exclude_user_id,),
+                lambda: ProductService._compute_facets(
+                    search, category_id, condition, min_price, max_price,
+                    status, price_buckets, include_descendants, user_id=exclude_user_id
+                ),
+                ttl=ttl
+            )
+            facets = ProductService._subtract_facets(facets, own)
+
+        return facets
+
+    @staticmethod
+    def _subtract_facets(facets, own):
+        """從共用的面向數量扣除特定使用者的商品（不修改快取中的結果）"""
+        def subtract(counts, removed):
+            result = dict(counts)
+            for key, count in removed.items():
+                remaining = result.get(key, 0) - count
+                if remaining > 0:
+                    result[key] = remaining
+                else:
+                    result.pop(key, None)
+            return result
+
+        return {
+            'category': subtract(facets['category'], own['category']),
+            'condition': subtract(facets['condition'], own['condition']),
+            'price': [
+                {**bucket, 'count': max(bucket['count'] - removed['count'], 0)}
+                for bucket, removed in zip(facets['price'], own['price'])
+            ]
+        }
+
+    @staticmethod
+    def _compute_facets(search, category_id, condition, min_price, max_price,
+                        status, price_buckets, include_descendants=False, user_id=None):
+        """執行面向數量查詢（見 get_facets；指定 user_id 時只計算該賣家的商品）
+
+        價格區間的數量與連結的篩選條件一致（min_price <= 價格 <= max_price，兩端皆包含）：
+        每列依 [lo, hi) 分到一個區間，價格恰為某區間上限的列另以 facet_price_edge 分組，
+        再加到該區間，因此邊界價格的商品同時計入相鄰的兩個區間。
+        """
+        bucket_expr = case(
+            *[
+                (and_(Product.price >= lo, Product.price < hi) if hi is not None
+                 else Product.price >= lo, idx)
+                for idx, (lo, hi) in enumerate(price_buckets)
+            ],
+            else_=None
+        ) if price_buckets else literal_column('NULL')
+        edges = [(Product.price == hi, idx) for idx, (lo, hi) in enumerate(price_buckets) if hi is not None]
+        edge_expr = case(*edges, else_=None) if edges else literal_column('NULL')
+
+        columns = [
+            Product.category_id.label('facet_category'),
+            Product.condition.label('facet_condition'),
+            bucket_expr.label('facet_price_bucket'),
+            edge_expr.label('facet_price_edge')
+        ]
+
+        # 價格篩選為任意範圍，額外分組「是否在範圍內」供分類與狀況面向使用
+        has_price_filter = min_price is not None or max_price is not None
+        if has_price_filter:
+            in_range = []
+            if min_price is not None:
+                in_range.append(Product.price >= min_price)
+            if max_price is not None:
+                in_range.append(Product.price <= max_price)
+            columns.append(case((and_(*in_range), 1), else_=0).label('facet_in_price'))
+
+        query = db.session.query(*columns, func.count(Product.id))
+
         if status:
-            query = query.filter_by(status=status)
-        
-        # 按建立時間倒序排列
-        query = query.order_by(Product.created_at.desc())
-        
-        # 分頁
-        return query.paginate(page=page, per_page=per_page, error_out=False)
+            query = query.filter(Product.status == status)
+        if user_id:
+            query = query.filter(Product.user_id == user_id)
+        if search:
+            query, _ = ProductService._apply_search(query, search)
+
+        group_labels = [literal_column(c.name) for c in columns]
+        rows = query.group_by(*group_labels).all()
+
+        category_ids = set()
+        if category_id:
+            category_ids = (
+                category_registry.descendant_ids(category_id) if include_descendants else set()
+            ) or {category_id}
+
+        category_counts = {}
+        condition_counts = {}
+        bucket_counts = [0] * len(price_buckets)
+
+        for row in rows:
+            row_category, row_condition, row_bucket, row_edge = row[0], row[1], row[2], row[3]
+            count = row[-1]
+            category_ok = not category_id or row_category in category_ids
+            condition_ok = not condition or row_condition == condition
+            price_ok = not has_price_filter or bool(row[4])
+
+            if condition_ok and price_ok:
+                counted = (
+                    category_registry.ancestor_ids(row_category) if include_descendants else None
+                ) or [row_category]
+                for counted_id in counted:
+                    category_counts[counted_id] = category_counts.get(counted_id, 0) + count
+            if category_ok and price_ok:
+                condition_counts[row_condition] = condition_counts.get(row_condition, 0) + count
+            if category_ok and condition_ok:
+                if row_bucket is not None:
+                    bucket_counts[int(row_bucket)] += count
+                if row_edge is not None and row_edge != row_bucket:
+                    bucket_counts[int(row_edge)] += count
+
+        return {
+            'category': category_counts,
+            'condition': condition_counts,
+            'price': [
+                {'min': lo, 'max': hi, 'count': bucket_counts[idx]}
+                for idx, (lo, hi) in enumerate(price_buckets)
+            ]
+        }
+
+    @staticmethod
+    def _apply_search(query, search):
+        """套用搜尋條件
+
+        PostgreSQL 使用 search_vector（GIN 索引）與 ts_rank，
+        SQLite 使用 FTS5 與 bm25，其他資料庫或無法斷詞時退回 ILIKE。
+
+        Returns:
+            (query, rank_expr): rank_expr 為相關度運算式，數值越小越相關（不支援時為 None）
+        """
+        tokens = build_query_tokens(search)
+        dialect = db.session.get_bind().dialect.name
+
+        if tokens and dialect == 'postgresql':
+            ts_query = func.plainto_tsquery(literal_column("'simple'"), ' '.join(tokens))
+            query = query.filter(Product.search_vector.op('@@')(ts_query))
+            # ts_rank 回傳 float4；轉為 float8 讓游標中的 Python float 能精確比較，
+            # 否則與邊界同分的商品在下一頁會整批重複或遺漏
+            rank = -cast(func.ts_rank(Product.search_vector, ts_query), Float(53))
+            return query, ProductService._duplicate_penalty(rank)
+
+        if tokens and dialect == 'sqlite':
+            match = ' '.join(f'"{token}"' for token in tokens)
+            query = query.join(products_fts, products_fts.c.rowid == Product.id).filter(
+                literal_column('products_fts').op('MATCH')(match)
+            )
+            return query, ProductService._duplicate_penalty(literal_column('bm25(products_fts)'))
+
+        search_term = f'%{search}%'
+        query = query.filter(
+            or_(
+                Product.title.ilike(search_term),
+                Product.description.ilike(search_term)
+            )
+        )
+        return query, None
+
+    @staticmethod
+    def _duplicate_penalty(rank):
+        """標記為近似重複的商品相關度乘上 DUPLICATE_LISTING_RANK_FACTOR
+
+        兩種資料庫的相關度皆為負值（越小越相關），乘上小於 1 的係數後排在原商品之後。
+        """
+        factor = current_app.config.get('DUPLICATE_LISTING_RANK_FACTOR', 1)
+        if factor == 1:
+            return rank
+        return rank * case((Product.duplicate_of_id.isnot(None), factor), else_=1.0)
+
+    @staticmethod
+    def rebuild_search_index():
+        """重新計算所有商品的斷詞結果（既有資料回填用）
+
+        Returns:
+            int: 更新的商品數量
+        """
+        count = 0
+        products = Product.query.options(
+            undefer(Product.search_tokens)
+        ).yield_per(500)
+        for product in products:
+            product.search_tokens = build_search_document(product.title, product.description)
+            count += 1
+
+        db.session.commit()
+        return count
 
     @staticmethod
     def get_product_by_id(product_id, increment_view=False):
@@ -114,7 +599,15 @@ class ProductService:
         product = Product.query.get(product_id)
 
         if product and increment_view:
-            product.increment_view_count()
+            if view_counter.enabled:
+                # 寫入緩衝，顯示值加上尚未寫回的次數（不標記為已修改）
+                view_counter.increment(product.id)
+                set_committed_value(
+                    product, 'view_count',
+                    (product.view_count or 0) + view_counter.pending(product.id)
+                )
+            else:
+                product.increment_view_count()
 
         return product
 
@@ -139,14 +632,18 @@ class ProductService:
         """
         try:
             # 驗證分類是否存在
-            category = Category.query.get(category_id)
-            if not category:
+            if not category_registry.exists(category_id):
                 return False, '分類不存在'
 
             # 驗證價格
             if price < 0:
                 return False, '價格不能為負數'
 
+            # 檢查同一賣家是否已刊登近似的商品
+            signature, duplicate = DuplicateService.check_listing(seller_id, title, description or '')
+            if duplicate and current_app.config.get('DUPLICATE_LISTING_ACTION') == 'block':
+                return False, f'您已刊登過相似的商品（#{duplicate[0]}），請直接編輯原商品'
+
             # 建立商品
             product = Product(
                 user_id=seller_id,
@@ -157,30 +654,43 @@ class ProductService:
                 condition=condition,
                 location=location.strip() if location else None,
                 transaction_method=transaction_method.strip() if transaction_method else None,
-                status='active'
+                status='active',
+                trending_score=TrendingService.initial_score(datetime.utcnow())
             )
 
             db.session.add(product)
             db.session.flush()  # 取得 product.id
 
-            # 上傳圖片
+            DuplicateService.register(product, signature)
+            if duplicate:
+                product.duplicate_of_id = duplicate[0]
+
+            # 儲存原始圖片（縮放與編碼於提交後交給背景的圖片處理流程）
+            product_images = []
             if images:
                 for idx, image_file in enumerate(images[:5]):  # 最多 5 張
                     if image_file and image_file.filename:
-                        success, result = FileUploadService.upload_product_image(image_file)
-                        if success:
-                            product_image = ProductImage(
-                                product_id=product.id,
-                                image_url=result,
-                                is_primary=(idx == 0),
-                                sort_order=idx
-                            )
-                            db.session.add(product_image)
-                        else:
+                        success, result = FileUploadService.store_raw_product_image(image_file)
+                        if not success:
                             db.session.rollback()
+                            for product_image in product_images:
+                                FileUploadService.delete_file(product_image.source_url)
                             return False, result
 
+                        product_image = ProductImage(
+                            product_id=product.id,
+                            image_url=result,
+                            source_url=result,
+                            status=ProductImage.STATUS_PROCESSING,
+                            is_primary=(idx == 0),
+                            sort_order=idx
+                        )
+                        db.session.add(product_image)
+                        product_images.append(product_image)
+
             db.session.commit()
+            ProductService.queue_image_processing(product_images)
+            ProductService.product_created(product)
             return True, product
 
         except Exception as e:
@@ -225,8 +735,7 @@ class ProductService:
                     return False, '價格不能為負數'
                 product.price = price
             if category_id is not None:
-                category = Category.query.get(category_id)
-                if not category:
+                if not category_registry.exists(category_id):
                     return False, '分類不存在'
                 product.category_id = category_id
             if condition is not None:
@@ -236,7 +745,21 @@ class ProductService:
             if transaction_method is not None:
                 product.transaction_method = transaction_method.strip()
 
+            # 標題或描述變更時重新檢查近似重複並更新簽章
+            if title is not None or description is not None:
+                signature, duplicate = DuplicateService.check_listing(
+                    seller_id, product.title, product.description, exclude_product_id=product.id
+                )
+                action = current_app.config.get('DUPLICATE_LISTING_ACTION')
+                if duplicate and action == 'block':
+                    db.session.rollback()
+                    return False, f'您已刊登過相似的商品（#{duplicate[0]}），請直接編輯原商品'
+                if action:
+                    product.duplicate_of_id = duplicate[0] if duplicate else None
+                DuplicateService.register(product, signature)
+
             db.session.commit()
+            ProductService.product_changed(product)
             return True, product
 
         except Exception as e:
@@ -271,11 +794,16 @@ class ProductService:
             # 軟刪除（改為 inactive）
             product.status = 'inactive'
 
-            # 刪除圖片檔案
+            # 刪除圖片檔案與記錄（釋放內容定址檔案的參考，避免之後重複釋放）
             for image in product.images:
-                FileUploadService.delete_file(image.image_url)
+                for url in image.file_urls():
+                    FileUploadService.delete_file(url)
+                db.session.delete(image)
+            product.primary_image_url = None
+            product.primary_image_renditions = None
 
             db.session.commit()
+            ProductService.product_changed(product)
             return True, '商品已下架'
 
         except Exception as e:
@@ -308,8 +836,8 @@ class ProductService:
             if product.images.count() >= 5:
                 return False, '商品圖片最多 5 張'
 
-            # 上傳圖片
-            success, result = FileUploadService.upload_product_image(image_file)
+            # 儲存原始圖片（提交後交給背景的圖片處理流程）
+            success, result = FileUploadService.store_raw_product_image(image_file)
             if not success:
                 return False, result
 
@@ -320,12 +848,15 @@ class ProductService:
             product_image = ProductImage(
                 product_id=product_id,
                 image_url=result,
+                source_url=result,
+                status=ProductImage.STATUS_PROCESSING,
                 is_primary=is_first_image,
                 sort_order=sort_order
             )
 
             db.session.add(product_image)
             db.session.commit()
+            ProductService.queue_image_processing([product_image])
 
             return True, product_image
 
@@ -354,8 +885,9 @@ class ProductService:
             if product_image.product.user_id != seller_id:
                 return False, '您沒有權限刪除此圖片'
 
-            # 刪除檔案
-            FileUploadService.delete_file(product_image.image_url)
+            # 刪除檔案（各尺寸版本與處理中的原始檔）
+            for url in product_image.file_urls():
+                FileUploadService.delete_file(url)
 
             # 刪除資料庫記錄
             db.session.delete(product_image)
@@ -369,6 +901,10 @@ class ProductService:
                 if next_image:
                     next_image.is_primary = True
 
+                ready = next_image is not None and next_image.is_ready
+                product_image.product.primary_image_url = next_image.image_url if ready else None
+                product_image.product.primary_image_renditions = next_image.renditions if ready else None
+
             db.session.commit()
             return True, '圖片已刪除'
 
@@ -377,23 +913,204 @@ class ProductService:
             return False, f'刪除圖片失敗：{str(e)}'
 
     @staticmethod
-    def get_user_products(user_id, status=None, page=1, per_page=12):
+    def queue_image_processing(product_images):
+        """將已提交的處理中圖片送入背景的圖片處理流程（處理中的 image_url 即原始檔）"""
+        widths = current_app.config.get('PRODUCT_IMAGE_WIDTHS', (160, 400, 800))
+        for product_image in product_images:
+            image_pipeline.submit(
+                product_image.id,
+                FileUploadService.url_to_path(product_image.source_url),
+                FileUploadService.make_processing_dir(),
+                widths
+            )
+
+    @staticmethod
+    def requeue_pending_images():
+        """重新送出處理中的圖片（例如 worker 重啟後遺失的工作）
+
+        Returns:
+            int: 重新送出的圖片數
+        """
+        product_images = ProductImage.query.filter_by(
+            status=ProductImage.STATUS_PROCESSING
+        ).order_by(ProductImage.id).all()
+        ProductService.queue_image_processing(product_images)
+        return len(product_images)
+
+    @staticmethod
+    def migrate_image_storage(batch_size=200):
+        """將舊的平面目錄圖片（時間戳記檔名）搬到內容定址儲存並建立參考計數
+
+        依 ProductImage.id 分批處理，每批提交一次，可重複執行（已搬移的檔案會略過）。
+        內容相同的舊檔案只保留一份。
+
+        Returns:
+            dict: {'images': 更新的圖片數, 'moved': 搬移的檔案數, 'missing': 找不到的檔案數,
+                   'stored': 內容定址儲存的檔案總數}
+        """
+        stats = {'images': 0, 'moved': 0, 'missing': 0}
+        moved = {}  # 舊 URL -> 新 URL（同一個舊檔案被多張圖片引用時）
+        last_id = 0
+
+        def migrate(url):
+            if not url or FileUploadService.is_content_addressed(url):
+                return url
+            if url in moved:
+                FileUploadService._add_file_ref(moved[url], None)
+                return moved[url]
+
+            path = FileUploadService.url_to_path(url)
+            if not os.path.exists(path):
+                stats['missing'] += 1
+                return url
+
+            ext = os.path.splitext(path)[1][1:].lower() or 'jpg'
+            moved[url] = FileUploadService.store_file(path, ext)
+            stats['moved'] += 1
+            return moved[url]
+
+        while True:
+            images = ProductImage.query.filter(
+                ProductImage.id > last_id,
+                ProductImage.status == ProductImage.STATUS_READY
+            ).order_by(ProductImage.id).limit(batch_size).all()
+            if not images:
+                break
+
+            for image in images:
+                renditions = [
+                    {key: (value if key == 'width' else migrate(value)) for key, value in rendition.items()}
+                    for rendition in image.renditions or []
+                ]
+                # 最大尺寸的 JPEG 即 image_url，已在 renditions 中處理過
+                image_url = renditions[-1]['jpeg'] if renditions else migrate(image.image_url)
+                if image_url == image.image_url and renditions == (image.renditions or []):
+                    continue
+
+                image.image_url = image_url
+                image.renditions = renditions or None
+                if image.is_primary:
+                    image.product.primary_image_url = image_url
+                    image.product.primary_image_renditions = image.renditions
+                stats['images'] += 1
+
+            last_id = images[-1].id
+            db.session.commit()
+
+        ProductService.invalidate_listing_cache()
+        stats['stored'] = StoredFile.query.count()
+        return stats
+
+    @staticmethod
+    def image_processed(image_id, error=None, output_dir=None, renditions=None):
+        """背景圖片處理完成後依內容儲存各尺寸檔案並更新狀態；主圖完成時才設定商品的 primary_image_url
+
+        Args:
+            image_id: ProductImage ID
+            error: 失敗原因（None 表示成功）
+            output_dir: 處理結果的暫存目錄
+            renditions: process_product_image 的回傳值（各尺寸的檔名）
+        """
+        try:
+            # 鎖定圖片列：重複送出的工作（如 process-pending-images 與原本的工作同時完成）
+            # 依序執行，後完成的一方看到的是已更新的狀態
+            product_image = db.session.get(
+                ProductImage, image_id, with_for_update=True, populate_existing=True
+            )
+            if product_image is None:
+                # 處理期間圖片已被刪除，捨棄處理結果
+                return
+            if product_image.status != ProductImage.STATUS_PROCESSING:
+                # 其他工作已完成這張圖片，捨棄重複的處理結果，
+                # 避免重複儲存檔案與參考計數，或把已完成的圖片標記為失敗
+                db.session.rollback()
+                return
+
+            if error:
+                current_app.logger.error(f'圖片處理失敗（#{image_id}）：{error}')
+                product_image.status = ProductImage.STATUS_FAILED
+            else:
+                image_url, product_image.renditions = FileUploadService.store_renditions(
+                    output_dir, renditions or []
+                )
+                product_image.image_url = image_url
+                product_image.status = ProductImage.STATUS_READY
+                if product_image.source_url:
+                    FileUploadService.delete_file(product_image.source_url)
+                product_image.source_url = None
+
+                product = product_image.product
+                if product_image.is_primary:
+                    product.primary_image_url = product_image.image_url
+                    product.primary_image_renditions = product_image.renditions
+
+            db.session.commit()
+            ProductService.product_changed(product_image.product)
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+        finally:
+            if output_dir:
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+    @staticmethod
+    def get_image_status(product_id):
+        """取得商品圖片的處理進度
+
+        Returns:
+            dict 或 None（商品不存在）
+        """
+        product = db.session.get(Product, product_id)
+        if product is None:
+            return None
+
+        images = product.images.order_by(ProductImage.sort_order, ProductImage.id).all()
+        ready = sum(1 for image in images if image.is_ready)
+        failed = sum(1 for image in images if image.status == ProductImage.STATUS_FAILED)
+        return {
+            'total': len(images),
+            'ready': ready,
+            'failed': failed,
+            'done': ready + failed == len(images),
+            'images': [
+                {'id': image.id, 'status': image.status, 'url': image.display_url}
+                for image in images
+            ]
+        }
+
+    @staticmethod
+    def get_user_products(user_id, status=None, page=1, per_page=12,
+                          keyset=False, cursor=None, total_mode=None, total=None):
         """取得使用者的商品列表
 
         Args:
             user_id: 使用者 ID
-            status: 商品狀態（None 表示全部）
+            status: 商品狀態（None 表示全部；可傳入列表篩選多種狀態）
             page: 頁數
             per_page: 每頁數量
+            keyset: 是否使用游標分頁
+            cursor: 游標分頁的游標字串（None 表示第一頁）
+            total_mode: 游標分頁的總數模式（None, 'estimate', 'exact'）
+            total: 游標分頁的已知總數（例如 user_counters 的 active_listings）
 
         Returns:
-            Pagination 物件
+            Pagination 物件（keyset=True 時為 KeysetPagination 物件）
         """
-        query = Product.query.filter_by(user_id=user_id)
+        query = Product.query.options(joinedload(Product.seller)).filter_by(user_id=user_id)
 
-        if status:
+        if isinstance(status, (list, tuple)):
+            query = query.filter(Product.status.in_(status))
+        elif status:
             query = query.filter_by(status=status)
 
+        if keyset:
+            return KeysetPagination(
+                query, Product.created_at, Product.id, 'created_at',
+                per_page=per_page, cursor=cursor, total_mode=total_mode, total=total
+            )
+
         query = query.order_by(Product.created_at.desc())
 
         return query.paginate(page=page, per_page=per_page, error_out=False)
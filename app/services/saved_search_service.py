@@ -0,0 +1,250 @@
+from datetime import datetime
+from flask import current_app
+from app.extensions import db
+from app.models.saved_search import SavedSearch
+from app.services.category_service import category_registry
+from app.utils.search import build_query_tokens, tokenize
+
+# 單次 IN 查詢的詞元上限（SQLite 參數數量有限制）
+MATCH_TERMS_CHUNK = 500
+
+# 價格區段：區段編號為整數價格的位元長度（0、1、2–3、4–7、…），共 2^PRICE_BAND_LEVELS 段；
+# 以二元樹組織，第 level 層的節點 k 涵蓋區段 [k·2^level, (k+1)·2^level)
+PRICE_BAND_LEVELS = 5
+
+
+class SavedSearchService:
+    """儲存搜尋服務類別
+
+    每個儲存搜尋只以一個索引鍵（index_term）登記在反向索引中：
+    有關鍵字時取最具辨識度的詞元，否則為 'category:<id>'；
+    只有價格與狀況條件時為涵蓋價格範圍的最小價格區段 'price:<level>:<k>'，
+    價格範圍過寬時改用 'condition:<狀況>'。
+    新商品刊登時以商品的詞元、分類祖先、狀況與所屬的各層價格區段組成查詢鍵，
+    WHERE index_term IN (...) 只取回可能符合的候選，再於記憶體中驗證完整條件，
+    因此成本與候選數量成正比，而不是與儲存搜尋的總數成正比。
+    """
+
+    @staticmethod
+    def price_band(price):
+        """價格所屬的區段編號（整數價格的位元長度）"""
+        return min(int(max(price, 0)).bit_length(), 2 ** PRICE_BAND_LEVELS - 1)
+
+    @staticmethod
+    def price_terms(price):
+        """商品價格所屬的各層價格區段索引鍵"""
+        band = SavedSearchService.price_band(price)
+        return {f'price:{level}:{band >> level}' for level in range(PRICE_BAND_LEVELS + 1)}
+
+    @staticmethod
+    def build_index_term(keyword, category_id, condition=None, min_price=None, max_price=None):
+        """決定儲存搜尋的反向索引鍵"""
+        tokens = build_query_tokens(keyword or '')
+        if tokens:
+            # 較長的詞元（英文單字、中文二元組）較少見，候選集合較小
+            return max(tokens, key=lambda token: (len(token), token))[:100]
+        if category_id:
+            return f'category:{category_id}'
+
+        # 涵蓋 [min_price, max_price] 的最小區段節點（沒有價格條件時為根節點）
+        low = SavedSearchService.price_band(min_price or 0)
+        high = SavedSearchService.price_band(max_price) if max_price is not None \
+            else 2 ** PRICE_BAND_LEVELS - 1
+        level = (low ^ high).bit_length()
+        # 價格範圍幾乎不限時，狀況的候選集合較小
+        if condition and level == PRICE_BAND_LEVELS:
+            return f'condition:{condition}'
+        return f'price:{level}:{low >> level}'
+
+    @staticmethod
+    def create_saved_search(user_id, keyword=None, category_id=None, condition=None,
+                            min_price=None, max_price=None):
+        """儲存搜尋條件
+
+        Args:
+            user_id: 使用者 ID
+            keyword: 搜尋關鍵字
+            category_id: 分類 ID（包含子分類）
+            condition: 商品狀況
+            min_price: 最低價格
+            max_price: 最高價格
+
+        Returns:
+            (success: bool, saved_search: SavedSearch or error_message: str)
+        """
+        try:
+            keyword = (keyword or '').strip()[:200] or None
+            condition = condition or None
+
+            if not any([keyword, category_id, condition, min_price is not None, max_price is not None]):
+                return False, '請至少設定一個搜尋條件'
+
+            if category_id and not category_registry.exists(category_id):
+                return False, '分類不存在'
+
+            if (min_price is not None and min_price < 0) or (max_price is not None and max_price < 0):
+                return False, '價格不能為負數'
+            if min_price is not None and max_price is not None and min_price > max_price:
+                return False, '最低價格不能高於最高價格'
+
+            limit = current_app.config.get('SAVED_SEARCH_LIMIT', 20)
+            if SavedSearch.query.filter_by(user_id=user_id).count() >= limit:
+                return False, f'最多只能儲存 {limit} 個搜尋'
+
+            duplicate = SavedSearch.query.filter_by(
+                user_id=user_id, keyword=keyword, category_id=category_id or None,
+                condition=condition, min_price=min_price, max_price=max_price
+            ).first()
+            if duplicate:
+                return False, '已經儲存過相同的搜尋'
+
+            saved_search = SavedSearch(
+                user_id=user_id,
+                keyword=keyword,
+                category_id=category_id or None,
+                condition=condition,
+                min_price=min_price,
+                max_price=max_price,
+                index_term=SavedSearchService.build_index_term(
+                    keyword, category_id, condition, min_price, max_price
+                )
+            )
+            db.session.add(saved_search)
+            db.session.commit()
+            return True, saved_search
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f'儲存搜尋失敗：{str(e)}'
+
+    @staticmethod
+    def delete_saved_search(saved_search_id, user_id):
+        """刪除儲存搜尋
+
+        Returns:
+            (success: bool, message: str)
+        """
+        try:
+            saved_search = db.session.get(SavedSearch, saved_search_id)
+
+            if not saved_search:
+                return False, '儲存搜尋不存在'
+
+            if saved_search.user_id != user_id:
+                return False, '您沒有權限刪除此搜尋'
+
+            db.session.delete(saved_search)
+            db.session.commit()
+            return True, '已刪除儲存搜尋'
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f'刪除失敗：{str(e)}'
+
+    @staticmethod
+    def get_user_saved_searches(user_id):
+        """取得使用者的儲存搜尋（新到舊）"""
+        return SavedSearch.query.filter_by(user_id=user_id).order_by(
+            SavedSearch.created_at.desc(), SavedSearch.id.desc()
+        ).all()
+
+    @staticmethod
+    def find_matches(product):
+        """找出符合新商品的儲存搜尋（排除賣家自己的）
+
+        Returns:
+            list: SavedSearch 列表
+        """
+        doc_tokens = set(tokenize(product.title, include_unigrams=True))
+        doc_tokens.update(tokenize(product.description, include_unigrams=True))
+        ancestors = set(category_registry.ancestor_ids(product.category_id) or [product.category_id])
+
+        terms = sorted(
+            doc_tokens
+            | {f'category:{cid}' for cid in ancestors}
+            | {f'condition:{product.condition}'}
+            | SavedSearchService.price_terms(product.price)
+        )
+        candidates = []
+        for start in range(0, len(terms), MATCH_TERMS_CHUNK):
+            candidates.extend(SavedSearch.query.filter(
+                SavedSearch.index_term.in_(terms[start:start + MATCH_TERMS_CHUNK]),
+                SavedSearch.user_id != product.user_id
+            ).all())
+
+        return [
+            saved_search for saved_search in candidates
+            if SavedSearchService._matches(saved_search, product, doc_tokens, ancestors)
+        ]
+
+    @staticmethod
+    def rebuild_index_terms(batch_size=500):
+        """重新計算所有儲存搜尋的索引鍵（索引鍵的規則變更後執行）
+
+        Returns:
+            int: 更新的儲存搜尋數
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            saved_searches = SavedSearch.query.filter(
+                SavedSearch.id > last_id
+            ).order_by(SavedSearch.id).limit(batch_size).all()
+            if not saved_searches:
+                break
+
+            for saved_search in saved_searches:
+                index_term = SavedSearchService.build_index_term(
+                    saved_search.keyword, saved_search.category_id, saved_search.condition,
+                    saved_search.min_price, saved_search.max_price
+                )
+                if index_term != saved_search.index_term:
+                    saved_search.index_term = index_term
+                    updated += 1
+
+            last_id = saved_searches[-1].id
+            db.session.commit()
+        return updated
+
+    @staticmethod
+    def _matches(saved_search, product, doc_tokens, ancestors):
+        """驗證商品是否符合儲存搜尋的所有條件"""
+        if saved_search.keyword:
+            tokens = build_query_tokens(saved_search.keyword)
+            if not tokens or not all(token in doc_tokens for token in tokens):
+                return False
+        if saved_search.category_id and saved_search.category_id not in ancestors:
+            return False
+        if saved_search.condition and saved_search.condition != product.condition:
+            return False
+        if saved_search.min_price is not None and product.price < saved_search.min_price:
+            return False
+        if saved_search.max_price is not None and product.price > saved_search.max_price:
+            return False
+        return True
+
+    @staticmethod
+    def notify_matches(product):
+        """通知儲存搜尋符合新商品的使用者（每位使用者一則通知）
+
+        Returns:
+            int: 通知的使用者數
+        """
+        from app.services.notification_service import NotificationService
+
+        matches = SavedSearchService.find_matches(product)
+        if not matches:
+            return 0
+
+        now = datetime.utcnow()
+        for saved_search in matches:
+            saved_search.last_notified_at = now
+
+        user_ids = sorted({saved_search.user_id for saved_search in matches})
+        success, result = NotificationService.create_notifications(
+            user_ids,
+            type='saved_search',
+            content=f'有符合您儲存搜尋的新商品：{product.title}',
+            link=f'/products/{product.id}'
+        )
+        return len(user_ids) if success else 0
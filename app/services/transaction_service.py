@@ -2,6 +2,8 @@ from app.extensions import db, socketio
 from app.models.transaction import Transaction
 from app.models.product import Product
 from app.models.notification import Notification
+from app.services.counter_service import CounterService
+from app.services.product_service import ProductService
 from datetime import datetime
 
 class TransactionService:
@@ -123,6 +125,9 @@ class TransactionService:
 
             db.session.commit()
 
+            # 商品狀態已變更：同步列表快取、相似商品與自動完成索引
+            ProductService.product_changed(transaction.product)
+
             # 建立通知給買家
             TransactionService._create_notification(
                 user_id=transaction.buyer_id,
@@ -181,6 +186,8 @@ class TransactionService:
 
             db.session.commit()
 
+            ProductService.product_changed(transaction.product)
+
             # 建立通知給買家
             TransactionService._create_notification(
                 user_id=transaction.buyer_id,
@@ -230,6 +237,8 @@ class TransactionService:
 
             db.session.commit()
 
+            ProductService.product_changed(transaction.product)
+
             # 建立通知給對方
             other_user_id = transaction.seller_id if user_id == transaction.buyer_id else transaction.buyer_id
             TransactionService._create_notification(
@@ -282,6 +291,8 @@ class TransactionService:
 
             db.session.commit()
 
+            ProductService.product_changed(transaction.product)
+
             # 建立通知給對方
             other_user_id = transaction.seller_id if user_id == transaction.buyer_id else transaction.buyer_id
             TransactionService._create_notification(
@@ -481,6 +492,8 @@ class TransactionService:
 
             db.session.commit()
 
+            ProductService.product_changed(transaction.product)
+
             # 通知雙方
             TransactionService._create_notification(
                 user_id=transaction.buyer_id,
@@ -525,10 +538,7 @@ class TransactionService:
     @staticmethod
     def _emit_pending_transactions(user_id, buyer_id=None, product_title=None, transaction_id=None):
         try:
-            pending_count = Transaction.query.filter_by(
-                seller_id=user_id,
-                status=Transaction.STATUS_PENDING
-            ).count()
+            pending_count = CounterService.get(user_id, 'pending_transactions')
             socketio.emit(
                 'update_pending_transactions',
                 {'count': pending_count},
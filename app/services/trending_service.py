@@ -0,0 +1,167 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, func, or_, update
+from app.extensions import db
+from app.models.message import Message
+from app.models.product import Product
+from app.models.transaction import Transaction
+
+# 分數的時間基準點（只影響分數的絕對值，不影響排序）
+TRENDING_EPOCH = datetime(2025, 1, 1)
+
+
+def _logaddexp(a, b):
+    """ln(e^a + e^b)（避免直接計算指數造成溢位）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+class TrendingService:
+    """熱門度服務類別
+
+    熱門度 = Σ 權重 × e^(−λ·經過時間)，λ = ln2 / 半衰期。
+    同乘 e^(λ·(now − epoch)) 後等於 Σ 權重 × e^(λ·(事件時間 − epoch))，
+    與目前時間無關，因此既有分數不必隨時間重新衰減，只需把新事件累加上去；
+    為避免數值溢位，products.trending_score 儲存的是此值的自然對數。
+    排序時直接以 (status, trending_score, id) 索引掃描。
+    """
+
+    @staticmethod
+    def event_score(weight, occurred_at, half_life_hours):
+        """單一事件的對數分數：ln(權重) + λ·(事件時間 − epoch)"""
+        hours = (occurred_at - TRENDING_EPOCH).total_seconds() / 3600
+        return math.log(weight) + hours * math.log(2) / half_life_hours
+
+    @staticmethod
+    def initial_score(created_at):
+        """新商品刊登時的分數（只計入刊登事件，排程第一次計分時會重新計算）
+
+        讓新商品在排程執行前就依刊登時間排入熱門排序，而不是停留在預設值 0
+        """
+        config = current_app.config
+        weight = config.get('TRENDING_WEIGHTS', {}).get('listing', 1)
+        if weight <= 0:
+            return 0
+        return TrendingService.event_score(weight, created_at, config.get('TRENDING_HALF_LIFE_HOURS', 24))
+
+    @staticmethod
+    def update_trending_scores(now=None, batch_size=1000):
+        """將上次執行後的新事件累加到熱門度分數（供排程定期執行）
+
+        事件來源：
+        - 瀏覽：view_count 與上次計入的 trending_view_count 之差（視為發生於本次執行時間）
+        - 私訊：上次執行後建立、關於該商品的訊息
+        - 交易：上次執行後建立的交易請求
+        - 刊登：商品第一次計分時，以建立時間計入一次（讓沒有互動的新商品依新舊排序）
+
+        Returns:
+            int: 更新的商品數
+        """
+        config = current_app.config
+        half_life = config.get('TRENDING_HALF_LIFE_HOURS', 24)
+        weights = config.get('TRENDING_WEIGHTS', {})
+        now = now or datetime.utcnow()
+
+        # 上次執行時間（第一次執行時回溯 TRENDING_BACKFILL_DAYS 天）
+        since = db.session.query(func.max(Product.trending_updated_at)).scalar()
+        if since is None:
+            since = now - timedelta(days=config.get('TRENDING_BACKFILL_DAYS', 30))
+
+        contributions = defaultdict(list)
+
+        def add(product_id, kind, occurred_at, count=1):
+            weight = weights.get(kind, 1) * count
+            if weight > 0:
+                contributions[product_id].append(
+                    TrendingService.event_score(weight, occurred_at, half_life)
+                )
+
+        # 私訊與交易請求（依 created_at 索引讀取時間範圍內的新事件）
+        for model, kind in ((Message, 'message'), (Transaction, 'transaction')):
+            rows = db.session.query(model.product_id, model.created_at).filter(
+                model.product_id.isnot(None),
+                model.created_at > since,
+                model.created_at <= now
+            )
+            for product_id, created_at in rows:
+                add(product_id, kind, created_at)
+
+        # 瀏覽次數增量與尚未計分的商品
+        rows = db.session.query(
+            Product.id, Product.view_count, Product.trending_view_count,
+            Product.trending_updated_at, Product.created_at
+        ).filter(
+            Product.status == 'active',
+            or_(
+                Product.view_count != Product.trending_view_count,
+                Product.trending_updated_at.is_(None)
+            )
+        )
+        view_counts = {}
+        for product_id, view_count, counted, updated_at, created_at in rows:
+            view_count = view_count or 0
+            view_counts[product_id] = view_count
+            if updated_at is None:
+                created_at = created_at or now
+                add(product_id, 'listing', created_at)
+                add(product_id, 'view', created_at, view_count)
+            else:
+                add(product_id, 'view', now, view_count - (counted or 0))
+
+        if not contributions and not view_counts:
+            return 0
+
+        # 與既有分數合併（ln(e^old + Σ e^new)），分批寫回
+        product_ids = sorted(set(contributions) | set(view_counts))
+        updated = 0
+        for start in range(0, len(product_ids), batch_size):
+            chunk = product_ids[start:start + batch_size]
+            current = {
+                product_id: (score, updated_at is not None)
+                for product_id, score, updated_at in db.session.query(
+                    Product.id, Product.trending_score, Product.trending_updated_at
+                ).filter(Product.id.in_(chunk))
+            }
+
+            params = []
+            for product_id in chunk:
+                if product_id not in current:
+                    continue
+                # 尚未計分的商品從頭累加（忽略預設值 0）
+                score, initialized = current[product_id]
+                score = score if initialized else None
+                for value in contributions.get(product_id, ()):
+                    score = _logaddexp(score, value)
+                params.append({
+                    'product_id': product_id,
+                    'score': score if score is not None else 0,
+                    'counted': view_counts.get(product_id)
+                })
+            if not params:
+                continue
+
+            db.session.execute(
+                update(Product.__table__)
+                .where(Product.__table__.c.id == bindparam('product_id'))
+                .values(
+                    trending_score=bindparam('score'),
+                    trending_view_count=func.coalesce(
+                        bindparam('counted', type_=db.Integer),
+                        Product.__table__.c.trending_view_count
+                    ),
+                    trending_updated_at=now,
+                    # 熱門度不屬於商品內容，不更新 updated_at（避免商品卡片片段快取失效）
+                    updated_at=Product.__table__.c.updated_at
+                ),
+                params
+            )
+            updated += len(params)
+
+        db.session.commit()
+        return updated
@@ -0,0 +1,88 @@
+import threading
+import time
+
+
+class BackgroundIndex:
+    """常駐記憶體索引的共用基底：於背景建立，並在超過 max_age 秒後重新建立
+
+    每個程序各自持有一份索引，本程序的變更以 upsert / remove 增量同步，
+    其他 worker 的新增與狀態變更則由定期重建反映；重建期間繼續使用舊的索引。
+    重建讀取的資料可能早於重建期間的變更，因此這段期間的 upsert / remove 會先記錄下來，
+    換上新的資料後依序重新套用。
+    子類別實作 _load(rows)，在持有 _lock 時換上新的資料；
+    upsert / remove 在持有 _lock 時先呼叫 _record() 記錄變更。
+    """
+
+    thread_name = 'index-build'
+
+    def __init__(self, max_age=None):
+        """
+        Args:
+            max_age: 索引建立後多少秒重新建立（None 表示不重建）
+        """
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self.ready = False
+        self.built_at = None
+        self._building = False
+        self._pending = None  # 重建期間的變更：[(方法, 參數), ...]
+
+    def _load(self, rows):
+        raise NotImplementedError
+
+    def _record(self, method, *args):
+        """重建期間記錄變更，於新的資料載入後重新套用（需持有 _lock）"""
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def build(self, rows):
+        """重新建立整個索引"""
+        started = time.monotonic()
+        with self._lock:
+            self._pending = []
+        try:
+            self._load(rows)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self.ready = True
+            self.built_at = started
+            for method, args in pending:
+                method(*args)
+
+    @property
+    def stale(self):
+        """索引是否已超過 max_age 需要重建"""
+        return (
+            self.max_age is not None and self.built_at is not None
+            and time.monotonic() - self.built_at >= self.max_age
+        )
+
+    def ensure_built(self, app, load_rows, background=True):
+        """索引尚未建立或已過期時開始建立（預設於背景執行緒）
+
+        Args:
+            app: Flask app（背景執行緒需要 app context）
+            load_rows: 回傳 build() 所需資料列的函數
+            background: 是否在背景執行緒建立
+        """
+        with self._lock:
+            if (self.ready and not self.stale) or self._building:
+                return
+            self._building = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.build(load_rows())
+            finally:
+                self._building = False
+
+        if background:
+            threading.Thread(target=run, name=self.thread_name, daemon=True).start()
+        else:
+            run()
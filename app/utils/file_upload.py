@@ -1,27 +1,362 @@
+import hashlib
 import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
 from PIL import Image
 from flask import current_app
 from werkzeug.utils import secure_filename
 from app.utils.helpers import allowed_file, generate_filename
 
+# 商品圖片的內容定址儲存位置：/static/uploads/products/ab/cd/abcd...（SHA-256）.jpg
+PRODUCT_STORAGE_URL = '/static/uploads/products'
+CONTENT_URL_RE = re.compile(r'^/static/uploads/products/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z]+$')
+# 使用者頭像（上傳時已裁切縮放並重新編碼）
+AVATAR_URL_RE = re.compile(r'^/static/uploads/avatars/[^/]+$')
+
+# 商品圖片的輸出格式：(格式名稱, 副檔名, Pillow 儲存參數)
+RENDITION_FORMATS = (
+    ('jpeg', 'jpg', {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True}),
+    ('webp', 'webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+)
+
+
+def open_bounded_image(source, target_size, max_pixels=None, memory_budget=None):
+    """開啟圖片並限制解碼所需的記憶體（尚未解碼像素資料）
+
+    1. 只讀取檔頭取得尺寸，像素數超過 max_pixels 即拒絕（解壓縮炸彈）
+    2. JPEG 以 draft 在解碼時直接縮小（1/2、1/4、1/8，不小於 target_size）
+    3. 估計解碼後的記憶體用量，超過 memory_budget 即拒絕（PNG 等格式無法在解碼時縮小）
+
+    Args:
+        source: 檔案路徑、檔案物件或已開啟的 Image
+        target_size: 需要的最大長邊像素
+        max_pixels: 像素數上限（None 表示不限制）
+        memory_budget: 解碼記憶體上限（位元組，None 表示不限制）
+
+    Returns:
+        Image（延遲解碼，第一次存取像素時才讀取資料）
+
+    Raises:
+        ValueError: 圖片過大
+    """
+    try:
+        img = source if isinstance(source, Image.Image) else Image.open(source)
+    except Image.DecompressionBombError:
+        raise ValueError('圖片解析度過高')
+
+    width, height = img.size
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(f'圖片解析度過高（{width}×{height}，上限 {max_pixels // 1_000_000} 百萬像素）')
+
+    # 以原圖比例計算所需尺寸，draft 才能選到最大的縮小倍率
+    scale = min(1, target_size / max(width, height))
+    if img.format == 'JPEG':
+        img.draft(None, (max(1, round(width * scale)), max(1, round(height * scale))))
+
+    if memory_budget and estimate_decoded_size(img, (width, height)) > memory_budget:
+        raise ValueError(f'圖片解析度過高（{width}×{height}），請縮小後再上傳')
+
+    return img
+
+
+def estimate_decoded_size(img, source_size=None):
+    """估計解碼（含轉換為 RGB / RGBA）所需的位元組數
+
+    漸進式 JPEG 解碼時 libjpeg 需保留全解析度的 DCT 係數（每個取樣 2 位元組），
+    draft 無法縮小這部分，需以原圖尺寸 source_size 計算。
+    """
+    width, height = img.size
+    bands = len(img.getbands())
+    if img.mode in ('P', 'LA', 'RGBA', 'PA'):
+        bands += 4  # 去除透明背景時另需一份 RGBA 影像
+    size = width * height * bands
+
+    if img.format == 'JPEG' and img.info.get('progressive'):
+        source_width, source_height = source_size or img.size
+        layers = getattr(img, 'layer', None) or [(None, 1, 1, 0)] * bands
+        h_max = max(layer[1] for layer in layers)
+        v_max = max(layer[2] for layer in layers)
+        samples = sum(layer[1] * layer[2] for layer in layers) / (h_max * v_max)
+        size += int(source_width * source_height * samples * 2)
+    return size
+
+
+def process_product_image(source, output_dir, widths=(160, 400, 800),
+                          max_pixels=None, memory_budget=None):
+    """解碼商品圖片並輸出多種尺寸的 JPEG 與 WebP（responsive images 用）
+
+    輸出檔寫入暫存目錄 output_dir（<長邊>.jpg / <長邊>.webp），
+    再由 FileUploadService.store_renditions 依內容雜湊移入正式位置。
+    原圖比某個尺寸小時不放大，只輸出到原圖大小為止。
+    先縮小到最大的輸出尺寸再轉換色彩模式，全解析度的影像只在記憶體中存在一份。
+    不依賴 Flask 應用程式環境，可在圖片處理流程的子程序中執行。
+
+    Args:
+        source: 檔案路徑或檔案物件
+        output_dir: 輸出目錄
+        widths: 輸出尺寸（長邊像素）
+        max_pixels: 像素數上限（見 open_bounded_image）
+        memory_budget: 解碼記憶體上限（見 open_bounded_image）
+
+    Returns:
+        list: [{'width': 實際寬度, 'jpeg': 檔名, 'webp': 檔名}, ...]（由小到大）
+    """
+    sizes = sorted(set(widths), reverse=True)
+    img = open_bounded_image(source, sizes[0], max_pixels, memory_budget)
+
+    # 調色盤圖片無法以 LANCZOS 縮放，先轉為 RGBA
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    elif img.mode not in ('RGB', 'RGBA', 'LA', 'L'):
+        img = img.convert('RGB')
+
+    # 先縮小到最大的輸出尺寸，再轉換 RGBA 為 RGB（處理 PNG 透明背景）
+    img.thumbnail((sizes[0], sizes[0]), Image.Resampling.LANCZOS)
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    renditions = []
+    for size in sizes:
+        if renditions and max(img.size) <= size:
+            continue  # 原圖比此尺寸小，不放大
+
+        # 由上一個（較大的）尺寸繼續縮小，不必每次都從原圖縮放
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        rendition = {'width': img.width}
+        for name, ext, options in RENDITION_FORMATS:
+            output = f'{max(img.size)}.{ext}'
+            img.save(os.path.join(output_dir, output), **options)
+            rendition[name] = output
+        renditions.append(rendition)
+
+    renditions.reverse()
+    return renditions
+
+
+# 動態縮圖的輸出格式（依原圖副檔名；GIF 只取第一格並輸出為 PNG）
+RESIZE_FORMATS = {
+    'jpg': ('jpg', dict(RENDITION_FORMATS[0][2])),
+    'jpeg': ('jpg', dict(RENDITION_FORMATS[0][2])),
+    'webp': ('webp', dict(RENDITION_FORMATS[1][2])),
+    'png': ('png', {'format': 'PNG', 'optimize': True}),
+    'gif': ('png', {'format': 'PNG', 'optimize': True}),
+}
+
+
+def resize_image(source, output, width, height, max_pixels=None, memory_budget=None):
+    """將圖片縮小到 width × height 以內（保持比例，不放大）並輸出為 output
+
+    Args:
+        source: 原圖路徑
+        output: 輸出路徑（副檔名需為 RESIZE_FORMATS 的輸出格式）
+        width, height: 最大寬高
+        max_pixels, memory_budget: 解碼限制（見 open_bounded_image）
+    """
+    ext = source.rsplit('.', 1)[-1].lower()
+    options = RESIZE_FORMATS[ext][1]
+
+    img = open_bounded_image(source, max(width, height), max_pixels, memory_budget)
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    img.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+    has_alpha = 'A' in img.getbands()
+    if options['format'] == 'JPEG' and has_alpha:
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    elif img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if has_alpha and options['format'] != 'JPEG' else 'RGB')
+    img.save(output, **options)
+
+
+def image_limits(config):
+    """由應用程式設定取得圖片解碼限制（傳給 process_product_image）"""
+    return {
+        'max_pixels': config.get('IMAGE_MAX_PIXELS'),
+        'memory_budget': config.get('IMAGE_DECODE_MEMORY_BUDGET')
+    }
+
+
 class FileUploadService:
     """檔案上傳服務"""
 
     @staticmethod
-    def upload_product_image(file, max_size=(800, 800)):
-        """上傳商品圖片
+    def save_product_image(source, widths=None):
+        """縮放並儲存商品圖片（多種尺寸的 JPEG 與 WebP，內容定址儲存）
+
+        新增的檔案參考計數寫入 db.session，由呼叫端提交。
 
         Args:
-            file: FileStorage 物件
-            max_size: 圖片最大尺寸 (width, height)
+            source: 檔案路徑或檔案物件
+            widths: 輸出尺寸（預設為 PRODUCT_IMAGE_WIDTHS）
 
         Returns:
-            (success: bool, url: str or error_message: str)
+            (image_url: str, renditions: list)：image_url 為最大尺寸的 JPEG（失敗時拋出例外）
         """
-        if not file:
-            return False, '沒有選擇檔案'
+        output_dir = FileUploadService.make_processing_dir()
+        try:
+            renditions = process_product_image(
+                source,
+                output_dir,
+                widths or current_app.config.get('PRODUCT_IMAGE_WIDTHS', (160, 400, 800)),
+                **image_limits(current_app.config)
+            )
+            return FileUploadService.store_renditions(output_dir, renditions)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
 
-        if file.filename == '':
+    @staticmethod
+    def make_processing_dir():
+        """建立圖片處理的暫存目錄（與正式目錄在同一個檔案系統，才能直接搬移）"""
+        tmp_root = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', 'tmp')
+        os.makedirs(tmp_root, exist_ok=True)
+        return tempfile.mkdtemp(dir=tmp_root)
+
+    @staticmethod
+    def store_renditions(output_dir, renditions):
+        """將 process_product_image 的輸出依內容移入正式位置
+
+        Returns:
+            (image_url: str, renditions: list)：renditions 的檔名換成 URL
+        """
+        stored = {}
+        result = []
+        for rendition in renditions:
+            item = {'width': rendition['width']}
+            for key, name in rendition.items():
+                if key == 'width':
+                    continue
+                if name not in stored:
+                    stored[name] = FileUploadService.store_file(
+                        os.path.join(output_dir, name), os.path.splitext(name)[1][1:]
+                    )
+                item[key] = stored[name]
+            result.append(item)
+
+        # 同一張圖片的各個檔案只各計一次參考（內容相同的檔案會得到相同的 URL）
+        return result[-1]['jpeg'], result
+
+    @staticmethod
+    def content_url(digest, ext):
+        """內容定址的檔案 URL：以雜湊前 4 碼分成兩層目錄，避免單一目錄檔案過多"""
+        return f'{PRODUCT_STORAGE_URL}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}'
+
+    @staticmethod
+    def is_content_addressed(file_url):
+        """是否為內容定址儲存的檔案"""
+        return bool(file_url) and CONTENT_URL_RE.match(file_url) is not None
+
+    @staticmethod
+    def is_stored_image(file_url):
+        """是否為處理完成的圖片（商品圖片的各尺寸版本或頭像）
+
+        尚未處理的原始上傳（products/incoming，仍含 EXIF）與處理中的暫存檔不符合
+        """
+        return FileUploadService.is_content_addressed(file_url) or \
+            (bool(file_url) and AVATAR_URL_RE.match(file_url) is not None)
+
+    @staticmethod
+    def store_file(path, ext):
+        """以內容雜湊儲存檔案並增加參考計數（檔案已存在時只增加計數）
+
+        參考計數寫入 db.session，由呼叫端提交；path 會被搬移或刪除。
+
+        Returns:
+            str: 檔案 URL
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+        url = FileUploadService.content_url(digest.hexdigest(), ext)
+        size = os.path.getsize(path)
+
+        # 先取得計數列的鎖再放置檔案：與刪除最後一個參考的交易互斥
+        FileUploadService._add_file_ref(url, size)
+
+        target = FileUploadService.url_to_path(url)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        return url
+
+    @staticmethod
+    def _add_file_ref(url, size):
+        from app.extensions import db
+        from app.models.stored_file import StoredFile
+
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        stmt = insert(StoredFile).values(url=url, ref_count=1, size=size, created_at=datetime.utcnow())
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[StoredFile.url],
+            set_={'ref_count': StoredFile.ref_count + 1}
+        ))
+
+    @staticmethod
+    def _release_file_ref(file_url):
+        """減少參考計數，歸零時刪除計數列並於提交後刪除檔案
+
+        Returns:
+            bool 或 None：檔案是否已無參考；不是內容定址的檔案時回傳 None
+        """
+        from sqlalchemy import delete, update
+        from app.extensions import db
+        from app.models.stored_file import StoredFile
+
+        remaining = db.session.execute(
+            update(StoredFile)
+            .where(StoredFile.url == file_url)
+            .values(ref_count=StoredFile.ref_count - 1)
+            .returning(StoredFile.ref_count)
+        ).scalar()
+        if remaining is None:
+            return None
+
+        if remaining > 0:
+            return False
+
+        db.session.execute(delete(StoredFile).where(StoredFile.url == file_url))
+        db.session.info.setdefault('released_files', []).append(
+            (file_url, FileUploadService.url_to_path(file_url))
+        )
+        return True
+
+    @staticmethod
+    def delete_product_image(image_url, renditions=None):
+        """刪除商品圖片與其所有尺寸版本（每個檔案只釋放一次參考）"""
+        urls = {image_url}
+        for rendition in renditions or []:
+            urls.update(url for key, url in rendition.items() if key != 'width')
+        for url in sorted(urls):
+            FileUploadService.delete_file(url)
+
+    @staticmethod
+    def store_raw_product_image(file):
+        """先儲存未處理的原始商品圖片（縮放與編碼交由背景的圖片處理流程）
+
+        只讀取檔頭確認是可辨識的圖片並檢查解析度，不解碼整張圖。
+
+        Args:
+            file: FileStorage 物件
+
+        Returns:
+            (success: bool, source_url or error_message: str)
+        """
+        if not file or file.filename == '':
             return False, '沒有選擇檔案'
 
         # 檢查檔案類型
@@ -29,43 +364,50 @@ class FileUploadService:
             return False, '不支援的檔案格式（僅支援 PNG, JPG, JPEG, GIF, WEBP）'
 
         try:
-            # 產生唯一檔名
-            filename = generate_filename(file.filename)
+            # 不呼叫 close()：會連同上傳的檔案串流一併關閉
+            img = Image.open(file.stream)
+        except Image.DecompressionBombError:
+            return False, '圖片解析度過高'
+        except Exception:
+            return False, '無法辨識的圖片檔案'
 
-            # 建立上傳目錄路徑
-            upload_folder = os.path.join(
-                current_app.config['UPLOAD_FOLDER'],
-                'products'
+        try:
+            open_bounded_image(
+                img,
+                max(current_app.config.get('PRODUCT_IMAGE_WIDTHS', (160, 400, 800))),
+                **image_limits(current_app.config)
             )
-            os.makedirs(upload_folder, exist_ok=True)
-
-            # 完整檔案路徑
-            filepath = os.path.join(upload_folder, filename)
-
-            # 使用 Pillow 處理圖片
-            img = Image.open(file)
+        except ValueError as e:
+            return False, str(e)
 
-            # 轉換 RGBA 為 RGB（處理 PNG 透明背景）
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-
-            # 等比例縮放圖片
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            # 儲存圖片（JPEG 格式，品質 85）
-            img.save(filepath, 'JPEG', quality=85, optimize=True)
+        try:
+            file.stream.seek(0)
+            filename = generate_filename(file.filename)
+            incoming_folder = os.path.join(
+                current_app.config['UPLOAD_FOLDER'],
+                'products',
+                'incoming'
+            )
+            os.makedirs(incoming_folder, exist_ok=True)
+            file.save(os.path.join(incoming_folder, filename))
 
-            # 返回相對 URL
-            url = f'/static/uploads/products/{filename}'
-            return True, url
+            return True, f'/static/uploads/products/incoming/{filename}'
 
         except Exception as e:
             return False, f'上傳失敗：{str(e)}'
 
+    @staticmethod
+    def url_to_path(file_url):
+        """將 /static/ 開頭的檔案 URL 轉為檔案系統路徑"""
+        if file_url.startswith('/static/'):
+            file_url = file_url[8:]  # 移除 '/static/'
+
+        return os.path.join(
+            current_app.root_path,
+            'static',
+            file_url
+        )
+
     @staticmethod
     def upload_avatar(file, max_size=(200, 200)):
         """上傳使用者頭像
@@ -101,8 +443,8 @@ class FileUploadService:
             # 完整檔案路徑
             filepath = os.path.join(upload_folder, filename)
 
-            # 使用 Pillow 處理圖片
-            img = Image.open(file)
+            # 使用 Pillow 處理圖片（JPEG 於解碼時縮小到不小於頭像尺寸）
+            img = open_bounded_image(file, max(max_size), **image_limits(current_app.config))
 
             # 轉換 RGBA 為 RGB
             if img.mode in ('RGBA', 'LA', 'P'):
@@ -131,6 +473,8 @@ class FileUploadService:
             url = f'/static/uploads/avatars/{filename}'
             return True, url
 
+        except ValueError as e:
+            return False, str(e)
         except Exception as e:
             return False, f'上傳失敗：{str(e)}'
 
@@ -138,6 +482,9 @@ class FileUploadService:
     def delete_file(file_url):
         """刪除檔案
 
+        內容定址儲存的檔案只減少參考計數，最後一個參考移除且交易提交後才刪除實體檔案
+        （呼叫端需提交 db.session）。
+
         Args:
             file_url: 檔案 URL（例如：/static/uploads/products/xxx.jpg）
 
@@ -149,15 +496,13 @@ class FileUploadService:
             if 'placeholder' in file_url:
                 return True
 
-            # 從 URL 取得檔案路徑
-            if file_url.startswith('/static/'):
-                file_url = file_url[8:]  # 移除 '/static/'
+            if FileUploadService.is_content_addressed(file_url):
+                released = FileUploadService._release_file_ref(file_url)
+                if released is not None:
+                    return True
 
-            filepath = os.path.join(
-                current_app.root_path,
-                'static',
-                file_url
-            )
+            # 從 URL 取得檔案路徑
+            filepath = FileUploadService.url_to_path(file_url)
 
             # 刪除檔案
             if os.path.exists(filepath):
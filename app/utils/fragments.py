@@ -0,0 +1,66 @@
+from flask import current_app, g
+from markupsafe import Markup
+from app.utils.cache import TTLCache
+
+PRODUCT_CARD_TEMPLATE = 'components/product_card_body.html'
+
+
+class FragmentCache:
+    """已渲染 HTML 片段的快取（LRU 淘汰，數量有上限）
+
+    每個物件只保留一份片段：快取鍵為 (物件 ID, 語系)，值附帶版本（例如 updated_at），
+    版本不同時重新渲染並覆蓋，因此內容更新後不會留下永遠用不到的舊片段佔用容量。
+    """
+
+    def __init__(self, maxsize=2048):
+        self._cache = TTLCache(maxsize=maxsize, ttl=None)
+
+    def render(self, key, version, factory):
+        """取得片段，不存在或版本不同時呼叫 factory() 渲染並寫入"""
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        html = factory()
+        self._cache.set(key, (version, html))
+        return html
+
+    def resize(self, maxsize):
+        self._cache.maxsize = maxsize
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+product_card_cache = FragmentCache()
+
+
+def get_locale():
+    """目前請求的語系（尚未支援多語系，預設為 DEFAULT_LOCALE）"""
+    return g.get('locale') or current_app.config.get('DEFAULT_LOCALE', 'zh_TW')
+
+
+def render_product_card(product):
+    """渲染商品卡片的共用部分（components/product_card_body.html）
+
+    卡片內容只取決於商品本身與賣家名稱，與目前使用者無關（商家的管理按鈕由
+    product_card.html 另外渲染），因此以商品 updated_at 與賣家名稱為版本快取片段。
+    片段直接以 Jinja 環境渲染，不會重複執行 context processor。
+    """
+    def render():
+        template = current_app.jinja_env.get_template(PRODUCT_CARD_TEMPLATE)
+        return template.render(product=product)
+
+    if not current_app.config.get('PRODUCT_CARD_CACHE_SIZE'):
+        return Markup(render())
+
+    product_card_cache.resize(current_app.config['PRODUCT_CARD_CACHE_SIZE'])
+    seller = product.seller
+    version = (product.updated_at, seller.username if seller else None)
+    return Markup(product_card_cache.render((product.id, get_locale()), version, render))
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+from PIL import Image
+from app.utils.file_upload import process_product_image
+
+
+def _legacy_process(source, output_dir, widths):
+    """舊版處理方式：以全解析度解碼並轉換色彩模式後才縮放（比較用）"""
+    img = Image.open(source)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    for size in sorted(set(widths), reverse=True):
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        img.save(os.path.join(output_dir, f'{size}.jpg'), 'JPEG', quality=85)
+
+
+def _read_status(field):
+    """讀取 /proc/self/status 的記憶體欄位（KB，非 Linux 時回傳 None）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _peak_rss():
+    return _read_status('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(mode, source, widths, limits):
+    """於子程序中處理一張圖片，回傳 (峰值 RSS 增加量 KB, 錯誤訊息)
+
+    載入模組時的記憶體峰值不計入：Linux 上先重設峰值（clear_refs），以目前的 RSS 為基準。
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = _read_status('VmRSS')
+    except OSError:
+        baseline = None
+    if baseline is None:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    error = None
+    with tempfile.TemporaryDirectory() as output_dir:
+        try:
+            if mode == 'legacy':
+                _legacy_process(source, output_dir, widths)
+            else:
+                process_product_image(source, output_dir, widths, **limits)
+        except ValueError as e:
+            error = str(e)
+    return _peak_rss() - baseline, error
+
+
+def make_sample_images(directory, sizes=((4000, 3000), (8000, 6000))):
+    """產生測試圖片：各尺寸的 JPEG（一般與漸進式）與含透明背景的 PNG"""
+    samples = []
+    for width, height in sizes:
+        gradient = Image.linear_gradient('L').resize((width, height))
+        img = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.ROTATE_180), gradient))
+
+        path = os.path.join(directory, f'{width}x{height}.jpg')
+        img.save(path, 'JPEG', quality=90)
+        samples.append(path)
+
+        path = os.path.join(directory, f'{width}x{height}-p.jpg')
+        img.save(path, 'JPEG', quality=90, progressive=True)
+        samples.append(path)
+
+        path = os.path.join(directory, f'{width}x{height}.png')
+        img.putalpha(gradient)
+        img.save(path, 'PNG', compress_level=1)
+        samples.append(path)
+        img.close()
+    return samples
+
+
+def run_benchmark(samples, widths=(160, 400, 800), limits=None):
+    """比較舊版與目前的處理方式處理每張圖片時的峰值 RSS
+
+    每次處理都在新的子程序中執行，ru_maxrss 才不會受先前的處理影響。
+
+    Returns:
+        list: [{'file', 'legacy_kb', 'bounded_kb', 'error'}, ...]
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for path in samples:
+        row = {'file': os.path.basename(path), 'size': os.path.getsize(path)}
+        for mode in ('legacy', 'bounded'):
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                peak, error = pool.apply(_measure, (mode, path, widths, limits or {}))
+            row[f'{mode}_kb'] = peak
+            if mode == 'bounded':
+                row['error'] = error
+        results.append(row)
+    return results
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from app.utils.file_upload import RESIZE_FORMATS, image_limits, resize_image
+
+
+class ResizedImageCache:
+    """動態縮圖的磁碟快取（/img/<w>x<h>/<path>，見 app/routes/images.py）
+
+    縮圖由儲存的圖片產生。商品原圖在處理後即刪除，來源是最大尺寸的版本
+    （長邊 max(PRODUCT_IMAGE_WIDTHS) 像素），因此不提供超過此上限的尺寸。
+    縮圖以 (路徑, 尺寸, 來源的修改時間與大小) 的雜湊為檔名，
+    來源更新後自然產生新的快取檔。快取總大小超過 IMAGE_CACHE_MAX_BYTES 時
+    依最近使用時間（LRU）刪除舊檔；命中時更新檔案的 mtime，重啟後仍可依 mtime 還原順序。
+
+    同一個縮圖同時被多個請求要求時只產生一次，其餘請求等待結果（每個 worker 內）；
+    不同 worker 可能重複產生，但輸出先寫入暫存檔再以 os.replace 取代，不會讀到不完整的檔案。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.folder = None
+        self.max_bytes = 0
+        self.sizes = set()
+        self.max_size = 0
+        self.limits = {}
+        self._entries = None  # OrderedDict: 檔名 -> 位元組數（由舊到新）
+        self._total = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # 檔名 -> threading.Event（產生中的縮圖）
+
+        # 統計資料
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """依設定初始化（快取目錄於第一次使用時才掃描）"""
+        self.app = app
+        self.folder = app.config.get('IMAGE_CACHE_FOLDER')
+        self.max_bytes = app.config.get('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        self.sizes = {tuple(size) for size in app.config.get('IMAGE_RESIZE_SIZES', ())}
+        self.max_size = max(app.config.get('PRODUCT_IMAGE_WIDTHS', (800,)))
+        self.limits = image_limits(app.config)
+        app.extensions['image_cache'] = self
+
+    def is_allowed_size(self, width, height):
+        """尺寸需在 IMAGE_RESIZE_SIZES 中，且不超過來源的最大尺寸（不放大）"""
+        return (width, height) in self.sizes and max(width, height) <= self.max_size
+
+    def get(self, source, width, height):
+        """取得縮圖（必要時產生），回傳 (快取檔路徑, etag)
+
+        Args:
+            source: 原圖的檔案路徑（呼叫端需確認位於上傳目錄內）
+            width, height: 最大寬高
+
+        Raises:
+            KeyError: 不支援的圖片格式
+            FileNotFoundError: 原圖不存在
+            ValueError: 圖片過大（見 open_bounded_image）
+        """
+        ext = source.rsplit('.', 1)[-1].lower()
+        output_ext = RESIZE_FORMATS[ext][0]
+
+        stat = os.stat(source)
+        etag = hashlib.sha1(
+            f'{source}|{width}x{height}|{stat.st_mtime_ns}|{stat.st_size}'.encode()
+        ).hexdigest()
+        name = f'{etag}.{output_ext}'
+        path = os.path.join(self.folder, etag[:2], name)
+
+        while True:
+            with self._lock:
+                self._load_entries()
+                hit = os.path.exists(path)
+                if hit:
+                    if name not in self._entries:
+                        # 其他 worker 產生的縮圖
+                        size = os.path.getsize(path)
+                        self._entries[name] = size
+                        self._total += size
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                else:
+                    event = self._inflight.get(name)
+                    owner = event is None
+                    if owner:
+                        event = self._inflight[name] = threading.Event()
+                        self.misses += 1
+                    else:
+                        self.coalesced += 1
+
+            if hit:
+                self._touch(path)
+                return path, etag
+
+            if not owner:
+                # 等待其他請求產生相同的縮圖，完成後重新檢查（產生失敗時由此請求重試）
+                event.wait()
+                continue
+
+            try:
+                self._generate(source, path, width, height)
+                size = os.path.getsize(path)
+                with self._lock:
+                    self._total += size - self._entries.pop(name, 0)
+                    self._entries[name] = size
+                    self._evict()
+            finally:
+                with self._lock:
+                    self._inflight.pop(name).set()
+            return path, etag
+
+    def _generate(self, source, path, width, height):
+        """產生縮圖：先寫入暫存檔再取代，其他 worker 不會讀到寫到一半的檔案"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.' + path.rsplit('.', 1)[-1])
+        os.close(fd)
+        try:
+            resize_image(source, tmp_path, width, height, **self.limits)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _load_entries(self):
+        """第一次使用時掃描快取目錄，依 mtime 還原 LRU 順序（需持有 _lock）"""
+        if self._entries is not None:
+            return
+
+        files = []
+        if self.folder and os.path.isdir(self.folder):
+            for root, _, names in os.walk(self.folder):
+                for name in names:
+                    if name.startswith('tmp'):
+                        continue  # 產生到一半中斷的暫存檔
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, name, stat.st_size))
+
+        files.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in files)
+        self._total = sum(self._entries.values())
+        self._evict()
+
+    def _evict(self):
+        """刪除最久未使用的縮圖直到總大小低於上限（需持有 _lock）"""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.folder, name[:2], name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """快取狀態（供監控使用）"""
+        with self._lock:
+            return {
+                'files': len(self._entries or ()),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'in_flight': len(self._inflight)
+            }
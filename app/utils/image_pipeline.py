@@ -0,0 +1,114 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.utils.file_upload import image_limits, process_product_image
+
+
+class ImagePipeline:
+    """商品圖片的背景處理流程
+
+    上傳請求只儲存原始檔並提交 ProductImage（status = 'processing'），
+    解碼、縮放與各尺寸的 JPEG / WebP 編碼交給子程序池執行，不佔用處理請求的 worker；
+    完成後由 ProductService.image_processed 將圖片標記為 'ready'（或 'failed'）。
+
+    IMAGE_PIPELINE_MODE：
+    - 'process'：子程序池（預設，Pillow 的解碼不受 GIL 限制）
+    - 'thread'：執行緒池（無法建立子程序的環境）
+    - 'sync'：於呼叫端同步處理（測試用）
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.mode = 'process'
+        self.workers = 2
+        self.limits = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # 統計資料
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """依設定初始化（子程序池於第一次送出工作時才建立）"""
+        self.app = app
+        self.mode = app.config.get('IMAGE_PIPELINE_MODE', 'process')
+        self.workers = app.config.get('IMAGE_PIPELINE_WORKERS', 2)
+        self.limits = image_limits(app.config)
+        app.extensions['image_pipeline'] = self
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.mode == 'thread':
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='image-pipeline'
+                    )
+                else:
+                    # 以 spawn 建立子程序，避免 fork 時複製到其他執行緒持有的鎖
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+            return self._executor
+
+    def submit(self, image_id, source_path, output_dir, widths=(160, 400, 800)):
+        """送出一張圖片的處理工作（需在 ProductImage 提交之後呼叫）"""
+        self.submitted += 1
+
+        if self.mode == 'sync':
+            renditions, error = None, None
+            try:
+                renditions = process_product_image(source_path, output_dir, widths, **self.limits)
+            except Exception as e:
+                error = str(e)
+            self._complete(image_id, output_dir, renditions, error)
+            return
+
+        future = self._get_executor().submit(
+            process_product_image, source_path, output_dir, widths, **self.limits
+        )
+        future.add_done_callback(
+            lambda f: self._complete(
+                image_id, output_dir,
+                None if f.exception() else f.result(),
+                str(f.exception()) if f.exception() else None
+            )
+        )
+
+    def _complete(self, image_id, output_dir, renditions, error):
+        """工作完成（於背景執行緒執行）：更新圖片狀態"""
+        from app.services.product_service import ProductService
+
+        if error:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+        with self.app.app_context():
+            try:
+                ProductService.image_processed(image_id, error, output_dir, renditions)
+            except Exception as e:
+                self.app.logger.error(f'更新圖片處理狀態失敗（#{image_id}）：{str(e)}')
+
+    def stats(self):
+        """處理流程狀態（供監控使用）"""
+        return {
+            'mode': self.mode,
+            'workers': self.workers,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'in_flight': self.submitted - self.completed - self.failed
+        }
+
+    def shutdown(self, wait=True):
+        """停止處理流程"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
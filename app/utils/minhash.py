@@ -0,0 +1,83 @@
+import hashlib
+import random
+import struct
+
+# 梅森質數 2^61 - 1，用於通用雜湊 (a·x + b) mod p
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _token_hash(token):
+    """跨程序穩定的 64 位元詞元雜湊（內建 hash() 每次啟動都不同）"""
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big')
+
+
+class MinHasher:
+    """MinHash 簽章與 LSH 分段
+
+    兩個集合的 MinHash 簽章中相同位置相等的比例即為 Jaccard 相似度的估計值。
+    LSH 將簽章切成 bands 段，每段 rows 個值雜湊成一個桶；
+    任一段落在同一個桶的兩項商品即為候選，相似度 s 的商品成為候選的機率為 1 − (1 − s^rows)^bands。
+    """
+
+    def __init__(self, num_perm=128, bands=32, seed=20250101):
+        """
+        Args:
+            num_perm: 簽章長度（雜湊函數數量）
+            bands: LSH 段數（num_perm 必須能被整除）
+            seed: 雜湊函數參數的亂數種子（變更後既有簽章即失效）
+        """
+        if num_perm % bands:
+            raise ValueError('num_perm 必須能被 bands 整除')
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = random.Random(seed)
+        self._params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, tokens):
+        """計算詞元集合的 MinHash 簽章
+
+        Returns:
+            tuple: num_perm 個 32 位元整數（集合為空時回傳 None）
+        """
+        hashes = {_token_hash(token) for token in tokens}
+        if not hashes:
+            return None
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._params
+        )
+
+    def band_hashes(self, signature):
+        """將簽章切段並雜湊成 LSH 桶（有號 64 位元整數，可直接存入 BIGINT）"""
+        result = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(
+                struct.pack(f'>H{self.rows}I', band, *chunk), digest_size=8
+            ).digest()
+            result.append(int.from_bytes(digest, 'big', signed=True))
+        return result
+
+    @staticmethod
+    def similarity(signature, other):
+        """以兩個簽章估計 Jaccard 相似度"""
+        if not signature or not other or len(signature) != len(other):
+            return 0.0
+        return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+    def pack(self, signature):
+        """將簽章序列化為位元組（存入資料庫）"""
+        return struct.pack(f'>{self.num_perm}I', *signature)
+
+    def unpack(self, data):
+        """由位元組還原簽章（長度不符時回傳 None）"""
+        if not data or len(data) != self.num_perm * 4:
+            return None
+        return struct.unpack(f'>{self.num_perm}I', data)
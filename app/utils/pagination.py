@@ -0,0 +1,184 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import tuple_
+from app.extensions import db
+
+
+def encode_cursor(sort_by, sort_value, row_id, direction='next'):
+    """將 (排序值, id) 編碼為不透明的游標字串"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    elif isinstance(sort_value, Decimal):
+        sort_value = str(sort_value)
+
+    payload = json.dumps(
+        {'k': sort_by, 'v': sort_value, 'id': row_id, 'd': direction},
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_by):
+    """解析游標字串
+
+    Args:
+        cursor: encode_cursor 產生的字串
+        sort_by: 目前的排序欄位（游標的排序欄位不同時視為無效）
+
+    Returns:
+        (sort_value, row_id, direction) 或 None（游標無效）
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['k'] != sort_by or payload['d'] not in ('next', 'prev'):
+            return None
+
+        sort_value = payload['v']
+        if sort_by == 'created_at':
+            sort_value = datetime.fromisoformat(sort_value)
+        elif sort_by == 'price':
+            sort_value = Decimal(sort_value)
+        elif sort_by == 'view_count':
+            sort_value = int(sort_value)
+        else:
+            sort_value = float(sort_value)
+
+        return sort_value, int(payload['id']), payload['d']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+
+
+def estimate_count(query):
+    """估計查詢結果筆數
+
+    PostgreSQL 使用查詢計畫的預估列數（不掃描資料），
+    其他資料庫則退回精確的 COUNT。
+    """
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return query.order_by(None).count()
+
+    compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+    result = db.session.connection().exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+    ).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def apply_keyset(query, sort_expr, id_column, sort_by, order='desc', cursor=None):
+    """套用游標條件與排序
+
+    Returns:
+        (query, direction, has_cursor): direction 為 'next' 或 'prev'
+    """
+    decoded = decode_cursor(cursor, sort_by)
+    direction = decoded[2] if decoded else 'next'
+    descending = (order == 'desc') != (direction == 'prev')
+
+    if decoded:
+        key = tuple_(sort_expr, id_column)
+        bound = tuple_(decoded[0], decoded[1])
+        query = query.filter(key < bound if descending else key > bound)
+
+    if descending:
+        query = query.order_by(sort_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_column.asc())
+
+    return query, direction, decoded is not None
+
+
+class KeysetPagination:
+    """游標（keyset）分頁結果
+
+    以 (排序值, id) 作為游標，使用 WHERE (sort_key, id) < (:v, :id) 取代 OFFSET，
+    因此不論翻到第幾頁查詢成本都相同，也不需要每頁執行 COUNT(*)。
+    """
+
+    def __init__(self, query, sort_expr, id_column, sort_by, order='desc',
+                 per_page=12, cursor=None, total_mode=None, total=None):
+        """
+        Args:
+            query: 已套用篩選條件（尚未排序）的查詢
+            sort_expr: 排序欄位或運算式
+            id_column: 作為同分排序依據的主鍵欄位
+            sort_by: 排序欄位名稱（寫入游標，用於驗證）
+            order: 排序方向（asc, desc）
+            per_page: 每頁數量
+            cursor: 游標字串（None 表示第一頁）
+            total_mode: None（不計算總數）、'estimate'（預估）、'exact'（精確 COUNT）
+            total: 已知的總數（例如由計數表取得，提供時忽略 total_mode）
+        """
+        if total is None and total_mode == 'exact':
+            total = query.order_by(None).count()
+        elif total is None and total_mode == 'estimate':
+            total = estimate_count(query)
+
+        query, direction, has_cursor = apply_keyset(
+            query, sort_expr, id_column, sort_by, order, cursor
+        )
+
+        # 多取一筆判斷是否還有下一頁
+        rows = query.add_columns(sort_expr).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+
+        self._set_page(
+            [(row[0], row[1]) for row in rows[:per_page]],
+            sort_by, per_page, cursor, direction, has_cursor, has_more, total
+        )
+
+    @classmethod
+    def from_rows(cls, rows, sort_by, per_page, cursor, has_more, total=None):
+        """由已取得的資料列建立分頁結果（例如來自快取）
+
+        Args:
+            rows: [(item, sort_value), ...]，依查詢方向排列（最多 per_page 筆）
+            has_more: 查詢方向上是否還有更多資料
+        """
+        decoded = decode_cursor(cursor, sort_by)
+        page = cls.__new__(cls)
+        page._set_page(
+            rows, sort_by, per_page, cursor,
+            decoded[2] if decoded else 'next', decoded is not None, has_more, total
+        )
+        return page
+
+    def _set_page(self, rows, sort_by, per_page, cursor, direction, has_cursor, has_more, total):
+        self.per_page = per_page
+        self.sort_by = sort_by
+        self.cursor = cursor
+        self.total = total
+
+        rows = list(rows)
+        if direction == 'prev':
+            rows.reverse()
+            self.has_prev = has_more
+            self.has_next = True
+        else:
+            self.has_prev = has_cursor
+            self.has_next = has_more
+
+        self.items = [row[0] for row in rows]
+        self._keys = [(row[1], row[0].id) for row in rows]
+
+    @property
+    def next_cursor(self):
+        """下一頁游標"""
+        if not self.has_next or not self._keys:
+            return None
+        return encode_cursor(self.sort_by, *self._keys[-1], direction='next')
+
+    @property
+    def prev_cursor(self):
+        """上一頁游標"""
+        if not self.has_prev or not self._keys:
+            return None
+        return encode_cursor(self.sort_by, *self._keys[0], direction='prev')
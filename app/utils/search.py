@@ -0,0 +1,53 @@
+import re
+
+# CJK 統一表意文字、擴充 A、相容字、注音與日文假名
+CJK_PATTERN = r'\u3040-\u30ff\u3100-\u312f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(rf'[{CJK_PATTERN}]+|[a-zA-Z0-9]+')
+CJK_RE = re.compile(rf'^[{CJK_PATTERN}]+$')
+
+
+def _cjk_bigrams(run):
+    """將連續中日文字切成重疊的二元組（bigram）"""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text, include_unigrams=False):
+    """將文字切成全文檢索用的詞元
+
+    英數字以單字為單位並轉為小寫；中文等 CJK 文字沒有空白分隔，
+    因此切成重疊的二元組（例如「微積分」→「微積」「積分」）。
+
+    Args:
+        text: 原始文字
+        include_unigrams: 是否額外輸出 CJK 單字（建立索引時使用，讓單字查詢也能命中）
+
+    Returns:
+        list: 詞元列表
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for run in TOKEN_RE.findall(text):
+        if CJK_RE.match(run):
+            if include_unigrams and len(run) > 1:
+                tokens.extend(run)
+            tokens.extend(_cjk_bigrams(run))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def build_search_document(*fields):
+    """將多個欄位組成索引用的詞元字串（以空白分隔）"""
+    tokens = []
+    for field in fields:
+        tokens.extend(tokenize(field, include_unigrams=True))
+    return ' '.join(tokens)
+
+
+def build_query_tokens(search):
+    """將搜尋關鍵字轉為查詢詞元（去除重複、保留順序）"""
+    return list(dict.fromkeys(tokenize(search)))
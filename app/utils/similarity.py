@@ -0,0 +1,162 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from app.utils.background_index import BackgroundIndex
+from app.utils.search import tokenize
+
+
+class SimilarityIndex(BackgroundIndex):
+    """相似商品索引（TF-IDF 向量 + 反向索引，常駐記憶體）
+
+    每項商品以標題與描述的詞元（中文二元組）建立 L2 正規化的 TF-IDF 稀疏向量，
+    查詢時只沿著共用詞元的反向索引累加內積，計算量與候選商品數成正比；
+    結果依商品快取，直到索引內容變更為止。
+    """
+
+    thread_name = 'similarity-index-build'
+
+    def __init__(self, title_weight=2, max_posting_ratio=0.3, category_boost=0.1, max_age=None):
+        """
+        Args:
+            title_weight: 標題詞元的權重倍數
+            max_posting_ratio: 出現在超過此比例商品中的詞元視為停用詞，查詢時略過
+            category_boost: 同分類商品的加分
+            max_age: 索引定期重建的秒數（見 BackgroundIndex）
+        """
+        super().__init__(max_age=max_age)
+        self.title_weight = title_weight
+        self.max_posting_ratio = max_posting_ratio
+        self.category_boost = category_boost
+
+        self._vectors = {}                  # product_id -> {token: weight}
+        self._postings = defaultdict(dict)  # token -> {product_id: weight}
+        self._df = Counter()                # token -> 出現的商品數
+        self._categories = {}               # product_id -> category_id
+        self._results = {}                  # product_id -> (k, [product_id, ...])
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def _term_frequencies(self, title, description):
+        tf = Counter(tokenize(description))
+        for token in tokenize(title):
+            tf[token] += self.title_weight
+        return tf
+
+    def _idf(self, token, total):
+        return math.log((1 + total) / (1 + self._df[token])) + 1
+
+    def _vectorize(self, tf, total):
+        vector = {
+            token: (1 + math.log(count)) * self._idf(token, total)
+            for token, count in tf.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if norm:
+            vector = {token: weight / norm for token, weight in vector.items()}
+        return vector
+
+    def _load(self, rows):
+        """重新建立整個索引
+
+        Args:
+            rows: 可迭代的 (product_id, title, description, category_id)
+        """
+        documents = {}
+        categories = {}
+        df = Counter()
+        for product_id, title, description, category_id in rows:
+            tf = self._term_frequencies(title, description)
+            documents[product_id] = tf
+            categories[product_id] = category_id
+            df.update(tf.keys())
+
+        with self._lock:
+            self._df = df
+            self._vectors = {}
+            self._postings = defaultdict(dict)
+            self._categories = categories
+            for product_id, tf in documents.items():
+                vector = self._vectorize(tf, len(documents))
+                self._vectors[product_id] = vector
+                for token, weight in vector.items():
+                    self._postings[token][product_id] = weight
+            self._results = {}
+
+    def upsert(self, product_id, title, description, category_id):
+        """新增或更新單一商品（使用目前的 IDF 增量計算；索引尚未建立時略過，建立中則於完成後套用）"""
+        with self._lock:
+            self._record(self.upsert, product_id, title, description, category_id)
+            if not self.ready:
+                return
+            self._remove(product_id)
+            tf = self._term_frequencies(title, description)
+            self._df.update(tf.keys())
+            vector = self._vectorize(tf, len(self._vectors) + 1)
+            self._vectors[product_id] = vector
+            self._categories[product_id] = category_id
+            for token, weight in vector.items():
+                self._postings[token][product_id] = weight
+            self._results = {}
+
+    def remove(self, product_id):
+        """移除商品（例如下架或售出）"""
+        with self._lock:
+            self._record(self.remove, product_id)
+            if self._remove(product_id):
+                self._results = {}
+
+    def _remove(self, product_id):
+        vector = self._vectors.pop(product_id, None)
+        self._categories.pop(product_id, None)
+        if not vector:
+            return vector is not None
+
+        for token in vector:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+            self._df[token] -= 1
+            if self._df[token] <= 0:
+                del self._df[token]
+        return True
+
+    def similar(self, product_id, k=4):
+        """取得最相似的 k 項商品
+
+        Returns:
+            list: 商品 ID 列表（依相似度排序），商品不在索引中時回傳 None
+        """
+        with self._lock:
+            cached = self._results.get(product_id)
+            if cached is not None and cached[0] >= k:
+                return cached[1][:k]
+
+            vector = self._vectors.get(product_id)
+            if vector is None:
+                return None
+
+            max_postings = max(int(len(self._vectors) * self.max_posting_ratio), 50)
+            category_id = self._categories.get(product_id)
+            scores = defaultdict(float)
+            for token, weight in vector.items():
+                postings = self._postings.get(token, {})
+                if len(postings) > max_postings:
+                    continue
+                for other_id, other_weight in postings.items():
+                    scores[other_id] += weight * other_weight
+            scores.pop(product_id, None)
+
+            if self.category_boost:
+                for other_id in scores:
+                    if self._categories.get(other_id) == category_id:
+                        scores[other_id] += self.category_boost
+
+            result = [
+                other_id for other_id, _ in
+                heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+            ]
+            self._results[product_id] = (k, result)
+            return result
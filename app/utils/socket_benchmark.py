@@ -0,0 +1,211 @@
+"""
+Socket.IO 同時連線數基準測試
+
+對執行中的節點建立大量 WebSocket 連線（Engine.IO v4 / Socket.IO v5 協定，只使用 simple-websocket），
+保持連線一段時間後回報成功數、連線延遲與伺服器程序的 RSS；
+指定訊息佇列時另外經由佇列廣播一則事件，確認所有節點上的連線都收得到。
+"""
+import json
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+from simple_websocket import Client, ConnectionClosed
+
+BENCHMARK_EVENT = 'benchmark_ping'
+POLL_INTERVAL = 0.05  # 連線保持期間處理封包的間隔（秒），廣播延遲的量測精度
+
+
+def socket_url(url):
+    """http(s)://host:port → ws(s)://host:port/socket.io/?EIO=4&transport=websocket"""
+    parts = urlsplit(url)
+    scheme = {'http': 'ws', 'https': 'wss'}.get(parts.scheme, parts.scheme)
+    return urlunsplit((scheme, parts.netloc, '/socket.io/', 'EIO=4&transport=websocket', ''))
+
+
+def read_rss_kb(pid):
+    """讀取程序的 RSS（KB，非 Linux 或程序不存在時回傳 None）"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+class BenchmarkSocket:
+    """最小的 Socket.IO 用戶端：連線到預設命名空間、回應 ping、記錄收到的事件"""
+
+    def __init__(self, url, headers=None, timeout=10):
+        started = time.perf_counter()
+        self.ws = Client.connect(socket_url(url), headers=headers)
+        self._expect('0', timeout)        # Engine.IO open
+        self.ws.send('40')                # Socket.IO connect（預設命名空間）
+        self._expect('40', timeout)
+        self.connect_time = time.perf_counter() - started
+        self.events = []
+        self.alive = True
+
+    def _expect(self, prefix, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            packet = self.ws.receive(timeout=max(deadline - time.monotonic(), 0))
+            if packet is None:
+                raise TimeoutError(f'等待封包 {prefix} 逾時')
+            if packet == '2':
+                self.ws.send('3')
+            elif packet.startswith('44'):
+                raise ConnectionError(f'伺服器拒絕連線：{packet[2:]}')
+            elif packet.startswith(prefix):
+                return packet
+
+    def poll(self):
+        """處理已收到的封包（回應 ping，記錄事件）；連線已中斷時標記為失效"""
+        if not self.alive:
+            return
+        try:
+            while True:
+                packet = self.ws.receive(timeout=0)
+                if packet is None:
+                    return
+                if packet == '2':
+                    self.ws.send('3')
+                elif packet.startswith('42'):
+                    event, *args = json.loads(packet[2:])
+                    self.events.append((time.time(), event, args))
+                elif packet.startswith('41'):
+                    # 伺服器中斷預設命名空間的連線
+                    self.alive = False
+                    return
+        except ConnectionClosed:
+            self.alive = False
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_benchmark(urls, connections, concurrency=50, hold=10, pid=None, headers=None,
+                  message_queue=None, channel='socketio', progress=None):
+    """建立 connections 條連線（依序分配到 urls 中的節點）並保持 hold 秒
+
+    Args:
+        urls: 節點網址（如 ['http://127.0.0.1:5000']，多個節點時輪流分配）
+        connections: 總連線數
+        concurrency: 同時進行連線握手的執行緒數
+        hold: 全部連線建立後保持的秒數（期間持續回應 ping）
+        pid: 伺服器程序 ID（只有一個本機節點時可量測每條連線的記憶體）
+        headers: 連線時附加的 HTTP 標頭（如登入後的 Cookie）
+        message_queue: 訊息佇列網址，指定時經由佇列廣播一則事件並統計收到的連線數
+        channel: 訊息佇列頻道（需與伺服器的 SOCKETIO_CHANNEL 相同）
+        progress: 進度回呼 progress(已建立, 失敗)
+
+    Returns:
+        dict: 連線數、失敗數、連線延遲、連線速率、RSS 與廣播結果
+    """
+    sockets = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(connections))
+
+    rss_before = read_rss_kb(pid) if pid else None
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            try:
+                sock = BenchmarkSocket(urls[index % len(urls)], headers=headers)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e) or e.__class__.__name__)
+                continue
+            with lock:
+                sockets.append(sock)
+                if progress:
+                    progress(len(sockets), len(errors))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(min(concurrency, connections), 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    try:
+        broadcast = None
+        deadline = time.monotonic() + hold
+        if message_queue:
+            sent_at = _broadcast(message_queue, channel)
+            broadcast = {'sent_at': sent_at}
+        while time.monotonic() < deadline:
+            for sock in sockets:
+                sock.poll()
+            time.sleep(POLL_INTERVAL)
+        for sock in sockets:
+            sock.poll()
+
+        alive = sum(1 for sock in sockets if sock.alive)
+        rss_after = read_rss_kb(pid) if pid else None
+
+        if broadcast is not None:
+            delays = [
+                received - broadcast['sent_at']
+                for sock in sockets
+                for received, event, _ in sock.events if event == BENCHMARK_EVENT
+            ]
+            broadcast = {
+                'received': len(delays),
+                'p50_ms': _percentile(delays, 0.5) * 1000 if delays else None,
+                'p99_ms': _percentile(delays, 0.99) * 1000 if delays else None
+            }
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    connect_times = [sock.connect_time for sock in sockets]
+    rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    return {
+        'connected': len(sockets),
+        'alive': alive,
+        'failed': len(errors),
+        'errors': sorted(set(errors))[:5],
+        'elapsed': elapsed,
+        'rate': len(sockets) / elapsed if elapsed else 0,
+        'connect_p50_ms': (_percentile(connect_times, 0.5) or 0) * 1000,
+        'connect_p99_ms': (_percentile(connect_times, 0.99) or 0) * 1000,
+        'rss_before_kb': rss_before,
+        'rss_after_kb': rss_after,
+        'rss_per_socket_kb': rss_delta / len(sockets) if rss_delta is not None and sockets else None,
+        'broadcast': broadcast
+    }
+
+
+def _broadcast(url, channel):
+    """經由訊息佇列廣播基準測試事件給所有節點的連線，回傳送出時間"""
+    import socketio
+    from app.utils.socketio_queue import MEMORY_QUEUE_PREFIX, InMemoryManager
+
+    if url.startswith(MEMORY_QUEUE_PREFIX):
+        # 程序內佇列：只有伺服器與基準測試在同一個程序中時才收得到
+        manager = InMemoryManager(channel=url[len(MEMORY_QUEUE_PREFIX):] or channel, write_only=True)
+    elif url.startswith(('redis://', 'rediss://')):
+        manager = socketio.RedisManager(url, channel=channel, write_only=True)
+    else:
+        manager = socketio.KombuManager(url, channel=channel, write_only=True)
+
+    sent_at = time.time()
+    manager.emit(BENCHMARK_EVENT, {'sent_at': sent_at}, namespace='/')
+    return sent_at
@@ -0,0 +1,91 @@
+"""
+Socket.IO 訊息佇列設定
+
+多個 worker / 節點時，每個程序只持有自己的連線；房間廣播（如 user_{id}、chat_a_b）
+需經由訊息佇列轉送給其他程序。SOCKETIO_MESSAGE_QUEUE 可設定為：
+
+    None / 空字串      單一程序，不使用佇列
+    redis://...        Redis pub/sub（需安裝 redis 套件）
+    memory://          同一程序內的佇列（測試用，可在同一個程序中模擬多個節點）
+"""
+import pickle
+import queue
+import threading
+import socketio
+
+MEMORY_QUEUE_PREFIX = 'memory://'
+
+
+class InMemoryManager(socketio.PubSubManager):
+    """以程序內佇列實作的 pub/sub 管理器（測試用）
+
+    同一程序中以相同 channel 建立的多個 Socket.IO 伺服器共用同一個匯流排，
+    訊息以 pickle 傳遞，與 Redis 相同：無法序列化的資料在測試中就會失敗。
+    只適用於 threading 模式。
+    """
+    name = 'memory'
+
+    _lock = threading.Lock()
+    _subscribers = {}  # {channel: [queue.Queue]}
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = None
+
+    def _publish(self, data):
+        message = pickle.dumps(data)
+        with self._lock:
+            subscribers = list(self._subscribers.get(self.channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _listen(self):
+        self._queue = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(self.channel, []).append(self._queue)
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        """停止接收訊息（伺服器不再使用時呼叫）"""
+        if self._queue is None:
+            return
+        with self._lock:
+            subscribers = self._subscribers.get(self.channel, [])
+            if self._queue in subscribers:
+                subscribers.remove(self._queue)
+        self._queue.put(None)
+
+
+def socketio_options(config):
+    """由設定產生 socketio.init_app() 的參數
+
+    Raises:
+        RuntimeError: 使用 Redis 佇列但未安裝 redis 套件
+    """
+    url = config.get('SOCKETIO_MESSAGE_QUEUE') or None
+    options = {
+        'async_mode': config.get('SOCKETIO_ASYNC_MODE') or None,
+        'cors_allowed_origins': config.get('SOCKETIO_CORS_ALLOWED_ORIGINS', '*'),
+        'message_queue': url
+    }
+
+    if url is None:
+        # init_app 會保留上一次的參數，明確清除先前建立的佇列管理器
+        options['client_manager'] = None
+    elif url.startswith(MEMORY_QUEUE_PREFIX):
+        options['client_manager'] = InMemoryManager(
+            channel=url[len(MEMORY_QUEUE_PREFIX):] or config['SOCKETIO_CHANNEL']
+        )
+    else:
+        if url.startswith(('redis://', 'rediss://')):
+            try:
+                import redis  # noqa: F401
+            except ImportError:
+                raise RuntimeError('SOCKETIO_MESSAGE_QUEUE 使用 Redis，請先安裝 redis 套件（pip install redis）')
+        options['channel'] = config['SOCKETIO_CHANNEL']
+
+    return options
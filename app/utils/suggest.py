@@ -0,0 +1,121 @@
+import bisect
+import unicodedata
+from app.utils.background_index import BackgroundIndex
+from app.utils.search import TOKEN_RE
+
+
+def normalize(text):
+    """正規化文字（全形轉半形、轉小寫、合併空白）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ' '.join(text.split())
+
+
+class PrefixIndex(BackgroundIndex):
+    """自動完成用的前綴索引（排序陣列 + 二分搜尋，常駐記憶體）
+
+    每個商品標題以數個索引鍵登記：完整標題，以及標題中每個英數單字、
+    每段中文的起點開始的後綴（例如「二手筆電 ASUS」→「二手筆電 asus」「asus」），
+    因此輸入標題中間的品牌或中文詞的開頭也能命中。
+    查詢時以 bisect 找到第一個 >= 前綴的位置，再往後掃描仍以前綴開頭的項目，
+    成本只與掃描上限有關，與商品總數無關；新增或移除商品時以 insort 增量更新。
+    """
+
+    thread_name = 'prefix-index-build'
+
+    def __init__(self, max_scan=200, max_age=None):
+        """
+        Args:
+            max_scan: 每次查詢最多檢查的索引項目數（短前綴時限制掃描量）
+            max_age: 索引定期重建的秒數（見 BackgroundIndex）
+        """
+        super().__init__(max_age=max_age)
+        self.max_scan = max_scan
+        self._entries = []      # 排序的 (key, item_id)
+        self._items = {}        # item_id -> (title, weight, keys)，keys[0] 為完整標題
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _keys(title):
+        normalized = normalize(title)
+        if not normalized:
+            return []
+        keys = [normalized]
+        for match in TOKEN_RE.finditer(normalized):
+            suffix = normalized[match.start():]
+            if suffix not in keys:
+                keys.append(suffix)
+        return keys
+
+    def _load(self, rows):
+        """重新建立整個索引
+
+        Args:
+            rows: 可迭代的 (item_id, title, weight)，weight 用於排序（例如瀏覽次數）
+        """
+        entries = []
+        items = {}
+        for item_id, title, weight in rows:
+            keys = self._keys(title)
+            items[item_id] = (title, weight or 0, keys)
+            entries.extend((key, item_id) for key in keys)
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._items = items
+
+    def upsert(self, item_id, title, weight=0):
+        """新增或更新單一項目（索引尚未建立時略過，建立中則於完成後套用）"""
+        with self._lock:
+            self._record(self.upsert, item_id, title, weight)
+            if not self.ready:
+                return
+            self._remove(item_id)
+            keys = self._keys(title)
+            self._items[item_id] = (title, weight or 0, keys)
+            for key in keys:
+                bisect.insort(self._entries, (key, item_id))
+
+    def remove(self, item_id):
+        """移除項目"""
+        with self._lock:
+            self._record(self.remove, item_id)
+            self._remove(item_id)
+
+    def _remove(self, item_id):
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return
+        for key in item[2]:
+            index = bisect.bisect_left(self._entries, (key, item_id))
+            if index < len(self._entries) and self._entries[index] == (key, item_id):
+                del self._entries[index]
+
+    def search(self, prefix, limit=8):
+        """以前綴查詢
+
+        Returns:
+            list: [(item_id, title), ...]，完整標題以前綴開頭者優先，其次依 weight 排序
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            start = bisect.bisect_left(self._entries, (prefix,))
+            end = min(start + self.max_scan, len(self._entries))
+            candidates = {}
+            for key, item_id in self._entries[start:end]:
+                if not key.startswith(prefix):
+                    break
+                title, weight, keys = self._items[item_id]
+                # 相同標題（例如重複刊登）只保留一筆
+                rank = (key == keys[0], weight, item_id)
+                best = candidates.get(keys[0])
+                if best is None or rank > best[0]:
+                    candidates[keys[0]] = (rank, item_id, title)
+
+        ranked = sorted(candidates.values(), reverse=True)
+        return [(item_id, title) for _, item_id, title in ranked[:limit]]
@@ -0,0 +1,215 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import text
+
+
+class ViewCountBuffer:
+    """商品瀏覽次數的寫回（write-behind）緩衝
+
+    每次瀏覽只在記憶體中累加，達到筆數門檻或每隔固定秒數才以一筆批次
+    UPDATE 寫回資料庫，避免熱門商品的每次瀏覽都要取得列鎖並提交交易。
+    設定 VIEW_COUNT_REDIS_URL 時改用 Redis hash 作為多個 worker 共用的緩衝。
+    """
+
+    REDIS_KEY = 'studenttrade:view_counts'
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.flush_interval = 10
+        self.flush_threshold = 500
+        self._pending = defaultdict(int)
+        self._pending_hits = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._redis = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._atexit_registered = False
+
+        # 統計資料
+        self.flush_count = 0
+        self.flushed_views = 0
+        self.last_flush_at = None
+        self.last_error = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """依設定初始化緩衝
+
+        背景寫回執行緒於第一次累加時才啟動，CLI 指令與 init_db 等不處理請求的程序不會啟動。
+        """
+        self.app = app
+        self.enabled = app.config.get('VIEW_COUNT_BUFFER_ENABLED', True)
+        self.flush_interval = app.config.get('VIEW_COUNT_FLUSH_INTERVAL', 10)
+        self.flush_threshold = app.config.get('VIEW_COUNT_FLUSH_THRESHOLD', 500)
+
+        redis_url = app.config.get('VIEW_COUNT_REDIS_URL')
+        if self.enabled and redis_url:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('使用 VIEW_COUNT_REDIS_URL 需要安裝 redis 套件')
+            self._redis = redis.Redis.from_url(redis_url)
+
+        app.extensions['view_counter'] = self
+
+        if self.enabled and not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    def _ensure_thread(self):
+        """啟動背景寫回執行緒（只在處理請求的程序中，第一次累加時啟動）"""
+        if not self.flush_interval or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='view-count-flusher', daemon=True
+                )
+                self._thread.start()
+
+    def increment(self, product_id, amount=1):
+        """累加瀏覽次數（達到門檻時立即寫回）"""
+        self._ensure_thread()
+        hits = self._add(product_id, amount)
+        if self.flush_threshold and hits >= self.flush_threshold:
+            self.flush()
+
+    def _add(self, product_id, amount):
+        """累加到緩衝，回傳目前累積的瀏覽次數"""
+        if self._redis is not None:
+            pipe = self._redis.pipeline()
+            pipe.hincrby(self.REDIS_KEY, product_id, amount)
+            pipe.hincrby(self.REDIS_KEY, '_hits', amount)
+            return pipe.execute()[1]
+
+        with self._lock:
+            self._pending[product_id] += amount
+            self._pending_hits += amount
+            return self._pending_hits
+
+    def pending(self, product_id):
+        """取得尚未寫回的瀏覽次數"""
+        if self._redis is not None:
+            return int(self._redis.hget(self.REDIS_KEY, product_id) or 0)
+        with self._lock:
+            return self._pending.get(product_id, 0)
+
+    def stats(self):
+        """緩衝狀態（供監控使用，見 /products/api/view-counts）
+
+        記憶體緩衝回傳本程序尚未寫回的瀏覽次數，Redis 緩衝回傳所有 worker 共用的數量；
+        寫回次數與最後寫回時間皆為本程序的統計。
+        """
+        if self._redis is not None:
+            pending = {
+                key.decode(): int(value)
+                for key, value in self._redis.hgetall(self.REDIS_KEY).items()
+            }
+            pending.pop('_hits', None)
+        else:
+            with self._lock:
+                pending = dict(self._pending)
+
+        return {
+            'backend': 'redis' if self._redis is not None else 'memory',
+            'pending_products': len(pending),
+            'pending_views': sum(pending.values()),
+            'flush_count': self.flush_count,
+            'flushed_views': self.flushed_views,
+            'last_flush_at': self.last_flush_at,
+            'last_error': self.last_error
+        }
+
+    def flush(self):
+        """將累積的瀏覽次數批次寫回資料庫
+
+        Returns:
+            int: 寫回的瀏覽次數
+        """
+        if self.app is None:
+            return 0
+
+        with self._flush_lock:
+            deltas = self._take_pending()
+            if not deltas:
+                return 0
+
+            try:
+                with self.app.app_context():
+                    self._write(deltas)
+            except Exception as e:
+                # 寫回失敗時放回緩衝，下次再試
+                self.last_error = str(e)
+                for product_id, delta in deltas.items():
+                    self._add(product_id, delta)
+                return 0
+
+            total = sum(deltas.values())
+            self.flush_count += 1
+            self.flushed_views += total
+            self.last_flush_at = time.time()
+            self.last_error = None
+            return total
+
+    def _take_pending(self):
+        """取出並清空目前的緩衝"""
+        if self._redis is not None:
+            pipe = self._redis.pipeline()
+            pipe.hgetall(self.REDIS_KEY)
+            pipe.delete(self.REDIS_KEY)
+            raw = pipe.execute()[0]
+            return {
+                int(key): int(value)
+                for key, value in raw.items()
+                if key != b'_hits' and int(value)
+            }
+
+        with self._lock:
+            deltas = dict(self._pending)
+            self._pending.clear()
+            self._pending_hits = 0
+        return deltas
+
+    def _write(self, deltas, chunk_size=1000):
+        """執行批次 UPDATE（依 id 排序以固定取得列鎖的順序）"""
+        from app.extensions import db
+
+        items = sorted(deltas.items())
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                for start in range(0, len(items), chunk_size):
+                    chunk = items[start:start + chunk_size]
+                    values = ', '.join(
+                        f'(:id{i}, :delta{i})' for i in range(len(chunk))
+                    )
+                    params = {}
+                    for i, (product_id, delta) in enumerate(chunk):
+                        params[f'id{i}'] = product_id
+                        params[f'delta{i}'] = delta
+                    conn.execute(text(
+                        'UPDATE products SET view_count = COALESCE(products.view_count, 0) + v.delta '
+                        f'FROM (VALUES {values}) AS v(id, delta) '
+                        'WHERE products.id = v.id'
+                    ), params)
+            else:
+                conn.execute(
+                    text('UPDATE products SET view_count = COALESCE(view_count, 0) + :delta '
+                         'WHERE id = :id'),
+                    [{'id': product_id, 'delta': delta} for product_id, delta in items]
+                )
+
+    def _run(self):
+        """背景執行緒：定期寫回"""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """停止背景執行緒並寫回剩餘資料"""
+        self._stop.set()
+        self.flush()
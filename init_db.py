@@ -16,6 +16,11 @@ from app.models.transaction import Transaction
 from app.models.message import Message
 from app.models.notification import Notification
 from app.models.review import Review
+from app.models.saved_search import SavedSearch
+from app.models.product_lsh_bucket import ProductLshBucket
+from app.models.stored_file import StoredFile
+from app.models.conversation import Conversation
+from app.models.user_counter import UserCounter
 
 def init_database():
     """初始化資料庫"""
@@ -1,9 +1,34 @@
+import os
+
+# eventlet / gevent 需在載入其他模組前 monkey patch（gunicorn -k eventlet/gevent 啟動時由 gunicorn 處理）
+_async_mode = os.environ.get('SOCKETIO_ASYNC_MODE')
+try:
+    if _async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif _async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+except ImportError:
+    raise SystemExit(f'SOCKETIO_ASYNC_MODE={_async_mode} 需要安裝 {_async_mode} 套件（見 requirements-scaling.txt）')
+
 from app import create_app
+from app.config import config
 from app.extensions import db, socketio
 
-app = create_app()
+config_name = os.environ.get('FLASK_ENV') or 'default'
+if config_name not in config:
+    raise SystemExit(f'FLASK_ENV={config_name!r} 不是有效的設定，請使用：{", ".join(config)}')
+
+app = create_app(config_name)
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
+    socketio.run(
+        app,
+        host='0.0.0.0',
+        port=int(os.environ.get('PORT', 5000)),
+        debug=app.config.get('DEBUG', False),
+        allow_unsafe_werkzeug=True
+    )
@@ -28,11 +28,13 @@ CREATE TABLE IF NOT EXISTS categories (
     name        VARCHAR(50) NOT NULL UNIQUE,
     description TEXT,
     parent_id   INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+    path        VARCHAR(255),
     sort_order  INTEGER NOT NULL DEFAULT 0,
     created_at  TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_categories_parent ON categories (parent_id);
+CREATE INDEX IF NOT EXISTS idx_categories_path ON categories (path varchar_pattern_ops);
 
 CREATE TABLE IF NOT EXISTS products (
     id                  SERIAL PRIMARY KEY,
@@ -47,13 +49,52 @@ CREATE TABLE IF NOT EXISTS products (
     location            VARCHAR(200),
     transaction_method  VARCHAR(200),
     view_count          INTEGER NOT NULL DEFAULT 0,
+    primary_image_url   VARCHAR(255),
+    -- primary_image_url：主圖網址（反正規化自 product_images.is_primary）
+    primary_image_renditions JSON,
+    trending_score      DOUBLE PRECISION NOT NULL DEFAULT 0,
+    trending_view_count INTEGER NOT NULL DEFAULT 0,
+    trending_updated_at TIMESTAMP,
+    -- trending_*：對數尺度的時間衰減熱門度，由 update-trending-scores 排程累加
+    minhash_signature   BYTEA,
+    duplicate_of_id     INTEGER REFERENCES products(id) ON DELETE SET NULL,
+    -- minhash_signature：標題與描述的 MinHash 簽章；duplicate_of_id：疑似重複的原商品
     created_at          TIMESTAMP NOT NULL DEFAULT NOW(),
-    updated_at          TIMESTAMP NOT NULL DEFAULT NOW()
+    updated_at          TIMESTAMP NOT NULL DEFAULT NOW(),
+    search_tokens       TEXT,
+    -- search_tokens：應用程式斷詞後的標題與描述（中文切成二元組）
+    search_vector       TSVECTOR
 );
 
 CREATE INDEX IF NOT EXISTS idx_products_status ON products (status);
 CREATE INDEX IF NOT EXISTS idx_products_created_at ON products (created_at);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id);
+-- 游標分頁：(排序欄位, id) 複合索引
+CREATE INDEX IF NOT EXISTS idx_products_status_created ON products (status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_products_status_price ON products (status, price, id);
+CREATE INDEX IF NOT EXISTS idx_products_status_views ON products (status, view_count, id);
+CREATE INDEX IF NOT EXISTS idx_products_status_trending ON products (status, trending_score, id);
+CREATE INDEX IF NOT EXISTS idx_products_trending_updated ON products (trending_updated_at);
+CREATE INDEX IF NOT EXISTS idx_products_user_created ON products (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector);
+
+-- 新增或更新 search_tokens 時自動重新計算 search_vector
+DROP TRIGGER IF EXISTS trg_products_search_vector ON products;
+CREATE TRIGGER trg_products_search_vector
+    BEFORE INSERT OR UPDATE OF search_tokens ON products
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', search_tokens);
+
+CREATE TABLE IF NOT EXISTS product_lsh_buckets (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    band       SMALLINT NOT NULL,
+    user_id    INTEGER NOT NULL REFERENCES users(id),
+    bucket     BIGINT NOT NULL,
+    PRIMARY KEY (product_id, band)
+);
+
+-- 同一賣家的近似重複查詢：WHERE user_id = ? AND bucket IN (...)
+CREATE INDEX IF NOT EXISTS idx_product_lsh_buckets_lookup ON product_lsh_buckets (user_id, bucket);
 
 CREATE TABLE IF NOT EXISTS product_images (
     id          SERIAL PRIMARY KEY,
@@ -61,10 +102,24 @@ CREATE TABLE IF NOT EXISTS product_images (
     image_url   VARCHAR(255) NOT NULL,
     is_primary  BOOLEAN NOT NULL DEFAULT FALSE,
     sort_order  INTEGER NOT NULL DEFAULT 0,
+    status      VARCHAR(20) NOT NULL DEFAULT 'ready',
+    source_url  VARCHAR(255),
+    -- status：processing（原始檔 source_url 等待背景處理）→ ready / failed
+    renditions  JSON,
+    -- renditions：多尺寸版本 [{"width": 160, "jpeg": url, "webp": url}, ...]
     created_at  TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_product_images_product ON product_images (product_id);
+CREATE INDEX IF NOT EXISTS idx_product_images_status ON product_images (status);
+
+-- 內容定址儲存的圖片檔案（/static/uploads/products/ab/cd/<sha256>.jpg）與參考計數
+CREATE TABLE IF NOT EXISTS stored_files (
+    url        VARCHAR(255) PRIMARY KEY,
+    ref_count  INTEGER NOT NULL DEFAULT 0,
+    size       INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
 
 CREATE TABLE IF NOT EXISTS transactions (
     id               SERIAL PRIMARY KEY,
@@ -93,6 +148,7 @@ CREATE TABLE IF NOT EXISTS transactions (
 CREATE INDEX IF NOT EXISTS idx_transactions_product ON transactions (product_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_buyer ON transactions (buyer_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_seller ON transactions (seller_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions (created_at);
 
 CREATE TABLE IF NOT EXISTS messages (
     id          SERIAL PRIMARY KEY,
@@ -106,6 +162,24 @@ CREATE TABLE IF NOT EXISTS messages (
 
 CREATE INDEX IF NOT EXISTS idx_messages_receiver_read ON messages (receiver_id, is_read);
 CREATE INDEX IF NOT EXISTS idx_messages_product ON messages (product_id);
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_pair_created ON messages (sender_id, receiver_id, created_at, id);
+
+-- 對話摘要（反正規化自 messages，以排序後的使用者配對為主鍵，由 MessageService 於同一交易中維護）
+CREATE TABLE IF NOT EXISTS conversations (
+    user_low_id       INTEGER NOT NULL REFERENCES users(id),
+    user_high_id      INTEGER NOT NULL REFERENCES users(id),
+    last_message_id   INTEGER REFERENCES messages(id) ON DELETE SET NULL,
+    last_message_at   TIMESTAMP,
+    low_unread_count  INTEGER NOT NULL DEFAULT 0,
+    high_unread_count INTEGER NOT NULL DEFAULT 0,
+    created_at        TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_low_id, user_high_id),
+    CONSTRAINT chk_conversation_pair CHECK (user_low_id < user_high_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_low_last ON conversations (user_low_id, last_message_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_high_last ON conversations (user_high_id, last_message_at);
 
 CREATE TABLE IF NOT EXISTS notifications (
     id         SERIAL PRIMARY KEY,
@@ -119,6 +193,16 @@ CREATE TABLE IF NOT EXISTS notifications (
 
 CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications (user_id, is_read);
 
+-- 使用者計數（未讀訊息、未讀通知、待處理交易、上架商品），寫入時以變更量更新，reconcile-counters 修正漂移
+CREATE TABLE IF NOT EXISTS user_counters (
+    user_id              INTEGER PRIMARY KEY REFERENCES users(id),
+    unread_messages      INTEGER NOT NULL DEFAULT 0,
+    unread_notifications INTEGER NOT NULL DEFAULT 0,
+    pending_transactions INTEGER NOT NULL DEFAULT 0,
+    active_listings      INTEGER NOT NULL DEFAULT 0,
+    updated_at           TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
 CREATE TABLE IF NOT EXISTS reviews (
     id             SERIAL PRIMARY KEY,
     transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
@@ -133,4 +217,21 @@ CREATE TABLE IF NOT EXISTS reviews (
 CREATE INDEX IF NOT EXISTS idx_reviews_reviewee ON reviews (reviewee_id);
 CREATE INDEX IF NOT EXISTS idx_reviews_transaction ON reviews (transaction_id);
 
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id               SERIAL PRIMARY KEY,
+    user_id          INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    keyword          VARCHAR(200),
+    category_id      INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+    condition        VARCHAR(20),
+    min_price        NUMERIC(10, 2),
+    max_price        NUMERIC(10, 2),
+    index_term       VARCHAR(100) NOT NULL,
+    -- index_term：反向索引鍵（關鍵字中最具辨識度的詞元，或 category:<id>、price:<level>:<k>、condition:<狀況>）
+    last_notified_at TIMESTAMP,
+    created_at       TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches (user_id);
+CREATE INDEX IF NOT EXISTS idx_saved_searches_index_term ON saved_searches (index_term);
+
 COMMIT;
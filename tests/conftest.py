@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db as _db
+from app.models.user import User
+from app.models.category import Category
+from app.models.product import Product
+
+
+@pytest.fixture(scope='session')
+def app():
+    """測試用應用程式（TestingConfig：SQLite 記憶體資料庫）"""
+    app = create_app('testing')
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """每個測試使用全新的資料表"""
+    with app.app_context():
+        _db.create_all()
+        yield _db
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def uploads(app, tmp_path, monkeypatch):
+    """將上傳檔案（UPLOAD_FOLDER 與 /static/ URL 對應的路徑）導向暫存目錄"""
+    app.jinja_loader  # 樣板載入器依 root_path 建立並快取，需在替換前建立
+    monkeypatch.setattr(app, 'root_path', str(tmp_path))
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path / 'static' / 'uploads'))
+    return tmp_path / 'static' / 'uploads'
+
+
+@pytest.fixture
+def seller(db):
+    user = User(email='seller@example.edu.tw', username='seller')
+    user.set_password('abc12345')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def make_user(db):
+    """建立使用者的工廠函數（不需登入，略過密碼雜湊）"""
+    def make(name, **kwargs):
+        user = User(email=f'{name}@example.edu.tw', username=name, password_hash='-', **kwargs)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def category(db):
+    category = Category(name='書籍', sort_order=0)
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+
+@pytest.fixture
+def make_product(db, seller, category):
+    """建立商品的工廠函數"""
+    def make(**kwargs):
+        values = {
+            'user_id': seller.id,
+            'category_id': category.id,
+            'title': '微積分課本',
+            'description': '九成新',
+            'price': 100,
+            'condition': 'good',
+            'status': 'active',
+        }
+        values.update(kwargs)
+        product = Product(**values)
+        db.session.add(product)
+        db.session.commit()
+        return product
+    return make
+
+
+@pytest.fixture
+def count_queries(db):
+    """計算區塊內執行的 SQL 陳述式：with count_queries() as statements: ..."""
+    @contextmanager
+    def count():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return count
@@ -0,0 +1,79 @@
+import pytest
+from app.models.category import Category
+from app.services.category_service import CategoryRegistry
+from app.services.product_service import ProductService
+
+
+def test_registry_survives_concurrent_invalidate(db):
+    """載入後、查詢前被其他執行緒清除快取（after_commit）時，查詢仍使用已載入的快照"""
+    parent = Category(name='書籍', sort_order=0)
+    db.session.add(parent)
+    db.session.flush()
+    child = Category(name='教科書', parent_id=parent.id, sort_order=1)
+    db.session.add(child)
+    db.session.commit()
+
+    registry = CategoryRegistry()
+    ensure_loaded = registry._ensure_loaded
+
+    def ensure_loaded_then_invalidate():
+        snapshot = ensure_loaded()
+        registry.invalidate()
+        return snapshot
+
+    registry._ensure_loaded = ensure_loaded_then_invalidate
+
+    assert registry.get(parent.id).name == '書籍'
+    assert [node.id for node in registry.children(parent.id)] == [child.id]
+    assert registry.descendant_ids(parent.id) == {parent.id, child.id}
+    assert [node.id for node in registry.roots()] == [parent.id]
+
+
+def make_tree(db):
+    """二手書 > 教科書 > 數學；另有 3C 分類"""
+    books = Category(name='二手書', sort_order=0)
+    gadgets = Category(name='3C', sort_order=1)
+    db.session.add_all([books, gadgets])
+    db.session.flush()
+    textbooks = Category(name='教科書', parent_id=books.id)
+    db.session.add(textbooks)
+    db.session.flush()
+    math = Category(name='數學', parent_id=textbooks.id)
+    db.session.add(math)
+    db.session.commit()
+    return books, textbooks, math, gadgets
+
+
+def test_paths_follow_moves(db):
+    books, textbooks, math, gadgets = make_tree(db)
+    assert math.path == f'/{books.id}/{textbooks.id}/{math.id}/'
+
+    # 移動分類時整棵子樹的路徑一起改寫
+    textbooks.parent_id = gadgets.id
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(Category, math.id).path == f'/{gadgets.id}/{textbooks.id}/{math.id}/'
+
+
+def test_cannot_move_category_under_its_descendant(db):
+    books, textbooks, math, _ = make_tree(db)
+    books.parent_id = math.id
+    with pytest.raises(ValueError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_subtree_filter_includes_descendants(db, make_product):
+    books, textbooks, math, gadgets = make_tree(db)
+    in_books = make_product(category_id=books.id)
+    in_math = make_product(category_id=math.id)
+    make_product(category_id=gadgets.id)
+
+    def ids(category_id, include_descendants):
+        return {p.id for p in ProductService.get_products(
+            category_id=category_id, include_descendants=include_descendants
+        ).items}
+
+    assert ids(books.id, True) == {in_books.id, in_math.id}
+    assert ids(books.id, False) == {in_books.id}
+    assert ids(textbooks.id, True) == {in_math.id}
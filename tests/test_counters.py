@@ -0,0 +1,56 @@
+from sqlalchemy import event, update
+from app.models.user_counter import UserCounter, apply_counter_deltas
+from app.services.counter_service import CounterService
+from app.services.message_service import MessageService
+from app.services.notification_service import NotificationService
+
+
+def test_counters_follow_messages_and_notifications(db, seller, make_user):
+    buyer = make_user('buyer')
+    MessageService.send_message(buyer.id, seller.id, '請問還有嗎？')
+    MessageService.send_message(buyer.id, seller.id, '可以面交嗎？')
+    NotificationService.create_notification(seller.id, 'system', '歡迎使用')
+    # 每則訊息另外產生一則通知
+    assert CounterService.get_counts(seller.id) == {
+        'unread_messages': 2, 'unread_notifications': 3, 'pending_transactions': 0, 'active_listings': 0
+    }
+
+    MessageService.mark_conversation_as_read(seller.id, buyer.id)
+    NotificationService.mark_all_as_read(seller.id)
+    assert CounterService.get_counts(seller.id)['unread_messages'] == 0
+    assert CounterService.get_counts(seller.id)['unread_notifications'] == 0
+
+
+def test_deltas_are_applied_in_user_order(db, make_user):
+    """多位使用者的計數以一個陳述式依 user_id 順序更新（並行交易取得列鎖的順序一致）"""
+    users = [make_user(f'user{i}') for i in range(4)]
+    deltas = {user.id: {'unread_notifications': 1} for user in reversed(users)}
+
+    upserts = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'user_counters' in statement:
+            upserts.append(parameters)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        with db.engine.begin() as connection:
+            counts = apply_counter_deltas(connection, deltas)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert len(upserts) == 1
+    width = len(UserCounter.__table__.columns)
+    assert list(upserts[0][::width]) == sorted(deltas)
+    assert all(count['unread_notifications'] == 1 for count in counts.values())
+
+
+def test_reconcile_repairs_drift(db, seller, make_user):
+    buyer = make_user('buyer')
+    MessageService.send_message(buyer.id, seller.id, '請問還有嗎？')
+    db.session.execute(update(UserCounter).values(unread_messages=5))
+    db.session.commit()
+
+    assert CounterService.reconcile() == {'checked': 1, 'repaired': 1}
+    assert CounterService.get(seller.id, 'unread_messages') == 1
+    assert CounterService.reconcile()['repaired'] == 0
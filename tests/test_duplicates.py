@@ -0,0 +1,61 @@
+import pytest
+from app.services.product_service import ProductService
+
+TITLE = '二手微積分課本 第三版'
+DESCRIPTION = '上課用過一學期，內頁有少量筆記，書況良好'
+
+
+@pytest.fixture
+def create(seller, category):
+    def create(title=TITLE, description=DESCRIPTION):
+        return ProductService.create_product(
+            seller.id, title, description, 200, category.id, 'good', None, None
+        )
+    return create
+
+
+def test_flag_is_default_and_ranks_duplicate_lower(app, create):
+    """預設標記近似重複（同一商品多件仍可刊登），搜尋時排在原商品之後"""
+    assert app.config['DUPLICATE_LISTING_ACTION'] == 'flag'
+    _, original = create()
+    success, duplicate = create()
+    assert success
+    assert duplicate.duplicate_of_id == original.id
+
+    page = ProductService.get_products(search='微積分', sort_by='relevance')
+    assert [p.id for p in page.items] == [original.id, duplicate.id]
+
+
+def test_block_rejects_duplicate(app, create, monkeypatch):
+    monkeypatch.setitem(app.config, 'DUPLICATE_LISTING_ACTION', 'block')
+    _, original = create()
+    success, error = create()
+    assert not success
+    assert f'#{original.id}' in error
+
+
+def test_edit_into_duplicate_is_checked(app, create, seller, monkeypatch):
+    """先刊登不同的商品再編輯成重複，同樣會被標記或拒絕"""
+    _, original = create()
+    _, other = create('電子辭典 卡西歐', '附保護套與充電線，螢幕無刮傷')
+    assert other.duplicate_of_id is None
+
+    success, product = ProductService.update_product(
+        other.id, seller.id, title=TITLE, description=DESCRIPTION
+    )
+    assert success
+    assert product.duplicate_of_id == original.id
+
+    # 改回不同內容時清除標記
+    success, product = ProductService.update_product(
+        other.id, seller.id, title='電子辭典 卡西歐', description='附保護套與充電線，螢幕無刮傷'
+    )
+    assert product.duplicate_of_id is None
+
+    monkeypatch.setitem(app.config, 'DUPLICATE_LISTING_ACTION', 'block')
+    success, error = ProductService.update_product(
+        other.id, seller.id, title=TITLE, description=DESCRIPTION
+    )
+    assert not success
+    assert f'#{original.id}' in error
+    assert ProductService.get_product_by_id(other.id).title == '電子辭典 卡西歐'
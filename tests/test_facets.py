@@ -0,0 +1,81 @@
+from app.models.user import User
+from app.services.product_service import ProductService, facet_cache, seller_facet_cache
+
+
+def test_facets_are_shared_and_exclude_own_products(db, make_product, seller, category):
+    """面向數量所有使用者共用一份快取，各自的商品再從結果扣除"""
+    ProductService.invalidate_listing_cache()
+    other = User(email='other@example.edu.tw', username='other', password_hash='-')
+    db.session.add(other)
+    db.session.commit()
+
+    make_product(condition='good', price=150)
+    make_product(condition='new', price=150)
+    make_product(user_id=other.id, condition='good', price=150)
+
+    anonymous = ProductService.get_facets()
+    as_seller = ProductService.get_facets(exclude_user_id=seller.id)
+    as_other = ProductService.get_facets(exclude_user_id=other.id)
+
+    assert len(facet_cache) == 1
+    assert anonymous['category'] == {category.id: 3}
+    assert as_seller['category'] == {category.id: 1}
+    assert as_seller['condition'] == {'good': 1}
+    assert as_other['condition'] == {'good': 1, 'new': 1}
+    assert [bucket['count'] for bucket in as_seller['price']][1] == 1
+
+    # 共用結果不受扣除影響
+    assert ProductService.get_facets()['category'] == {category.id: 3}
+
+
+def test_own_facets_are_cached_per_seller(db, make_product, seller, monkeypatch):
+    """登入使用者每次瀏覽首頁不再重新查詢自己的商品數量"""
+    ProductService.invalidate_listing_cache()
+    make_product(condition='good', price=150)
+
+    calls = []
+    compute = ProductService._compute_facets
+
+    def counting_compute(*args, **kwargs):
+        calls.append(kwargs.get('user_id'))
+        return compute(*args, **kwargs)
+
+    monkeypatch.setattr(ProductService, '_compute_facets', staticmethod(counting_compute))
+    for _ in range(3):
+        ProductService.get_facets(exclude_user_id=seller.id)
+    assert calls == [None, seller.id]
+    assert len(seller_facet_cache) == 1
+
+    # 商品變更時一併清除
+    make_product(condition='new', price=150)
+    ProductService.invalidate_listing_cache()
+    assert ProductService.get_facets(exclude_user_id=seller.id)['category'] == {}
+    assert calls == [None, seller.id, None, seller.id]
+
+
+def test_price_bucket_counts_match_filter_links(db, make_product):
+    """每個價格區間的數量等於連結（min_price / max_price，兩端皆包含）篩選出的商品數"""
+    ProductService.invalidate_listing_cache()
+    for price in (0, 50, 100, 100, 499, 500, 1200, 5000, 9000):
+        make_product(price=price)
+
+    buckets = ProductService.get_facets()['price']
+    for bucket in buckets:
+        results = ProductService.get_products(
+            min_price=bucket['min'], max_price=bucket['max'], per_page=100
+        )
+        assert bucket['count'] == results.total, bucket
+    assert [bucket['count'] for bucket in buckets] == [4, 4, 1, 2, 2]
+
+
+def test_each_facet_ignores_its_own_filter(db, make_product, category):
+    """面向數量套用其他面向的篩選，但不套用自己的（已選擇的狀況仍顯示其他狀況的數量）"""
+    ProductService.invalidate_listing_cache()
+    make_product(condition='good', price=150)
+    make_product(condition='new', price=150)
+    make_product(condition='new', price=2000)
+
+    facets = ProductService.get_facets(condition='new', max_price=1000)
+    assert facets['condition'] == {'good': 1, 'new': 1}
+    assert facets['category'] == {category.id: 1}
+    assert [bucket['count'] for bucket in facets['price']] == [0, 1, 0, 1, 0]
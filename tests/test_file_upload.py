@@ -0,0 +1,129 @@
+import io
+import os
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from app.models.stored_file import StoredFile
+from app.utils.file_upload import (
+    FileUploadService, estimate_decoded_size, open_bounded_image, process_product_image
+)
+
+
+def save_image(path, size, mode='RGB', color=(40, 120, 200)):
+    Image.new(mode, size, color).save(path)
+    return str(path)
+
+
+def test_renditions_in_each_width_and_format(tmp_path):
+    source = save_image(tmp_path / 'source.jpg', (1200, 900))
+    renditions = process_product_image(source, str(tmp_path), (160, 400, 800))
+
+    assert [r['width'] for r in renditions] == [160, 400, 800]
+    for rendition in renditions:
+        for key, fmt in (('jpeg', 'JPEG'), ('webp', 'WEBP')):
+            with Image.open(tmp_path / rendition[key]) as img:
+                assert img.format == fmt
+                assert img.size == (rendition['width'], rendition['width'] * 3 // 4)
+
+
+def test_small_image_is_not_upscaled(tmp_path):
+    """原圖比輸出尺寸小時只輸出到原圖大小為止"""
+    source = save_image(tmp_path / 'source.png', (300, 200))
+    renditions = process_product_image(source, str(tmp_path), (160, 400, 800))
+    assert [r['width'] for r in renditions] == [160, 300]
+
+
+def test_transparent_png_gets_white_background(tmp_path):
+    source = save_image(tmp_path / 'source.png', (200, 200), 'RGBA', (0, 0, 0, 0))
+    renditions = process_product_image(source, str(tmp_path), (160,))
+    with Image.open(os.path.join(tmp_path, renditions[0]['jpeg'])) as img:
+        assert img.mode == 'RGB'
+        assert img.getpixel((80, 80)) == (255, 255, 255)
+
+
+def test_srcset_lists_renditions(app):
+    srcset = app.jinja_env.filters['srcset']
+    renditions = [{'width': 160, 'jpeg': '/a.jpg', 'webp': '/a.webp'}, {'width': 400, 'jpeg': '/b.jpg'}]
+    assert srcset(renditions, 'webp') == '/a.webp 160w'
+    assert srcset(renditions) == '/a.jpg 160w, /b.jpg 400w'
+
+
+def test_identical_images_share_files_until_last_reference(db, uploads, tmp_path):
+    """內容相同的圖片只存一份；最後一個參考釋放且提交後才刪除檔案，回滾時保留"""
+    source = save_image(tmp_path / 'source.jpg', (600, 450))
+    first = FileUploadService.save_product_image(source, (160, 400))
+    second = FileUploadService.save_product_image(source, (160, 400))
+    db.session.commit()
+
+    assert first == second
+    image_url, renditions = first
+    assert FileUploadService.is_content_addressed(image_url)
+    urls = {url for r in renditions for key, url in r.items() if key != 'width'}
+    assert {f.url: f.ref_count for f in StoredFile.query.all()} == dict.fromkeys(urls, 2)
+
+    def exists():
+        return all(os.path.exists(FileUploadService.url_to_path(url)) for url in urls)
+
+    FileUploadService.delete_product_image(image_url, renditions)
+    db.session.commit()
+    assert exists()
+
+    FileUploadService.delete_product_image(image_url, renditions)
+    db.session.rollback()
+    assert exists()
+    assert {f.ref_count for f in StoredFile.query.all()} == {1}
+
+    FileUploadService.delete_product_image(image_url, renditions)
+    db.session.commit()
+    assert StoredFile.query.count() == 0
+    assert not any(os.path.exists(FileUploadService.url_to_path(url)) for url in urls)
+
+
+def test_pixel_limit_rejects_before_decoding(tmp_path, monkeypatch):
+    """只讀檔頭就以像素數拒絕，不解碼像素資料"""
+    source = save_image(tmp_path / 'source.png', (400, 300))
+    monkeypatch.setattr(Image.Image, 'load', lambda self: pytest.fail('不應解碼'))
+    with pytest.raises(ValueError):
+        open_bounded_image(source, 800, max_pixels=100_000)
+
+
+def test_jpeg_is_reduced_while_decoding(tmp_path):
+    """JPEG 以 draft 在解碼時縮小，但不小於需要的尺寸"""
+    source = save_image(tmp_path / 'source.jpg', (2000, 1500))
+    img = open_bounded_image(source, 400)
+    assert img.size == (500, 375)
+    assert open_bounded_image(source, 800).size == (1000, 750)
+
+
+def test_memory_budget_rejects_large_png(tmp_path):
+    """PNG 無法在解碼時縮小，超過記憶體上限即拒絕"""
+    source = save_image(tmp_path / 'source.png', (1000, 1000), 'RGBA')
+    with pytest.raises(ValueError):
+        open_bounded_image(source, 400, memory_budget=1024 * 1024)
+    assert open_bounded_image(source, 400, memory_budget=16 * 1024 * 1024).size == (1000, 1000)
+
+
+def test_progressive_jpeg_counts_full_resolution_coefficients(tmp_path):
+    baseline = tmp_path / 'baseline.jpg'
+    progressive = tmp_path / 'progressive.jpg'
+    Image.new('RGB', (2000, 1500)).save(baseline)
+    Image.new('RGB', (2000, 1500)).save(progressive, progressive=True)
+
+    sizes = [estimate_decoded_size(open_bounded_image(str(path), 400), (2000, 1500))
+             for path in (baseline, progressive)]
+    assert sizes[1] > sizes[0] + 2000 * 1500
+
+
+def test_oversized_upload_is_rejected_without_saving(app, uploads, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_MAX_PIXELS', 100_000)
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 300)).save(buffer, 'JPEG')
+    buffer.seek(0)
+
+    with app.test_request_context('/'):
+        success, error = FileUploadService.store_raw_product_image(
+            FileStorage(buffer, filename='big.jpg')
+        )
+    assert not success
+    assert '解析度過高' in error
+    assert not (uploads / 'products' / 'incoming').exists()
@@ -0,0 +1,51 @@
+import pytest
+from app.services.product_service import ProductService
+from app.utils.fragments import product_card_cache, render_product_card
+
+
+@pytest.fixture
+def card_cache(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PRODUCT_CARD_CACHE_SIZE', 16)
+    product_card_cache.clear()
+    yield product_card_cache
+    product_card_cache.clear()
+
+
+def render(app, product):
+    with app.test_request_context('/'):
+        return str(render_product_card(product))
+
+
+def test_card_is_rendered_once_until_product_changes(app, db, seller, make_product, card_cache, monkeypatch):
+    product = make_product(title='微積分課本')
+    calls = []
+    template = app.jinja_env.get_template('components/product_card_body.html')
+    original = template.render
+    monkeypatch.setattr(template, 'render', lambda **context: calls.append(1) or original(**context))
+
+    first = render(app, product)
+    assert render(app, product) == first
+    assert len(calls) == 1
+
+    # 更新商品（updated_at 改變）後重新渲染，並覆蓋同一筆快取
+    success, product = ProductService.update_product(product.id, seller.id, title='線性代數課本')
+    assert success
+    assert '線性代數課本' in render(app, product)
+    assert len(calls) == 2
+    assert len(card_cache) == 1
+
+
+def test_seller_rename_invalidates_card(app, db, seller, make_product, card_cache):
+    product = make_product()
+    assert 'seller' in render(app, product)
+
+    seller.username = 'bookworm'
+    db.session.commit()
+    assert 'bookworm' in render(app, product)
+
+
+def test_cache_disabled(app, make_product, monkeypatch):
+    monkeypatch.setitem(app.config, 'PRODUCT_CARD_CACHE_SIZE', 0)
+    product_card_cache.clear()
+    render(app, make_product())
+    assert len(product_card_cache) == 0
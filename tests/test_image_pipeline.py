@@ -0,0 +1,57 @@
+import os
+import pytest
+from PIL import Image
+from app.models.product_image import ProductImage
+from app.models.stored_file import StoredFile
+from app.services.product_service import ProductService
+from app.utils.file_upload import FileUploadService, process_product_image
+
+
+@pytest.fixture
+def processing_image(uploads, db, make_product, tmp_path):
+    source = tmp_path / 'source.jpg'
+    Image.new('RGB', (400, 300), (200, 40, 40)).save(source)
+
+    product = make_product()
+    product_image = ProductImage(
+        product_id=product.id, image_url='/static/uploads/products/source.jpg',
+        is_primary=True, status=ProductImage.STATUS_PROCESSING
+    )
+    db.session.add(product_image)
+    db.session.commit()
+    return product_image.id, str(source)
+
+
+def process(source):
+    output_dir = FileUploadService.make_processing_dir()
+    return output_dir, process_product_image(source, output_dir, (160, 400))
+
+
+def test_duplicate_completion_is_discarded(db, processing_image):
+    """重複的處理工作完成時不再儲存檔案或增加參考計數"""
+    image_id, source = processing_image
+
+    first_dir, renditions = process(source)
+    ProductService.image_processed(image_id, None, first_dir, renditions)
+    product_image = db.session.get(ProductImage, image_id)
+    assert product_image.status == ProductImage.STATUS_READY
+    refs = {f.url: f.ref_count for f in StoredFile.query.all()}
+    assert refs and set(refs.values()) == {1}
+
+    second_dir, renditions = process(source)
+    ProductService.image_processed(image_id, None, second_dir, renditions)
+    assert {f.url: f.ref_count for f in StoredFile.query.all()} == refs
+    assert not os.path.exists(second_dir)
+
+
+def test_late_failure_does_not_overwrite_ready_image(db, processing_image):
+    """已完成的圖片不會被重複工作的失敗結果標記為失敗"""
+    image_id, source = processing_image
+
+    output_dir, renditions = process(source)
+    ProductService.image_processed(image_id, None, output_dir, renditions)
+    ProductService.image_processed(image_id, '找不到原始檔')
+
+    product_image = db.session.get(ProductImage, image_id)
+    assert product_image.status == ProductImage.STATUS_READY
+    assert product_image.product.primary_image_url == product_image.image_url
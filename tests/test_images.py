@@ -0,0 +1,79 @@
+import io
+import os
+import pytest
+from PIL import Image
+from app.extensions import image_cache
+from app.utils.file_upload import FileUploadService
+from app.utils.image_cache import ResizedImageCache
+
+
+@pytest.fixture
+def cache(app, tmp_path, monkeypatch):
+    """將動態縮圖快取導向暫存目錄"""
+    monkeypatch.setattr(image_cache, 'folder', str(tmp_path / 'cache'))
+    monkeypatch.setattr(image_cache, '_entries', None)
+    return image_cache
+
+
+@pytest.fixture
+def stored_image(db, uploads, tmp_path):
+    source = tmp_path / 'source.jpg'
+    Image.new('RGB', (1200, 900), (40, 120, 200)).save(source)
+    image_url, _ = FileUploadService.save_product_image(str(source))
+    db.session.commit()
+    return image_url
+
+
+def test_resizes_stored_rendition(app, cache, stored_image):
+    response = app.test_client().get(f'/img/160x160/{stored_image[len("/static/"):]}')
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.data)).size == (160, 120)
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_rejects_sizes_above_largest_rendition(app, cache, stored_image, monkeypatch):
+    """原圖處理後即刪除，超過最大版本的尺寸只能放大，一律拒絕"""
+    assert max(app.config['PRODUCT_IMAGE_WIDTHS']) == 800
+    monkeypatch.setattr(cache, 'sizes', cache.sizes | {(1200, 1200)})
+    assert app.test_client().get(f'/img/1200x1200/{stored_image[len("/static/"):]}').status_code == 404
+    assert app.test_client().get(f'/img/800x800/{stored_image[len("/static/"):]}').status_code == 200
+
+
+def test_rejects_unprocessed_uploads(app, cache, uploads):
+    """尚未處理的原始上傳（仍含 EXIF）不能經由動態縮圖讀取"""
+    incoming = uploads / 'products' / 'incoming'
+    incoming.mkdir(parents=True)
+    Image.new('RGB', (400, 300)).save(incoming / 'raw.jpg')
+
+    assert app.test_client().get('/img/160x160/uploads/products/incoming/raw.jpg').status_code == 404
+
+
+def test_cache_evicts_least_recently_used(app, tmp_path):
+    source = tmp_path / 'source.jpg'
+    Image.new('RGB', (400, 300), (200, 40, 40)).save(source)
+
+    sizes = ResizedImageCache(app)
+    sizes.folder = str(tmp_path / 'sizes')
+    large_size = os.path.getsize(sizes.get(str(source), 200, 200)[0])
+
+    cache = ResizedImageCache(app)
+    cache.folder = str(tmp_path / 'cache')
+    small, _ = cache.get(str(source), 96, 96)
+    medium, _ = cache.get(str(source), 160, 160)
+    cache.get(str(source), 96, 96)  # 命中時移到最近使用
+
+    # 超過上限時由最久未使用的 medium 開始刪除
+    cache.max_bytes = os.path.getsize(small) + os.path.getsize(medium) + large_size - 1
+    large, _ = cache.get(str(source), 200, 200)
+    assert os.path.exists(small) and os.path.exists(large)
+    assert not os.path.exists(medium)
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == os.path.getsize(small) + os.path.getsize(large)
+
+    # 重新啟動時依 mtime 還原快取內容
+    restored = ResizedImageCache(app)
+    restored.folder = cache.folder
+    assert restored.stats()['files'] == 0
+    restored.get(str(source), 96, 96)
+    assert restored.stats()['hits'] == 1
+    assert restored.stats()['files'] == 2
@@ -0,0 +1,149 @@
+import io
+import zipfile
+import pytest
+from PIL import Image
+from app.services.counter_service import CounterService
+from app.services.import_service import ProductImportService
+from app.utils.file_upload import FileUploadService
+
+
+@pytest.fixture
+def import_app(app, uploads):
+    return app
+
+
+def import_csv(seller, rows, **kwargs):
+    text = 'title,description,price,category,condition,images\n'
+    text += ''.join(f'商品{i},說明,100,書籍,good,{images}\n' for i, images in enumerate(rows))
+    return ProductImportService.import_products(seller.id, io.BytesIO(text.encode()), 'csv', **kwargs)
+
+
+def test_zip_image_over_size_limit_is_rejected_before_reading(import_app, seller, category, monkeypatch):
+    """壓縮檔內解壓縮後過大的圖片不會讀入記憶體"""
+    monkeypatch.setitem(import_app.config, 'MAX_CONTENT_LENGTH', 1024 * 1024)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('bomb.jpg', b'\0' * (8 * 1024 * 1024))
+
+    # 匯入時以 ZipFile.open 讀取壓縮檔內的檔案
+    read = []
+    zip_open = zipfile.ZipFile.open
+
+    def tracking_open(self, name, mode='r', *args, **kwargs):
+        if mode == 'r':
+            read.append(getattr(name, 'filename', name))
+        return zip_open(self, name, mode, *args, **kwargs)
+
+    monkeypatch.setattr(zipfile.ZipFile, 'open', tracking_open)
+
+    success, report = import_csv(seller, ['bomb.jpg'], archive=archive)
+    assert success
+    assert report['created'] == 0
+    assert '圖片檔案過大' in report['errors'][0]['error']
+    assert read == []
+
+    # 大小在上限內的圖片才會讀取
+    monkeypatch.setitem(import_app.config, 'MAX_CONTENT_LENGTH', 16 * 1024 * 1024)
+    import_csv(seller, ['bomb.jpg'], archive=archive)
+    assert read == ['bomb.jpg']
+
+
+def test_images_are_submitted_with_bounded_in_flight(import_app, seller, category, tmp_path, monkeypatch):
+    """圖片依序送入執行緒池，未取回結果的圖片數不超過 workers * 2"""
+    image_root = tmp_path / 'images'
+    image_root.mkdir()
+    for i in range(12):
+        Image.new('RGB', (64, 48), (i * 20, 0, 0)).save(image_root / f'p{i}.jpg')
+
+    opened, stored, in_flight = [], [], []
+    open_source = ProductImportService._open_image_source
+    store_renditions = FileUploadService.store_renditions
+
+    def tracking_open(*args, **kwargs):
+        opened.append(args[0])
+        in_flight.append(len(opened) - len(stored))
+        return open_source(*args, **kwargs)
+
+    def tracking_store(*args, **kwargs):
+        stored.append(args[0])
+        return store_renditions(*args, **kwargs)
+
+    monkeypatch.setattr(ProductImportService, '_open_image_source', staticmethod(tracking_open))
+    monkeypatch.setattr(FileUploadService, 'store_renditions', staticmethod(tracking_store))
+
+    rows = ['|'.join(f'p{i * 3 + j}.jpg' for j in range(3)) for i in range(4)]
+    success, report = import_csv(seller, rows, image_root=str(image_root), workers=1)
+
+    assert success and report['created'] == 4, report['errors']
+    assert len(opened) == 12
+    assert max(in_flight) <= 2
+
+
+def test_background_import_defers_image_processing(import_app, db, seller, category, tmp_path, monkeypatch):
+    """網頁匯入只儲存原始圖片，縮放與編碼交給背景的圖片處理流程"""
+    from app.extensions import image_pipeline
+    from app.models.product_image import ProductImage
+
+    image_root = tmp_path / 'images'
+    image_root.mkdir()
+    for i in range(2):
+        Image.new('RGB', (64, 48), (i * 80, 0, 0)).save(image_root / f'p{i}.jpg')
+
+    submitted = []
+    monkeypatch.setattr(image_pipeline, 'submit', lambda image_id, *args: submitted.append(image_id))
+    monkeypatch.setattr(
+        ProductImportService, '_process_image',
+        staticmethod(lambda *args: pytest.fail('圖片不應在匯入時處理'))
+    )
+
+    success, report = import_csv(
+        seller, ['p0.jpg|p1.jpg', 'missing.jpg'], image_root=str(image_root), background_images=True
+    )
+    assert success and report['created'] == 1
+    assert report['images_queued'] == 2
+    assert '找不到圖片' in report['errors'][0]['error']
+
+    images = ProductImage.query.order_by(ProductImage.sort_order).all()
+    assert [image.id for image in images] == submitted
+    assert all(image.status == ProductImage.STATUS_PROCESSING for image in images)
+    assert all('/incoming/' in image.source_url for image in images)
+    assert images[0].product.primary_image_url is None
+    assert images[0].product.trending_score > 0  # 刊登時即有熱門度分數
+    assert CounterService.get(seller.id, 'active_listings') == 1
+
+
+def test_bulk_import_endpoint_uses_background_pipeline(import_app, db, seller, category, monkeypatch):
+    """背景處理流程完成後圖片與主圖就緒（測試設定以同步模式執行處理流程）"""
+    from app.models.product import Product
+
+    archive = io.BytesIO()
+    image = io.BytesIO()
+    Image.new('RGB', (64, 48), (200, 0, 0)).save(image, 'JPEG')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('p0.jpg', image.getvalue())
+    archive.seek(0)
+
+    background = []
+    import_products = ProductImportService.import_products
+
+    def tracking_import(*args, **kwargs):
+        background.append(kwargs.get('background_images'))
+        return import_products(*args, **kwargs)
+
+    monkeypatch.setattr(ProductImportService, 'import_products', staticmethod(tracking_import))
+
+    client = import_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(seller.id)
+    csv_file = io.BytesIO('title,description,price,category,condition,images\n檯燈,說明,100,書籍,good,p0.jpg\n'.encode())
+    response = client.post('/products/import', data={
+        'file': (csv_file, 'products.csv'),
+        'images': (archive, 'images.zip')
+    })
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['images_queued'] == 1
+    assert background == [True]
+    product = db.session.get(Product, response.get_json()['product_ids'][0])
+    assert product.images.first().is_ready
+    assert product.primary_image_url == product.images.first().image_url
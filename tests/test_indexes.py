@@ -0,0 +1,69 @@
+from app.services import product_service
+from app.services.product_service import ProductService
+from app.utils.similarity import SimilarityIndex
+from app.utils.suggest import PrefixIndex
+
+
+def test_index_rebuilds_after_max_age(app):
+    """超過 max_age 後 ensure_built 重新載入資料（反映其他 worker 的變更）"""
+    rows = [(1, '二手筆電 ASUS', 10)]
+    index = PrefixIndex(max_age=60)
+    index.ensure_built(app, lambda: list(rows), background=False)
+    assert [item_id for item_id, _ in index.search('二手')] == [1]
+
+    rows.append((2, '二手筆電 Acer', 5))
+    index.ensure_built(app, lambda: list(rows), background=False)
+    assert len(index) == 1  # 尚未過期，不重建
+
+    index.built_at -= 60
+    assert index.stale
+    index.ensure_built(app, lambda: list(rows), background=False)
+    assert len(index) == 2 and not index.stale
+
+
+def test_similar_products_pick_up_products_from_other_workers(app, make_product, monkeypatch):
+    """其他 worker 刊登的商品（本程序沒有 upsert）於索引過期重建後出現在相似商品中"""
+    monkeypatch.setattr(product_service, 'similarity_index', SimilarityIndex())
+    monkeypatch.setitem(app.config, 'SIMILARITY_INDEX_MAX_AGE', 300)
+
+    product = make_product(title='微積分課本 第三版', description='微積分 習題')
+    make_product(title='經濟學原理', description='九成新')
+    ProductService.get_similar_products(product)  # 建立索引
+
+    other = make_product(title='微積分課本 第二版', description='微積分 習題')
+    assert other not in ProductService.get_similar_products(product)
+
+    product_service.similarity_index.built_at -= 300
+    ProductService.get_similar_products(product)  # 過期，重建
+    assert other in ProductService.get_similar_products(product)
+
+
+def rows_with_changes(rows, *changes):
+    """讀取資料列的途中執行變更（模擬重建期間其他請求的 upsert / remove）"""
+    for row in rows:
+        yield row
+    for change in changes:
+        change()
+
+
+def test_changes_during_rebuild_are_replayed():
+    """重建期間的新增與移除在新索引換上後重新套用，不會被較舊的資料覆蓋"""
+    index = PrefixIndex(max_age=60)
+    index.build([(1, '二手筆電 ASUS', 10), (2, '二手筆電 Acer', 5)])
+
+    index.build(rows_with_changes(
+        [(1, '二手筆電 ASUS', 10), (2, '二手筆電 Acer', 5)],
+        lambda: index.remove(1),
+        lambda: index.upsert(3, '二手筆電 MSI', 1)
+    ))
+    assert sorted(item_id for item_id, _ in index.search('二手')) == [2, 3]
+
+
+def test_changes_during_first_build_are_replayed():
+    """索引第一次建立期間（尚未 ready）的新增也不會遺失"""
+    index = SimilarityIndex()
+    index.build(rows_with_changes(
+        [(1, '微積分課本 第三版', '微積分 習題', 1)],
+        lambda: index.upsert(2, '微積分課本 第二版', '微積分 習題', 1)
+    ))
+    assert index.similar(1) == [2]
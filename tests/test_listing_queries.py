@@ -0,0 +1,33 @@
+from app.models.user import User
+from app.services.product_service import ProductService
+from app.utils.fragments import render_product_card
+
+
+def listing_queries(app, db, count_queries, per_page):
+    """取得一頁商品並渲染卡片，回傳執行的陳述式數量"""
+    with app.test_request_context('/'), count_queries() as statements:
+        pagination = ProductService.get_products(per_page=per_page, keyset=True)
+        assert len(pagination.items) == per_page
+        for product in pagination.items:
+            render_product_card(product)
+    db.session.expire_all()
+    return len(statements)
+
+
+def test_listing_query_count_is_constant(app, db, make_product, count_queries, monkeypatch):
+    """列表頁的查詢數不隨每頁商品數增加（主圖與賣家不會逐筆查詢）"""
+    monkeypatch.setitem(app.config, 'PRODUCT_CARD_CACHE_SIZE', 0)
+    # 每項商品不同賣家，賣家若逐筆載入就會反映在查詢數上
+    for i in range(25):
+        user = User(email=f'user{i}@example.edu.tw', username=f'user{i}', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        make_product(
+            user_id=user.id, title=f'商品 {i}',
+            primary_image_url=f'/static/uploads/products/{i}.jpg'
+        )
+
+    small = listing_queries(app, db, count_queries, 5)
+    large = listing_queries(app, db, count_queries, 20)
+
+    assert small == large
@@ -0,0 +1,141 @@
+import re
+from datetime import timedelta
+import pytest
+from app.extensions import socketio
+from app.models.conversation import Conversation
+from app.services.counter_service import CounterService
+from app.services.message_service import MessageService
+from app.services.notification_service import NotificationService
+
+
+@pytest.fixture
+def users(seller, make_user):
+    return seller, make_user('buyer'), make_user('other')
+
+
+def send(sender, receiver, content):
+    success, message = MessageService.send_message(sender.id, receiver.id, content)
+    assert success, message
+    return message
+
+
+def summary(user):
+    return [
+        (c['user'].id, c['last_message'].content, c['unread_count'])
+        for c in MessageService.get_conversations_list(user.id)
+    ]
+
+
+def test_conversation_list_follows_messages(db, users):
+    seller, buyer, other = users
+    send(buyer, seller, '請問還有嗎？')
+    send(seller, buyer, '還有喔')
+    send(buyer, seller, '可以面交嗎？')
+    send(other, seller, '可以便宜一點嗎？')
+
+    # 最新的對話在前；未讀數各自計算
+    assert summary(seller) == [(other.id, '可以便宜一點嗎？', 1), (buyer.id, '可以面交嗎？', 2)]
+    assert summary(buyer) == [(seller.id, '可以面交嗎？', 1)]
+
+    assert MessageService.mark_conversation_as_read(seller.id, buyer.id) == (True, 2)
+    assert summary(seller)[1] == (buyer.id, '可以面交嗎？', 0)
+    assert MessageService.get_conversation_unread_count(buyer.id, seller.id) == 1
+
+
+def test_deleting_last_message_points_to_previous(db, users):
+    seller, buyer, _ = users
+    send(buyer, seller, '請問還有嗎？')
+    last = send(buyer, seller, '可以面交嗎？')
+
+    assert MessageService.delete_message(last.id, buyer.id)[0]
+    assert summary(seller) == [(buyer.id, '請問還有嗎？', 1)]
+
+
+def test_rebuild_matches_maintained_summary(db, users):
+    seller, buyer, other = users
+    first = send(buyer, seller, '請問還有嗎？')
+    send(seller, buyer, '還有喔')
+    send(other, seller, '可以便宜一點嗎？')
+    assert MessageService.mark_as_read(first.id, seller.id)[0]
+
+    def rows():
+        db.session.expire_all()
+        return sorted(
+            (c.user_low_id, c.user_high_id, c.last_message_id, c.low_unread_count, c.high_unread_count)
+            for c in Conversation.query.all()
+        )
+
+    maintained = rows()
+    assert MessageService.rebuild_conversations() == 2
+    assert rows() == maintained
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    events = []
+    monkeypatch.setattr(socketio, 'emit', lambda event, data, room=None: events.append((event, data, room)))
+    return events
+
+
+def test_mark_conversation_read_is_one_update(db, users, count_queries, emitted):
+    """以一個 UPDATE 標記整個對話，不載入訊息；推送的未讀數取自計數表的 RETURNING"""
+    seller, buyer, other = users
+    loaded = send(buyer, seller, '請問還有嗎？')
+    send(buyer, seller, '可以面交嗎？')
+    send(other, seller, '可以便宜一點嗎？')
+    emitted.clear()
+
+    with count_queries() as statements:
+        assert MessageService.mark_conversation_as_read(seller.id, buyer.id) == (True, 2)
+    touching_messages = [s for s in statements if re.search(r'\bmessages\b', s)]
+    assert len(touching_messages) == 1 and touching_messages[0].startswith('UPDATE')
+    assert not [s for s in statements if 'count(' in s.lower()]
+
+    assert loaded.is_read  # 已載入的物件同步更新
+    assert emitted == [('update_unread_count', {'count': 1}, f'user_{seller.id}')]
+    assert CounterService.get(seller.id, 'unread_messages') == 1
+
+    # 沒有未讀訊息時不更新計數也不推送
+    emitted.clear()
+    assert MessageService.mark_conversation_as_read(seller.id, buyer.id) == (True, 0)
+    assert emitted == []
+
+
+def test_mark_all_notifications_read(db, users, emitted):
+    seller, buyer, _ = users
+    for content in ('通知一', '通知二'):
+        NotificationService.create_notification(seller.id, 'system', content)
+    NotificationService.create_notification(buyer.id, 'system', '通知三')
+    emitted.clear()
+
+    assert NotificationService.mark_all_as_read(seller.id) == (True, 2)
+    assert emitted == [('update_notification_count', {'count': 0}, f'user_{seller.id}')]
+    assert CounterService.get(seller.id, 'unread_notifications') == 0
+    assert CounterService.get(buyer.id, 'unread_notifications') == 1
+
+
+def test_chat_history_pages_newest_first(db, users):
+    """聊天紀錄由最新一頁開始，以游標往前載入；同一時間的訊息以 id 區分，不重複不遺漏"""
+    seller, buyer, other = users
+    messages = [send(*((buyer, seller) if i % 2 else (seller, buyer)), f'訊息 {i}') for i in range(7)]
+    send(other, seller, '其他對話')
+    sent_at = messages[0].created_at
+    for i, message in enumerate(messages):
+        message.created_at = sent_at + timedelta(seconds=i // 2)
+    db.session.commit()
+    expected = [m.id for m in sorted(messages, key=lambda m: (m.created_at, m.id), reverse=True)]
+
+    pages = []
+    cursor = None
+    while True:
+        page = MessageService.get_conversation(buyer.id, seller.id, per_page=3, cursor=cursor)
+        pages.append([m.id for m in page.items])
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert [len(ids) for ids in pages] == [3, 3, 1]
+    assert [mid for ids in pages for mid in ids] == expected
+
+    # 往新的方向的游標不適用，回到最新一頁
+    newer = MessageService.get_conversation(buyer.id, seller.id, per_page=3, cursor=page.prev_cursor)
+    assert [m.id for m in newer.items] == pages[0]
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from app.services.counter_service import CounterService
+from app.services.product_service import ProductService
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize('sort_by, value', [
+    ('created_at', datetime(2025, 3, 1, 12, 30, 15, 123456)),
+    ('price', Decimal('199.50')),
+    ('view_count', 42),
+    ('trending', 123.456),
+])
+def test_cursor_round_trip(sort_by, value):
+    cursor = encode_cursor(sort_by, value, 7, direction='prev')
+    assert decode_cursor(cursor, sort_by) == (value, 7, 'prev')
+
+
+def test_invalid_cursor_is_ignored():
+    """排序欄位不符或格式錯誤的游標視為第一頁"""
+    assert decode_cursor(encode_cursor('price', Decimal('1'), 1), 'created_at') is None
+    assert decode_cursor('not-a-cursor', 'created_at') is None
+
+
+def test_pages_round_trip_with_tied_sort_values(db, seller, make_product):
+    """同一時間建立的商品以 id 決定順序，往後翻頁不重複不遺漏，往前翻頁回到相同的頁面"""
+    created_at = datetime.utcnow()
+    products = [
+        make_product(title=f'商品 {i}', created_at=created_at - timedelta(minutes=i // 3))
+        for i in range(10)
+    ]
+    expected = [p.id for p in sorted(products, key=lambda p: (p.created_at, p.id), reverse=True)]
+
+    pages = []
+    cursor = None
+    while True:
+        page = ProductService.get_user_products(seller.id, per_page=4, keyset=True, cursor=cursor)
+        pages.append([p.id for p in page.items])
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert [pid for ids in pages for pid in ids] == expected
+    assert [len(ids) for ids in pages] == [4, 4, 2]
+
+    for ids in reversed(pages[:-1]):
+        page = ProductService.get_user_products(seller.id, per_page=4, keyset=True, cursor=page.prev_cursor)
+        assert [p.id for p in page.items] == ids
+    assert not page.has_prev
+
+
+def test_seller_page_total_comes_from_counter(app, db, seller, make_product, count_queries):
+    """賣家頁面的商品總數取自 user_counters，不執行 COUNT(*)"""
+    products = [make_product(title=f'商品 {i}') for i in range(3)]
+    products[0].status = 'sold'
+    db.session.commit()
+    assert CounterService.get(seller.id, 'active_listings') == 2
+
+    with count_queries() as statements:
+        response = app.test_client().get(f'/seller/{seller.id}')
+    assert response.status_code == 200
+    assert '共 2 項商品' in response.get_data(as_text=True)
+    assert not [s for s in statements if 'count(' in s.lower()]
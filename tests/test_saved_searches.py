@@ -0,0 +1,73 @@
+import pytest
+from app.models.saved_search import SavedSearch
+from app.services.saved_search_service import SavedSearchService
+
+
+@pytest.fixture
+def buyer(make_user):
+    return make_user('buyer')
+
+
+@pytest.fixture
+def save(buyer):
+    def save(**kwargs):
+        success, saved_search = SavedSearchService.create_saved_search(buyer.id, **kwargs)
+        assert success, saved_search
+        return saved_search
+    return save
+
+
+def matched_ids(product):
+    return {saved_search.id for saved_search in SavedSearchService.find_matches(product)}
+
+
+def test_matches_keyword_category_condition_and_price(save, make_product, category):
+    keyword = save(keyword='微積分')
+    in_category = save(category_id=category.id)
+    condition = save(condition='good')
+    price = save(min_price=50, max_price=150)
+    miss = save(keyword='電子辭典')
+    too_cheap = save(max_price=99)
+
+    product = make_product(price=100)
+    assert matched_ids(product) == {keyword.id, in_category.id, condition.id, price.id}
+    assert not {miss.id, too_cheap.id} & matched_ids(product)
+
+
+def test_price_only_search_is_not_a_candidate_outside_its_band(save, make_product):
+    """只有價格條件的搜尋以價格區段建立索引，不會被其他價位的商品取回"""
+    cheap = save(max_price=30)
+    narrow = save(min_price=1000, max_price=1200)
+    assert {cheap.index_term, narrow.index_term}.isdisjoint({'*'})
+
+    product = make_product(price=5000)
+    terms = {f'condition:{product.condition}'} | SavedSearchService.price_terms(product.price)
+    assert cheap.index_term not in terms
+    assert narrow.index_term not in terms
+    assert matched_ids(product) == set()
+    assert matched_ids(make_product(price=1100)) == {narrow.id}
+    assert matched_ids(make_product(price=20)) == {cheap.id}
+
+
+@pytest.mark.parametrize('price', [0, 1, 2, 3, 4, 127, 128, 1000, 10 ** 7])
+def test_price_band_covers_range_boundaries(price):
+    """涵蓋 [min, max] 的區段節點包含範圍兩端的價格"""
+    term = SavedSearchService.build_index_term(None, None, min_price=price, max_price=price * 2)
+    assert term in SavedSearchService.price_terms(price)
+    assert term in SavedSearchService.price_terms(price * 2)
+
+
+def test_own_searches_are_excluded(make_product, seller):
+    success, saved_search = SavedSearchService.create_saved_search(seller.id, condition='good')
+    assert success
+    assert matched_ids(make_product()) == set()
+
+
+def test_rebuild_index_terms(db, save, make_product):
+    saved_search = save(min_price=50, max_price=150)
+    saved_search.index_term = '*'
+    db.session.commit()
+
+    assert SavedSearchService.rebuild_index_terms() == 1
+    assert db.session.get(SavedSearch, saved_search.id).index_term != '*'
+    assert matched_ids(make_product(price=100)) == {saved_search.id}
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app.models.product import Product
+from app.services.product_service import ProductService
+
+
+def test_relevance_cursor_handles_ties_across_pages(make_product):
+    """相關度同分的商品跨頁時不重複也不遺漏"""
+    ids = {make_product(title='微積分課本 第三版', description='九成新').id for _ in range(7)}
+
+    seen = []
+    cursor = None
+    while True:
+        page = ProductService.get_products(
+            search='微積分', sort_by='relevance', keyset=True, per_page=2, cursor=cursor
+        )
+        seen.extend(product.id for product in page.items)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert set(seen) == ids
+
+
+def test_postgresql_rank_is_double_precision(db, monkeypatch):
+    """PostgreSQL 的 ts_rank（float4）需轉為 float8，游標中的值才能精確比較"""
+    monkeypatch.setattr(
+        db.session, 'get_bind', lambda *args, **kwargs: SimpleNamespace(dialect=postgresql.dialect())
+    )
+    _, rank_expr = ProductService._apply_search(Product.query, '微積分')
+
+    sql = str(rank_expr.compile(dialect=postgresql.dialect()))
+    assert 'CAST(ts_rank(' in sql
+    assert 'AS FLOAT(53))' in sql
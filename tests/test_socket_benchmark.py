@@ -0,0 +1,51 @@
+from simple_websocket import ConnectionClosed
+from app.utils.socket_benchmark import BenchmarkSocket
+
+
+class FakeWebSocket:
+    """依序送出指定的封包；closed=True 時之後連線即中斷"""
+
+    def __init__(self, *packets, closed=False):
+        self.packets = list(packets)
+        self.closed = closed
+
+    def receive(self, timeout=None):
+        if self.packets:
+            return self.packets.pop(0)
+        if self.closed:
+            raise ConnectionClosed()
+        return None
+
+
+def make_socket(ws):
+    sock = BenchmarkSocket.__new__(BenchmarkSocket)
+    sock.ws = ws
+    sock.events = []
+    sock.alive = True
+    return sock
+
+
+def test_poll_marks_closed_socket_dead():
+    """連線中斷時 poll() 不拋出例外，只把連線標記為失效"""
+    sock = make_socket(FakeWebSocket('42["benchmark_ping",{}]', closed=True))
+
+    sock.poll()
+    sock.poll()
+    assert not sock.alive
+    assert [event for _, event, _ in sock.events] == ['benchmark_ping']
+
+
+def test_poll_marks_namespace_disconnect_dead():
+    """伺服器中斷命名空間（41）時 WebSocket 仍開著，也視為失效"""
+    sock = make_socket(FakeWebSocket('41'))
+
+    sock.poll()
+    assert not sock.alive
+
+
+def test_broadcast_rejects_memory_queue(app, monkeypatch):
+    """程序內佇列無法從 CLI 廣播到伺服器程序"""
+    monkeypatch.setitem(app.config, 'SOCKETIO_MESSAGE_QUEUE', 'memory://')
+    result = app.test_cli_runner().invoke(args=['benchmark-sockets', '-n', '1', '--broadcast'])
+    assert result.exit_code == 2
+    assert 'memory://' in result.output
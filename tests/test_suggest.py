@@ -0,0 +1,64 @@
+import time
+import pytest
+from app.models.user import User
+from app.services import product_service
+from app.services.product_service import ProductService
+from app.services.transaction_service import TransactionService
+from app.utils.suggest import PrefixIndex
+
+
+@pytest.fixture
+def suggest_index(monkeypatch):
+    index = PrefixIndex()
+    monkeypatch.setattr(product_service, 'suggest_index', index)
+    return index
+
+
+def suggested_ids(prefix):
+    return [s['id'] for s in ProductService.suggest(prefix) if s['type'] == 'product']
+
+
+def test_transactions_update_suggestions(db, make_product, suggest_index):
+    """交易使商品保留、售出或恢復販售時，自動完成建議隨之更新"""
+    buyer = User(email='buyer@example.edu.tw', username='buyer', password_hash='-')
+    db.session.add(buyer)
+    db.session.commit()
+    product = make_product(title='二手筆電 ASUS')
+    assert suggested_ids('二手筆電') == [product.id]
+
+    success, transaction = TransactionService.create_transaction(product.id, buyer.id, 'sale', 100)
+    assert success
+    assert TransactionService.accept_transaction(transaction.id, product.user_id)[0]
+    assert suggested_ids('二手筆電') == []
+
+    assert TransactionService.cancel_transaction(transaction.id, product.user_id)[0]
+    assert suggested_ids('二手筆電') == [product.id]
+
+
+def test_products_sold_on_other_workers_drop_out_after_rebuild(app, db, make_product, suggest_index,
+                                                                monkeypatch):
+    """其他 worker 變更的商品（本程序的索引未同步）於索引過期重建後不再出現"""
+    monkeypatch.setitem(app.config, 'SUGGEST_INDEX_MAX_AGE', 60)
+    product = make_product(title='二手筆電 ASUS')
+    assert suggested_ids('二手筆電') == [product.id]
+
+    product.status = 'sold'
+    db.session.commit()  # 未呼叫 product_changed，模擬其他 worker 的變更
+    suggest_index.built_at -= 60
+    ProductService.suggest('二手筆電')  # 過期，重建
+    assert suggested_ids('二手筆電') == []
+
+
+def test_suggest_does_not_query_database(app, db, make_product, suggest_index, count_queries):
+    """索引建立後每次按鍵只查記憶體中的索引，不執行任何 SQL"""
+    for i in range(200):
+        make_product(title=f'二手筆電 型號{i}')
+    ProductService.suggest('二手')  # 建立索引
+
+    with count_queries() as statements:
+        started = time.perf_counter()
+        for _ in range(500):
+            assert len(suggested_ids('二手筆電')) == 8
+        elapsed = time.perf_counter() - started
+    assert statements == []
+    assert elapsed < 1.0
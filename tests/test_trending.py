@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from app.services.product_service import ProductService
+from app.services.trending_service import TrendingService
+
+
+def trending_ids():
+    return [p.id for p in ProductService.get_products(sort_by='trending').items]
+
+
+def test_recent_interest_outranks_decayed_interest(db, make_product):
+    """較早的互動隨時間衰減（半衰期 24 小時），排在近期的少量互動之後"""
+    now = datetime.utcnow()
+    created_at = now - timedelta(days=4)
+    earlier = make_product(title='經濟學原理', created_at=created_at)
+    recent = make_product(title='微積分課本', created_at=created_at)
+
+    earlier.view_count = 10
+    db.session.commit()
+    TrendingService.update_trending_scores(now=now - timedelta(days=3))
+    assert trending_ids() == [earlier.id, recent.id]
+
+    # 10 次瀏覽經過 3 天衰減為 1.25，低於剛發生的 3 次瀏覽
+    recent.view_count = 3
+    db.session.commit()
+    assert TrendingService.update_trending_scores(now=now) == 1
+    assert trending_ids() == [recent.id, earlier.id]
+
+
+def test_new_listing_is_ranked_before_scores_are_updated(db, seller, category, make_product):
+    """新刊登的商品在排程執行前就依刊登時間排序，不會停在預設分數 0"""
+    old = make_product(created_at=datetime.utcnow() - timedelta(days=2))
+    TrendingService.update_trending_scores()
+
+    success, product = ProductService.create_product(
+        seller.id, '電子辭典 卡西歐', '附保護套', 200, category.id, 'good', None, None
+    )
+    assert success
+    assert product.trending_score > old.trending_score
+    assert trending_ids() == [product.id, old.id]
+
+    # 排程第一次計分時以相同的刊登事件重新計算
+    seeded = product.trending_score
+    TrendingService.update_trending_scores()
+    db.session.refresh(product)
+    assert abs(product.trending_score - seeded) < 1e-3
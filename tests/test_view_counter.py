@@ -0,0 +1,58 @@
+from flask import Flask
+from app.extensions import view_counter
+from app.models.product import Product
+from app.services.product_service import ProductService
+from app.utils.view_counter import ViewCountBuffer
+
+
+def test_flush_thread_starts_on_first_view():
+    """背景寫回執行緒只在處理請求（第一次累加）時啟動"""
+    app = Flask(__name__)
+    app.config.update(VIEW_COUNT_FLUSH_INTERVAL=60, VIEW_COUNT_FLUSH_THRESHOLD=0)
+    buffer = ViewCountBuffer()
+    buffer.init_app(app)
+    assert buffer._thread is None
+
+    buffer.increment(1)
+    try:
+        assert buffer._thread is not None and buffer._thread.is_alive()
+        assert buffer.pending(1) == 1
+    finally:
+        buffer._stop.set()
+        buffer._take_pending()  # 沒有資料庫，結束時不寫回
+
+
+def test_flush_command_requires_redis(app):
+    """記憶體緩衝位於 web worker 中，CLI 無法寫回"""
+    result = app.test_cli_runner().invoke(args=['flush-view-counts'])
+    assert result.exit_code != 0
+    assert 'VIEW_COUNT_REDIS_URL' in result.output
+
+
+def test_stats_endpoint_reports_memory_buffer(app, db, make_product):
+    """記憶體緩衝的待寫回次數與寫回統計由 worker 的監控端點回報"""
+    view_counter._take_pending()
+    product = make_product(view_count=None)
+    ProductService.get_product_by_id(product.id, increment_view=True)
+    ProductService.get_product_by_id(product.id, increment_view=True)
+
+    client = app.test_client()
+    stats = client.get('/products/api/view-counts').get_json()
+    assert stats['backend'] == 'memory'
+    assert stats['pending_products'] == 1
+    assert stats['pending_views'] == 2
+
+    flush_count = stats['flush_count']
+    assert view_counter.flush() == 2
+    db.session.expire_all()
+    assert db.session.get(Product, product.id).view_count == 2  # NULL 視為 0
+
+    stats = client.get('/products/api/view-counts').get_json()
+    assert stats['pending_views'] == 0
+    assert stats['flush_count'] == flush_count + 1
+
+
+def test_stats_endpoint_rejects_other_addresses(app):
+    client = app.test_client()
+    response = client.get('/products/api/view-counts', environ_base={'REMOTE_ADDR': '203.0.113.5'})
+    assert response.status_code == 404